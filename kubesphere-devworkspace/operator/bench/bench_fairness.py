@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+跨命名空间公平调度的基准测试
+
+命名空间 team-a 一次性批量创建大量属于 DevWorkspaceSet 的工作空间（BULK），
+与此同时命名空间 team-b 的开发者每隔一段时间单独创建一个工作空间（INTERACTIVE）。
+分别在开启和关闭 ReconcileScheduler 的情况下，统计两边 handler 的耗时：
+关闭调度时 team-b 的请求排在 team-a 的数百个请求之后，开启后 team-b 的尾延迟应基本不受影响。
+
+用法:
+    python bench/bench_fairness.py --bulk 300 --interactive 20 --latency 0.02 --api-qps 200
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from harness import percentiles, start_fake_cluster, workspace_body
+
+
+async def run(args) -> dict:
+    # 客户端限速和调度参数在导入 main 时读取
+    os.environ["API_QPS"] = str(args.api_qps)
+    os.environ["RECONCILE_NAMESPACE_CONCURRENCY"] = str(args.namespace_concurrency)
+    server, main = start_fake_cluster(args.latency)
+    logging.getLogger().setLevel(logging.WARNING)
+    logger = logging.getLogger("bench")
+    fair_scheduler = main.scheduler
+    unscheduled = main.ReconcileScheduler(0, 0)
+
+    async def create(name: str, namespace: str, set_name: str = None) -> float:
+        body = workspace_body(name, namespace)
+        if set_name:
+            body["metadata"]["labels"] = {main.SET_LABEL: set_name}
+        server.call(server.put_object, "devworkspaces", namespace, body)
+        started = time.perf_counter()
+        await main.create_workspace_instance(body=body, name=name, namespace=namespace, logger=logger)
+        return time.perf_counter() - started
+
+    async def scenario(label: str) -> dict:
+        async def interactive(i: int) -> float:
+            await asyncio.sleep(i * args.interval)
+            return await create(f"{label}-dev-{i}", "team-b")
+
+        wall_started = time.perf_counter()
+        bulk, single = await asyncio.gather(
+            asyncio.gather(*(create(f"{label}-bulk-{i}", "team-a", "batch") for i in range(args.bulk))),
+            asyncio.gather(*(interactive(i) for i in range(args.interactive))),
+        )
+        return {
+            "interactiveLatencyMs": percentiles(single),
+            "bulkLatencyMs": percentiles(bulk),
+            "wallSeconds": round(time.perf_counter() - wall_started, 2),
+        }
+
+    main.scheduler = unscheduled
+    without = await scenario("off")
+    main.scheduler = fair_scheduler
+    fair = await scenario("on")
+    server.stop()
+
+    return {
+        "benchmark": "fairness",
+        "bulkWorkspaces": args.bulk,
+        "interactiveWorkspaces": args.interactive,
+        "interactiveIntervalSeconds": args.interval,
+        "apiLatencyMs": args.latency * 1000,
+        "apiQps": args.api_qps,
+        "maxConcurrency": fair_scheduler.max_concurrency,
+        "namespaceConcurrency": fair_scheduler.namespace_concurrency,
+        "withoutScheduler": without,
+        "withScheduler": fair,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bulk", type=int, default=300, help="team-a 批量创建的工作空间数")
+    parser.add_argument("--interactive", type=int, default=20, help="team-b 单独创建的工作空间数")
+    parser.add_argument("--interval", type=float, default=0.05, help="team-b 两次创建之间的间隔（秒）")
+    parser.add_argument("--latency", type=float, default=0.02, help="每个 API 请求的模拟延迟（秒）")
+    parser.add_argument("--api-qps", type=float, default=200, help="Operator 的客户端限速 API_QPS，0 表示不限速")
+    parser.add_argument("--namespace-concurrency", type=int, default=10, help="RECONCILE_NAMESPACE_CONCURRENCY")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+工作空间全生命周期的负载测试
+
+在假 API Server 上按 kopf 的调用方式直接驱动 main.py 中真实的 handler，依次完成三个阶段：
+- create：create_workspace_instance 创建资源，随后 advance_starting_workspace 通过共享 watch 缓存等待 Pod Running
+  和 ClusterIP，统计从开始创建到 Running 的时间（time-to-Running）；
+- update：update_workspace_instance 修改每个工作空间的资源覆盖配置（原地调整 Pod 资源）；
+- delete：delete_workspace_instance 处理工作空间的删除（资源带有 ownerReference，由垃圾回收器清理，handler 不发出请求；假 API Server 不模拟垃圾回收）。
+假 API Server 模拟 Pod 启动（--pod-start，加上 --pod-start-jitter 的随机抖动）和 ClusterIP 分配（--cluster-ip-delay）的延迟，
+Operator 的 informer 与真实集群一样通过 LIST + WATCH 感知这些变化。
+
+输出为 JSON：各阶段的 p50 / p95 / p99 延迟、吞吐量、每个工作空间的 API 请求数，同时执行的 handler 峰值，
+以及 Operator 的 CPU 时间（进程 CPU 时间减去假 API Server 线程的 CPU 时间）和 RSS（包括假 API Server 保存的对象）。
+创建完成后按 kopf 的方式为每个工作空间调用 workspaces_by_template 建立索引，并报告各内存缓存的条目数（main.cache_sizes），
+rssPerWorkspaceKb 为创建阶段（包括索引）平均每个工作空间增加的 RSS。
+kopf 自身的分发（DevWorkspace 的 watch、处理进度注解和 finalizer）不在测量范围内，
+daemon 在创建完成后立即启动，因此 time-to-Running 不包含 kopf 收到 Starting 事件的延迟。
+
+用法:
+    python bench/bench_load.py --workspaces 2000 --namespaces 20 --latency 0.01 --pod-start 2 --cluster-ip-delay 0.05
+"""
+
+import argparse
+import asyncio
+import collections
+import copy
+import json
+import logging
+import os
+import resource
+import time
+
+import kopf
+# daemon 的 stopped 参数由 kopf 内部构造，公开 API 中没有对应的构造方式
+from kopf._cogs.aiokits.aioenums import AsyncFlagWaiter
+from kopf._core.intents.stoppers import DaemonStopper, DaemonStoppingReason
+
+from harness import percentiles, start_fake_cluster, workspace_body
+
+
+def _rss_mb() -> float:
+    """当前的 RSS（MB）"""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+
+
+class HandlerTracker:
+    """统计同时执行的 handler 数量及其峰值"""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def run(self, coro):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            return await coro
+        finally:
+            self.active -= 1
+
+
+def _requests_delta(before: collections.Counter, after: collections.Counter) -> dict:
+    delta = after - before
+    return {f"{method} {plural}": count for (method, plural), count in sorted(delta.items())}
+
+
+async def run(args) -> dict:
+    # 客户端限速在导入 main 时读取
+    os.environ["API_QPS"] = str(args.api_qps)
+    os.environ["API_LIST_PAGE_SIZE"] = str(args.page_size)
+    server, main = start_fake_cluster(args.latency)
+    server.pod_start_delay = args.pod_start
+    server.pod_start_jitter = args.pod_start_jitter
+    server.cluster_ip_delay = args.cluster_ip_delay
+    logging.getLogger().setLevel(logging.WARNING)
+    logger = logging.getLogger("bench")
+
+    memo = kopf.Memo()
+    await main.start_informers(memo=memo, logger=logger)
+    await memo['ready_task']
+
+    tracker = HandlerTracker()
+    semaphore = asyncio.Semaphore(args.concurrency) if args.concurrency > 0 else None
+    workspaces = [(f"ws-{i}", f"load-{i % args.namespaces}") for i in range(args.workspaces)]
+
+    def read_object(name: str, namespace: str) -> dict:
+        # 对象由服务线程修改，在服务线程中复制
+        return server.call(lambda: copy.deepcopy(server.objects.get(("devworkspaces", namespace, name)) or {}))
+
+    def read_status(name: str, namespace: str) -> dict:
+        return read_object(name, namespace).get("status") or {}
+
+    async def limited(coro):
+        if semaphore is None:
+            return await coro
+        async with semaphore:
+            return await coro
+
+    async def arrive(i: int):
+        # --rate 为 0 时所有请求同时到达，否则按固定速率到达
+        if args.rate > 0:
+            await asyncio.sleep(i / args.rate)
+
+    async def phase(run_one) -> dict:
+        before = collections.Counter(server.requests)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run_one(i, name, namespace) for i, (name, namespace) in enumerate(workspaces)),
+                                       return_exceptions=True)
+        wall = time.perf_counter() - started
+        failures = [result for result in results if isinstance(result, BaseException)]
+        latencies = [result for result in results if not isinstance(result, BaseException)]
+        calls = _requests_delta(before, server.requests)
+        return {
+            "latencies": latencies,
+            "summary": {
+                "throughputPerSecond": round(len(latencies) / wall, 2),
+                "wallSeconds": round(wall, 2),
+                "failures": len(failures),
+                "firstFailure": repr(failures[0]) if failures else None,
+                "apiCallsPerWorkspace": round(sum(calls.values()) / len(workspaces), 2),
+                "apiCalls": calls,
+            },
+        }
+
+    async def create_one(i: int, name: str, namespace: str) -> float:
+        body = server.call(server.put_object, "devworkspaces", namespace, workspace_body(name, namespace))
+        await arrive(i)
+        started = time.perf_counter()
+        await limited(tracker.run(main.create_workspace_instance(body=body, name=name, namespace=namespace, logger=logger)))
+        create_latencies.append(time.perf_counter() - started)
+        # 工作空间进入 Running 后阶段不再满足过滤条件，kopf 会通知 daemon 退出
+        stopper = DaemonStopper()
+        stopper.set(reason=DaemonStoppingReason.FILTERS_MISMATCH)
+        await tracker.run(main.advance_starting_workspace(
+            name=name, namespace=namespace, status=read_status(name, namespace),
+            stopped=AsyncFlagWaiter(stopper), logger=logger
+        ))
+        phase_reached = read_status(name, namespace).get("phase")
+        if phase_reached != "Running":
+            raise RuntimeError(f"{namespace}/{name} ended in phase {phase_reached}")
+        return time.perf_counter() - started
+
+    async def update_one(i: int, name: str, namespace: str) -> float:
+        old = read_object(name, namespace)
+        overrides = {"resources": {"limits": {"cpu": "2", "memory": "2Gi"}}}
+        body = server.call(server.put_object, "devworkspaces", namespace, {**old, "spec": {**old["spec"], "overrides": overrides}})
+        await arrive(i)
+        started = time.perf_counter()
+        await limited(tracker.run(main.update_workspace_instance(
+            body=body, name=name, namespace=namespace, status=read_status(name, namespace), logger=logger,
+            diff=[("add", ("spec", "overrides"), None, overrides)], memo=kopf.Memo(), old=old
+        )))
+        return time.perf_counter() - started
+
+    async def delete_one(i: int, name: str, namespace: str) -> float:
+        await arrive(i)
+        started = time.perf_counter()
+        await limited(tracker.run(main.delete_workspace_instance(
+            name=name, namespace=namespace, status=read_status(name, namespace), logger=logger
+        )))
+        server.call(server.objects.pop, ("devworkspaces", namespace, name), None)
+        return time.perf_counter() - started
+
+    rss_baseline = _rss_mb()
+    cpu_started = time.process_time()
+    server_cpu_started = server.call(time.thread_time)
+
+    create_latencies = []
+    created = await phase(create_one)
+    phases = collections.Counter(server.call(lambda: [
+        obj.get("status", {}).get("phase", "None")
+        for (plural, _, _), obj in server.objects.items() if plural == "devworkspaces"
+    ]))
+    # kopf 在每个 DevWorkspace 的事件中调用索引函数，这里对创建完成的工作空间各调用一次
+    workspaces_by_template = collections.defaultdict(list)
+    for name, namespace in workspaces:
+        obj = read_object(name, namespace)
+        metadata = obj["metadata"]
+        entry = await main.workspaces_by_template(
+            name=name, namespace=namespace, uid=metadata.get("uid"), labels=metadata.get("labels") or {},
+            meta=metadata, spec=obj["spec"], status=obj.get("status") or {}
+        )
+        for template, record in (entry or {}).items():
+            workspaces_by_template[template].append(record)
+        del obj, metadata, entry
+    caches = main.cache_sizes(workspaces_by_template, {})
+    rss_after_create = _rss_mb()
+    updated = await phase(update_one)
+    deleted = await phase(delete_one)
+
+    server_cpu = server.call(time.thread_time) - server_cpu_started
+    operator_cpu = time.process_time() - cpu_started - server_cpu
+    wall = created["summary"]["wallSeconds"] + updated["summary"]["wallSeconds"] + deleted["summary"]["wallSeconds"]
+
+    for informer in main.informers:
+        informer.stop()
+    server.stop()
+
+    return {
+        "benchmark": "load",
+        "workspaces": args.workspaces,
+        "namespaces": args.namespaces,
+        "concurrency": args.concurrency,
+        "arrivalRate": args.rate,
+        "apiLatencyMs": args.latency * 1000,
+        "apiQps": args.api_qps,
+        "listPageSize": args.page_size,
+        "podStartSeconds": args.pod_start,
+        "podStartJitter": args.pod_start_jitter,
+        "clusterIpDelaySeconds": args.cluster_ip_delay,
+        "create": {
+            "timeToRunningMs": percentiles(created["latencies"]),
+            "handlerLatencyMs": percentiles(create_latencies),
+            **created["summary"],
+            "phases": dict(phases),
+        },
+        "update": {"handlerLatencyMs": percentiles(updated["latencies"]), **updated["summary"]},
+        "delete": {"handlerLatencyMs": percentiles(deleted["latencies"]), **deleted["summary"]},
+        "cacheEntries": caches,
+        "handlerConcurrencyPeak": tracker.peak,
+        "maxInflightRequests": server.max_inflight,
+        "operator": {
+            "cpuSeconds": round(operator_cpu, 2),
+            "cpuUtilization": round(operator_cpu / wall, 3) if wall else None,
+            "fakeApiServerCpuSeconds": round(server_cpu, 2),
+            "rssBaselineMb": rss_baseline,
+            "rssAfterCreateMb": rss_after_create,
+            "rssPerWorkspaceKb": round((rss_after_create - rss_baseline) * 1024 / len(workspaces), 2),
+            "peakRssMb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workspaces", type=int, default=1000)
+    parser.add_argument("--namespaces", type=int, default=10, help="工作空间均匀分布到的命名空间数")
+    parser.add_argument("--concurrency", type=int, default=0, help="同时执行的 handler 上限，0 表示不限制（与 kopf 相同）")
+    parser.add_argument("--rate", type=float, default=0, help="每秒到达的请求数，0 表示所有请求同时到达")
+    parser.add_argument("--latency", type=float, default=0.01, help="每个 API 请求的模拟延迟（秒）")
+    parser.add_argument("--api-qps", type=float, default=0, help="Operator 的客户端限速 API_QPS，0 表示不限速")
+    parser.add_argument("--page-size", type=int, default=500, help="informer LIST 每页的对象数 API_LIST_PAGE_SIZE，0 表示不分页")
+    parser.add_argument("--pod-start", type=float, default=2.0, help="Pod 从创建到 Running 的模拟延迟（秒）")
+    parser.add_argument("--pod-start-jitter", type=float, default=0.5, help="Pod 启动延迟的相对抖动（0.5 表示 ±50%%）")
+    parser.add_argument("--cluster-ip-delay", type=float, default=0.05, help="Service 分配 ClusterIP 的模拟延迟（秒）")
+    parser.add_argument("--output", help="同时把结果写入该文件，便于在不同版本之间对比")
+    args = parser.parse_args()
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
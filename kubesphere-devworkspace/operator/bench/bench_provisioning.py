@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+端到端的工作空间创建延迟基准测试
+
+直接调用 main.py 中真实的 create_workspace_instance handler，
+对接一个带有固定网络延迟的本地假 API Server，
+统计从 handler 开始到资源全部创建完成（状态变为 Starting）的耗时。
+同时给出一个请求序列相同、但逐个创建 PVC / Pod / Service 的串行基线用于对比，分两种情况：
+
+- unloaded：逐个创建（一次只有一个工作空间），API 线程池空闲，三个创建请求真正同时进行；
+- loaded：按 --concurrency 并发创建，同时进行的请求数受 API_CONNECTION_POOL_SIZE（线程池）限制，
+  线程池饱和后延迟和吞吐量由线程池决定，handler 内部的并行不再缩短延迟。
+
+podRequestsPerWorkspace 为每个工作空间的 Pod 请求数：Pod 不依赖 PVC 已经存在，不会因为 PVC 尚未创建而重试。
+
+用法:
+    python bench/bench_provisioning.py --workspaces 200 --concurrency 50 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from harness import percentiles, start_fake_cluster, workspace_body
+
+
+async def run(args) -> dict:
+    # 客户端限速和调度参数在导入 main 时读取；所有工作空间都在同一个命名空间中，命名空间并发上限放宽到与 --concurrency 一致
+    os.environ["API_QPS"] = str(args.api_qps)
+    os.environ.setdefault("RECONCILE_MAX_CONCURRENCY", str(max(50, args.concurrency)))
+    os.environ.setdefault("RECONCILE_NAMESPACE_CONCURRENCY", str(args.concurrency))
+    server, main = start_fake_cluster(args.latency)
+    logging.getLogger().setLevel(logging.WARNING)
+    logger = logging.getLogger("bench")
+    namespace = "bench"
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def provision(i: int, prefix: str = "ws", limit: asyncio.Semaphore = semaphore) -> float:
+        name = f"{prefix}-{i}"
+        body = workspace_body(name, namespace)
+        server.call(server.put_object, "devworkspaces", namespace, body)
+        async with limit:
+            started = time.perf_counter()
+            await main.create_workspace_instance(body=body, name=name, namespace=namespace, logger=logger)
+            return time.perf_counter() - started
+
+    async def sequential_baseline(i: int, prefix: str = "seq", limit: asyncio.Semaphore = semaphore) -> float:
+        # 与 handler 相同的请求序列，只是三个创建请求逐个发出
+        name = f"{prefix}-{i}"
+        server.call(server.put_object, "devworkspaces", namespace, workspace_body(name, namespace))
+        async with limit:
+            started = time.perf_counter()
+            await main.patch_status(name, namespace, {"phase": "Provisioning"})
+            config = await main._get_workspace_config({"templateRef": "python-3.9"}, logger)
+            manifests = main.manifest_renderer.compile("python-3.9", config)
+            pvc_name = await main.create_pvc(name, namespace, manifests)
+            await main.create_pod(name, namespace, pvc_name, manifests)
+            await main.create_service(name, namespace, manifests)
+            await main.patch_status(name, namespace, {"phase": "Starting"})
+            return time.perf_counter() - started
+
+    # 先逐个创建：线程池空闲时 handler 内部并行的效果
+    unloaded = min(args.workspaces, 20)
+    one_at_a_time = asyncio.Semaphore(1)
+    unloaded_latencies = [await provision(i, "idle", one_at_a_time) for i in range(unloaded)]
+    unloaded_baseline = [await sequential_baseline(i, "idle-seq", one_at_a_time) for i in range(unloaded)]
+    server.requests.clear()
+
+    wall_started = time.perf_counter()
+    handler_latencies = await asyncio.gather(*(provision(i) for i in range(args.workspaces)))
+    wall = time.perf_counter() - wall_started
+    creates = sum(count for (method, _), count in server.requests.items() if method in ("POST", "PATCH"))
+    pod_requests = sum(count for (_, plural), count in server.requests.items() if plural == "pods")
+
+    baseline_latencies = await asyncio.gather(*(sequential_baseline(i) for i in range(args.workspaces)))
+
+    phases = {}
+    for (plural, _, _), obj in server.objects.items():
+        if plural == "devworkspaces":
+            phase = obj.get("status", {}).get("phase", "None")
+            phases[phase] = phases.get(phase, 0) + 1
+    server.stop()
+
+    return {
+        "benchmark": "provisioning",
+        "workspaces": args.workspaces,
+        "concurrency": args.concurrency,
+        "apiLatencyMs": args.latency * 1000,
+        "apiQps": args.api_qps,
+        "apiConnectionPoolSize": main.API_CONNECTION_POOL_SIZE,
+        "maxInflightRequests": server.max_inflight,
+        "unloaded": {
+            "workspaces": unloaded,
+            "handlerLatencyMs": percentiles(unloaded_latencies),
+            "sequentialBaselineLatencyMs": percentiles(unloaded_baseline),
+        },
+        "loaded": {
+            "handlerLatencyMs": percentiles(handler_latencies),
+            "sequentialBaselineLatencyMs": percentiles(baseline_latencies),
+        },
+        "throughputPerSecond": round(args.workspaces / wall, 2),
+        "writeRequests": creates,
+        "podRequestsPerWorkspace": round(pod_requests / args.workspaces, 2),
+        "phases": phases,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workspaces", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="每个 API 请求的模拟延迟（秒）")
+    parser.add_argument("--api-qps", type=float, default=0, help="Operator 的客户端限速 API_QPS，0 表示不限速")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
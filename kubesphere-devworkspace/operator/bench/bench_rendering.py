@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+清单渲染的吞吐量微基准测试（纯 CPU，不需要假 API Server）
+
+对两种模板（默认的 code-server 模板、带 sidecar / initContainer 的定制模板）分别统计：
+- compile：把一个有效配置编译成 Pod / Service / PVC 骨架（Jinja2 渲染 + YAML 解析 + 冻结）的耗时；
+- render：在缓存的骨架上为一个工作空间填入实例字段，生成三份清单的耗时；
+- uncached：每个工作空间都重新编译再渲染（即没有骨架缓存时的代价）的耗时；
+- end-to-end：合并模板与覆盖配置、从 ManifestRenderer 取得骨架并渲染，即 handler 热路径上的完整代价。
+
+用法:
+    python bench/bench_rendering.py --iterations 20000
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from harness import EXAMPLE_TEMPLATE, SRC_DIR
+
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from manifests import ManifestRenderer  # noqa: E402
+from workspace_config import freeze, merge_configs  # noqa: E402
+
+
+CUSTOM_POD_TEMPLATE = {
+    "args": ["--disable-telemetry", "--proxy-domain=localhost:{{ port }}"],
+    "env": [{"name": "EXTENSIONS_GALLERY", "value": "{}"}],
+    "initContainers": [{"name": "fetch-extensions", "image": "busybox:1.36", "command": ["sh", "-c", "true"]}],
+    "sidecars": [{"name": "proxy", "image": "envoyproxy/envoy:v1.29", "ports": [{"containerPort": 15000}]}],
+    "volumes": [{"name": "cache", "emptyDir": {}}],
+    "volumeMounts": [{"name": "cache", "mountPath": "/cache"}],
+}
+
+
+def measure(fn, iterations: int) -> float:
+    """返回 fn 每次调用的平均耗时（微秒）"""
+    started = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def bench_template(name: str, spec: dict, iterations: int) -> dict:
+    template_spec = freeze(spec)
+    overrides = {"resources": {"limits": {"memory": "4Gi"}}}
+    config = merge_configs(template_spec, overrides)
+
+    def compile_once(i: int):
+        uncached_renderer.compile(name, config)
+        uncached_renderer.invalidate(name)
+
+    renderer = ManifestRenderer()
+    compiled = renderer.compile(name, config)
+
+    def render(i: int):
+        workspace = f"ws-{i}"
+        labels = {"app": "devworkspace", "instance": workspace}
+        compiled.render_pvc(f"{workspace}-pvc", "bench", labels)
+        compiled.render_pod(workspace, "bench", f"{workspace}-pvc", labels)
+        compiled.render_service(workspace, "bench", labels, labels)
+
+    def uncached(i: int):
+        workspace = f"ws-{i}"
+        labels = {"app": "devworkspace", "instance": workspace}
+        fresh = uncached_renderer.compile(name, config)
+        uncached_renderer.invalidate(name)
+        fresh.render_pvc(f"{workspace}-pvc", "bench", labels)
+        fresh.render_pod(workspace, "bench", f"{workspace}-pvc", labels)
+        fresh.render_service(workspace, "bench", labels, labels)
+
+    def end_to_end(i: int):
+        workspace = f"ws-{i}"
+        labels = {"app": "devworkspace", "instance": workspace}
+        manifests = renderer.compile(name, merge_configs(template_spec, {"resources": {"limits": {"memory": "4Gi"}}}))
+        manifests.render_pvc(f"{workspace}-pvc", "bench", labels)
+        manifests.render_pod(workspace, "bench", f"{workspace}-pvc", labels)
+        manifests.render_service(workspace, "bench", labels, labels)
+
+    uncached_renderer = ManifestRenderer()
+    slow_iterations = max(1, iterations // 20)
+    compile_us = measure(compile_once, slow_iterations)
+    render_us = measure(render, iterations)
+    uncached_us = measure(uncached, slow_iterations)
+    end_to_end_us = measure(end_to_end, iterations)
+    return {
+        "compileMicros": round(compile_us, 2),
+        "renderMicros": round(render_us, 2),
+        "uncachedRenderMicros": round(uncached_us, 2),
+        "endToEndMicros": round(end_to_end_us, 2),
+        "rendersPerSecond": round(1e6 / render_us),
+        "endToEndPerSecond": round(1e6 / end_to_end_us),
+        "speedupVsUncached": round(uncached_us / end_to_end_us, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000, help="渲染的工作空间数量")
+    args = parser.parse_args()
+
+    default_spec = EXAMPLE_TEMPLATE["spec"]
+    custom_spec = {**default_spec, "podTemplate": CUSTOM_POD_TEMPLATE}
+    print(json.dumps({
+        "benchmark": "rendering",
+        "iterations": args.iterations,
+        "default": bench_template("python-3.9", default_spec, args.iterations),
+        "custom": bench_template("python-3.9-custom", custom_spec, args.iterations),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
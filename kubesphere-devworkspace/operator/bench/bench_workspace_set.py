@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+DevWorkspaceSet 批量创建的吞吐量基准测试
+
+对接一个带有固定网络延迟的本地假 API Server，比较两种方式创建 N 个工作空间：
+- set：一个 DevWorkspaceSet，直接调用 main.py 中真实的 reconcile_workspace_set handler；
+- independent：N 个独立创建的 DevWorkspace。
+两种方式中，每个 DevWorkspace 被创建后都像 kopf 一样立即调用 create_workspace_instance handler，
+统计从开始到所有工作空间进入 Starting（资源全部创建完成）的耗时、吞吐量、API 请求数
+以及假 API Server 上同时处理中的请求数峰值（set 方式受 maxConcurrency / qps 限制）。
+
+用法:
+    python bench/bench_workspace_set.py --workspaces 300 --concurrency 20 --qps 200 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from harness import start_fake_cluster, workspace_body
+
+
+async def run(args) -> dict:
+    server, main = start_fake_cluster(args.latency)
+    logging.getLogger().setLevel(logging.WARNING)
+    logger = logging.getLogger("bench")
+    loop = asyncio.get_running_loop()
+    handlers = {}
+
+    def dispatch(obj: dict):
+        metadata = obj["metadata"]
+        handlers[metadata["name"]] = loop.create_task(main.create_workspace_instance(
+            body=obj, name=metadata["name"], namespace=metadata["namespace"], logger=logger
+        ))
+
+    def on_event(event_type: str, plural: str, obj: dict):
+        # 模拟 kopf：DevWorkspace 一出现就调用它的 create handler
+        if event_type == "ADDED" and plural == "devworkspaces":
+            loop.call_soon_threadsafe(dispatch, obj)
+
+    server.subscribe(on_event)
+
+    async def wait_for_handlers(count: int):
+        while len(handlers) < count:
+            await asyncio.sleep(0.005)
+        await asyncio.gather(*handlers.values())
+
+    def snapshot() -> dict:
+        return {
+            "requests": sum(server.requests.values()),
+            "templateReads": server.requests[("GET", "devworkspacetemplates")],
+        }
+
+    def report(started: float, before: dict) -> dict:
+        wall = time.perf_counter() - started
+        after = snapshot()
+        requests = after["requests"] - before["requests"]
+        return {
+            "wallSeconds": round(wall, 3),
+            "throughputPerSecond": round(args.workspaces / wall, 2),
+            "apiRequests": requests,
+            "apiRequestsPerWorkspace": round(requests / args.workspaces, 2),
+            "apiRequestsPerSecond": round(requests / wall, 2),
+            "templateReads": after["templateReads"] - before["templateReads"],
+            "maxInflightRequests": server.max_inflight,
+        }
+
+    # independent：逐个创建 DevWorkspace，模板缓存为冷
+    main.template_cache.delete("python-3.9")
+    before, server.max_inflight = snapshot(), 0
+    started = time.perf_counter()
+    for i in range(args.workspaces):
+        server.call(server.put_object, "devworkspaces", "independent", workspace_body(f"ws-{i}", "independent"))
+    await wait_for_handlers(args.workspaces)
+    independent = report(started, before)
+    handlers.clear()
+
+    # set：一个 DevWorkspaceSet，模板缓存同样为冷
+    main.template_cache.delete("python-3.9")
+    workspace_set = server.call(server.put_object, "devworkspacesets", "set", {
+        "apiVersion": "devworkspace.kubesphere.io/v1alpha1",
+        "kind": "DevWorkspaceSet",
+        "metadata": {"name": "class"},
+        "spec": {
+            "templateRef": "python-3.9",
+            "replicas": args.workspaces,
+            "maxConcurrency": args.concurrency,
+            "qps": args.qps,
+        },
+    })
+    before, server.max_inflight = snapshot(), 0
+    started = time.perf_counter()
+    await main.reconcile_workspace_set(
+        body=workspace_set, name="class", namespace="set", spec=workspace_set["spec"],
+        workspaces_by_set={}, logger=logger
+    )
+    await wait_for_handlers(args.workspaces)
+    batched = report(started, before)
+
+    phases = {}
+    for (plural, namespace, _), obj in server.objects.items():
+        if plural == "devworkspaces" and namespace == "set":
+            phase = obj.get("status", {}).get("phase", "None")
+            phases[phase] = phases.get(phase, 0) + 1
+    members = [{"phase": phase} for phase, count in phases.items() for _ in range(count)]
+    server.stop()
+
+    return {
+        "benchmark": "workspace_set",
+        "workspaces": args.workspaces,
+        "maxConcurrency": args.concurrency,
+        "qps": args.qps,
+        "apiLatencyMs": args.latency * 1000,
+        "independent": independent,
+        "set": batched,
+        "setStatus": main.aggregate(members, args.workspaces),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workspaces", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20, help="DevWorkspaceSet 的 spec.maxConcurrency")
+    parser.add_argument("--qps", type=float, default=200, help="DevWorkspaceSet 的 spec.qps")
+    parser.add_argument("--latency", type=float, default=0.02, help="每个 API 请求的模拟延迟（秒）")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+"""
+用于基准测试的本地假 Kubernetes API Server
+
+只实现 Operator 实际用到的那一小部分 REST 接口（核心资源的增删改查、按标签 / 命名空间字段分页 LIST、WATCH 和 server-side apply、
+自定义资源及其 status 子资源），对象全部保存在内存中。
+可选地模拟集群中其他组件的延迟：Pod 创建后经过 pod_start_delay 秒（加上随机抖动）进入 Running，
+Service 创建后经过 cluster_ip_delay 秒才分配 ClusterIP，两者都通过 watch 事件通知。
+存储部分是一个最小的 CSI 替身：VolumeSnapshot 创建后立即 readyToUse，以 dataSource 创建的 PVC 在数据源存在时立即 Bound，
+数据源不存在时保持 Pending（与真实的 provisioner 一样一直等待），PVC 的 dataSource 创建后不可修改。每个请求都会额外等待 latency 秒，用来模拟真实集群的网络往返。
+服务运行在独立线程的事件循环中，因此可以被同步的 kubernetes 客户端直接访问。
+"""
+
+import asyncio
+import collections
+import copy
+import datetime
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import uuid
+
+from aiohttp import web
+
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+def _status(code: int, reason: str, message: str) -> web.Response:
+    return web.json_response({
+        "kind": "Status",
+        "apiVersion": "v1",
+        "status": "Failure" if code >= 400 else "Success",
+        "reason": reason,
+        "message": message,
+        "code": code,
+    }, status=code)
+
+
+# strategic merge patch 中按元素的某个字段合并的列表（patchMergeKey），其余元素带有 name 的列表按 name 合并
+_MERGE_KEYS = {"ownerReferences": "uid"}
+
+
+def _merge(target: Dict[str, Any], patch: Dict[str, Any], strategic: bool = False):
+    """
+    JSON merge patch（RFC 7386）
+
+    strategic 为 True 时近似 strategic merge patch：ownerReferences 按 uid 合并，
+    元素带有 name 的列表（例如 containers）按 name 合并，而不是整体替换。
+    """
+    for key, value in patch.items():
+        merge_key = _MERGE_KEYS.get(key, "name")
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value, strategic)
+        elif strategic and isinstance(value, list) and isinstance(target.get(key), list) \
+                and all(isinstance(item, dict) and merge_key in item for item in value):
+            existing = {item.get(merge_key): item for item in target[key] if isinstance(item, dict)}
+            for item in value:
+                if item[merge_key] in existing:
+                    _merge(existing[item[merge_key]], item, strategic)
+                else:
+                    target[key].append(copy.deepcopy(item))
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+def _validate(obj: Dict[str, Any]) -> Optional[web.Response]:
+    """与真实 API Server 相同的对象校验（只实现 Operator 可能违反的那部分），通过时返回 None"""
+    references = (obj.get("metadata") or {}).get("ownerReferences") or []
+    if sum(1 for reference in references if reference.get("controller")) > 1:
+        return _status(422, "Invalid", "metadata.ownerReferences: Only one reference can have Controller set to true")
+    return None
+
+
+# watch 可以从多旧的 resourceVersion 开始回放（最近的事件数），更早的 resourceVersion 返回 410
+WATCH_HISTORY = 2000
+
+
+# 标签选择器中表示“标签不存在”的值
+_ABSENT = object()
+
+
+def _parse_selector(selector: str) -> List[Tuple[str, Any]]:
+    """解析等值形式的标签选择器（"a=b,c,!d"），值为 None 表示只要求标签存在，_ABSENT 表示要求标签不存在"""
+    requirements: List[Tuple[str, Any]] = []
+    for term in filter(None, (part.strip() for part in selector.split(","))):
+        if term.startswith("!"):
+            requirements.append((term[1:].strip(), _ABSENT))
+            continue
+        key, sep, value = term.partition("=")
+        requirements.append((key.strip(), value.lstrip("=").strip() if sep else None))
+    return requirements
+
+
+def _matches(labels: Dict[str, str], requirements: List[Tuple[str, Any]]) -> bool:
+    return all(
+        key not in labels if value is _ABSENT else key in labels and (value is None or labels[key] == value)
+        for key, value in requirements
+    )
+
+
+def _field_namespace(selector: str) -> Optional[str]:
+    """字段选择器中 metadata.namespace 的值（只支持这一个字段）"""
+    for term in filter(None, (part.strip() for part in selector.split(","))):
+        key, _, value = term.partition("=")
+        if key.strip() == "metadata.namespace":
+            return value.strip()
+    return None
+
+
+class FakeApiServer:
+    """
+    内存中的假 API Server
+
+    Args:
+        latency: 每个请求额外增加的延迟（秒）
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        # 是否提供 Pod 的 resize 子资源
+        self.resize_supported = True
+        # (plural, namespace, name) -> object；集群级别对象的 namespace 为 None
+        self.objects: Dict[Tuple[str, Optional[str], str], Dict[str, Any]] = {}
+        # (method, plural) -> 请求次数
+        self.requests = collections.Counter()
+        # 同时处理中的请求数及其峰值
+        self.inflight = 0
+        self.max_inflight = 0
+        # 接下来的若干个请求直接返回错误：[剩余次数, 状态码, Retry-After]
+        self._faults: List[Any] = [0, 0, None]
+        self._resource_version = itertools.count(1)
+        # 对象变化的订阅者，参数为 (事件类型, plural, 对象)，在服务线程中调用
+        self._subscribers: List[Callable[[str, str, Dict[str, Any]], None]] = []
+        # 最近的事件 (resourceVersion, plural, namespace, labels, 编码后的事件)，以及已经被挤出窗口的最大 resourceVersion
+        self._history: Deque[Tuple[int, str, Optional[str], Dict[str, str], bytes]] = collections.deque(maxlen=WATCH_HISTORY)
+        self._history_floor = 0
+        # 进行中的 watch：(plural, namespace, 选择器, 事件队列)
+        self._watchers: List[Tuple[str, Optional[str], List[Tuple[str, Any]], asyncio.Queue]] = []
+        # Pod 进入 Running 的延迟（秒，None 表示一直 Pending）和相对抖动，Service 分配 ClusterIP 的延迟（秒）
+        self.pod_start_delay: Optional[float] = None
+        self.pod_start_jitter = 0.0
+        self.cluster_ip_delay = 0.0
+        self._random = random.Random(0)
+        self._cluster_ips = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self.url: Optional[str] = None
+
+    # ---- 生命周期 ----
+
+    def start(self) -> str:
+        """在后台线程中启动服务，返回服务地址"""
+        self._thread = threading.Thread(target=self._serve, name="fake-apiserver", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self.url
+
+    def stop(self):
+        """停止服务，进行中的 watch 立即结束"""
+        if self._loop and self._runner:
+            self.call(self._close_watches)
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def call(self, fn, *args, **kwargs):
+        """在服务线程的事件循环中执行一个同步函数（用于在测试脚本中安全地修改对象）"""
+        future = asyncio.run_coroutine_threadsafe(self._invoke(fn, *args, **kwargs), self._loop)
+        return future.result()
+
+    async def _invoke(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    def write_kubeconfig(self) -> str:
+        """生成一个指向本服务的 kubeconfig 文件，返回文件路径"""
+        fd, path = tempfile.mkstemp(prefix="fake-kubeconfig-", suffix=".yaml")
+        with os.fdopen(fd, "w") as f:
+            json.dump({
+                "apiVersion": "v1",
+                "kind": "Config",
+                "clusters": [{"name": "fake", "cluster": {"server": self.url}}],
+                "users": [{"name": "fake", "user": {"token": "fake"}}],
+                "contexts": [{"name": "fake", "context": {"cluster": "fake", "user": "fake"}}],
+                "current-context": "fake",
+            }, f)
+        return path
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        app = web.Application(middlewares=[self._middleware])
+        self._add_routes(app)
+        self._runner = web.AppRunner(app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        self._started.set()
+        self._loop.run_forever()
+
+    def inject_errors(self, count: int, status: int, retry_after: Optional[float] = None):
+        """让接下来的 count 个请求直接返回 status（例如 429 / 503），可选带上 Retry-After 头"""
+        self._faults = [count, status, retry_after]
+
+    # ---- 对象存储 ----
+
+    def subscribe(self, callback: Callable[[str, str, Dict[str, Any]], None]):
+        """
+        订阅对象的变化（ADDED / MODIFIED / DELETED），用于在基准测试中模拟 kopf 的 watch
+
+        回调在服务线程中执行，需要自行切换到调用方的事件循环（例如 loop.call_soon_threadsafe）。
+        """
+        self._subscribers.append(callback)
+
+    def _notify(self, event_type: str, plural: str, obj: Dict[str, Any]):
+        for callback in self._subscribers:
+            callback(event_type, plural, copy.deepcopy(obj))
+        meta = obj.get("metadata", {})
+        labels = meta.get("labels") or {}
+        # 事件在发生时编码一次，所有 watch 共享
+        line = (json.dumps({"type": event_type, "object": obj}) + "\n").encode()
+        if len(self._history) == self._history.maxlen:
+            self._history_floor = self._history[0][0]
+        self._history.append((int(meta["resourceVersion"]), plural, meta.get("namespace"), labels, line))
+        for kind, namespace, selector, queue in self._watchers:
+            if kind == plural and (namespace is None or namespace == meta.get("namespace")) and _matches(labels, selector):
+                queue.put_nowait(line)
+
+    def _close_watches(self):
+        for _, _, _, queue in self._watchers:
+            queue.put_nowait(None)
+
+    def _later(self, delay: float, fn: Callable[..., None], *args):
+        """在服务线程的事件循环中 delay 秒后执行 fn（可以从任意线程调用）"""
+        self._loop.call_soon_threadsafe(self._loop.call_later, delay, fn, *args)
+
+    def _transition(self, key: Tuple[str, Optional[str], str], uid: str, change: Callable[[Dict[str, Any]], bool]):
+        """对仍然存在（uid 相同）的对象执行 change，发生变化时通知 MODIFIED"""
+        obj = self.objects.get(key)
+        if obj is None or obj["metadata"].get("uid") != uid or not change(obj):
+            return
+        obj["metadata"]["resourceVersion"] = str(next(self._resource_version))
+        self._notify("MODIFIED", key[0], obj)
+
+    def _start_pod(self, pod: Dict[str, Any]) -> bool:
+        status = pod.setdefault("status", {})
+        if status.get("phase") != "Pending":
+            return False
+        status["phase"] = "Running"
+        return True
+
+    def _assign_cluster_ip(self, service: Dict[str, Any]) -> bool:
+        spec = service.setdefault("spec", {})
+        if spec.get("clusterIP"):
+            return False
+        spec["clusterIP"] = self._next_cluster_ip()
+        return True
+
+    def _next_cluster_ip(self) -> str:
+        n = next(self._cluster_ips)
+        return f"10.96.{n // 250}.{n % 250 + 1}"
+
+    def put_object(self, plural: str, namespace: Optional[str], obj: Dict[str, Any]) -> Dict[str, Any]:
+        """直接写入一个对象（不经过 HTTP，也不计入请求次数）"""
+        obj = copy.deepcopy(obj)
+        meta = obj.setdefault("metadata", {})
+        if namespace is not None:
+            meta["namespace"] = namespace
+        meta.setdefault("uid", str(uuid.uuid4()))
+        meta.setdefault("creationTimestamp", datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"))
+        meta.setdefault("generation", 1)
+        meta["resourceVersion"] = str(next(self._resource_version))
+        self._default(plural, obj)
+        key = (plural, namespace, meta["name"])
+        event_type = "MODIFIED" if key in self.objects else "ADDED"
+        self.objects[key] = obj
+        self._notify(event_type, plural, obj)
+        return obj
+
+    def _default(self, plural: str, obj: Dict[str, Any]):
+        """模拟 API Server 为新对象填充的默认值"""
+        meta = obj["metadata"]
+        key = (plural, meta.get("namespace"), meta["name"])
+        if plural == "pods":
+            obj.setdefault("status", {}).setdefault("phase", "Pending")
+            if self.pod_start_delay is not None and obj["status"]["phase"] == "Pending":
+                jitter = 1 + self._random.uniform(-self.pod_start_jitter, self.pod_start_jitter)
+                self._later(max(0.0, self.pod_start_delay * jitter), self._transition, key, meta["uid"], self._start_pod)
+        elif plural == "services":
+            spec = obj.setdefault("spec", {})
+            if spec.get("clusterIP"):
+                pass
+            elif self.cluster_ip_delay > 0:
+                self._later(self.cluster_ip_delay, self._transition, key, meta["uid"], self._assign_cluster_ip)
+            else:
+                spec["clusterIP"] = self._next_cluster_ip()
+        elif plural == "persistentvolumeclaims":
+            obj.setdefault("status", {}).setdefault("phase", "Bound" if self._source_exists(obj) else "Pending")
+        elif plural == "volumesnapshots":
+            source = obj.get("spec", {}).get("source", {}).get("persistentVolumeClaimName")
+            ready = (("persistentvolumeclaims", obj["metadata"].get("namespace"), source) in self.objects)
+            status = {"readyToUse": True, "restoreSize": "10Gi"} if ready else {"readyToUse": False, "error": {"message": f"source PVC {source} not found"}}
+            obj.setdefault("status", status)
+
+    def _source_exists(self, pvc: Dict[str, Any]) -> bool:
+        """PVC 的数据源（VolumeSnapshot 或另一个 PVC）是否存在于同一个命名空间"""
+        source = pvc.get("spec", {}).get("dataSource")
+        if not source:
+            return True
+        plural = "volumesnapshots" if source.get("kind") == "VolumeSnapshot" else "persistentvolumeclaims"
+        return (plural, pvc["metadata"].get("namespace"), source.get("name")) in self.objects
+
+    # ---- HTTP ----
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        # 长期挂起的 watch 不计入同时处理中的请求数
+        watching = request.query.get("watch") in ("true", "1", "True")
+        self.inflight += 0 if watching else 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            plural = request.match_info.get("plural", "")
+            self.requests[(request.method, plural)] += 1
+            if self._faults[0] > 0:
+                self._faults[0] -= 1
+                response = _status(self._faults[1], "Injected", "injected fault")
+                if self._faults[2] is not None:
+                    response.headers["Retry-After"] = str(self._faults[2])
+                return response
+            return await handler(request)
+        finally:
+            self.inflight -= 0 if watching else 1
+
+    def _add_routes(self, app: web.Application):
+        core = "/api/v1/namespaces/{namespace}/{plural}"
+        custom = "/apis/{group}/{version}/namespaces/{namespace}/{plural}"
+        cluster = "/apis/{group}/{version}/{plural}"
+        app.router.add_get("/api/v1/{plural}", self._list)
+        app.router.add_get(core, self._list)
+        app.router.add_post(core, self._create)
+        app.router.add_get(core + "/{name}", self._get)
+        app.router.add_delete(core + "/{name}", self._delete)
+        app.router.add_patch(core + "/{name}", self._patch)
+        # Pod 的 resize 子资源（Kubernetes 1.33+），resize_supported 为 False 时模拟旧集群返回 404
+        app.router.add_patch(core + "/{name}/resize", self._resize)
+        app.router.add_post(custom, self._create)
+        app.router.add_get(custom + "/{name}", self._get)
+        app.router.add_delete(custom + "/{name}", self._delete)
+        app.router.add_patch(custom + "/{name}", self._patch)
+        app.router.add_patch(custom + "/{name}/status", self._patch)
+        app.router.add_get(cluster, self._list)
+        app.router.add_get(cluster + "/{name}", self._get)
+        app.router.add_patch(cluster + "/{name}", self._patch)
+        app.router.add_patch(cluster + "/{name}/status", self._patch)
+
+    async def _create(self, request: web.Request) -> web.Response:
+        plural = request.match_info["plural"]
+        namespace = request.match_info.get("namespace")
+        body = await request.json()
+        name = body.get("metadata", {}).get("name")
+        if (plural, namespace, name) in self.objects:
+            return _status(409, "AlreadyExists", f'{plural} "{name}" already exists')
+        obj = self.put_object(plural, namespace, body)
+        return web.json_response(obj, status=201)
+
+    async def _list(self, request: web.Request) -> web.Response:
+        plural = request.match_info["plural"]
+        namespace = request.match_info.get("namespace") or _field_namespace(request.query.get("fieldSelector", ""))
+        selector = _parse_selector(request.query.get("labelSelector", ""))
+        if request.query.get("watch") in ("true", "1", "True"):
+            return await self._watch(request, plural, namespace, selector)
+        # 分页：continue 为 "<resourceVersion>:<偏移>"，同一次 LIST 的各页返回相同的 resourceVersion
+        token = request.query.get("continue")
+        resource_version, offset = token.split(":") if token else (str(next(self._resource_version)), "0")
+        offset, limit = int(offset), int(request.query.get("limit") or 0)
+        items = [
+            obj for (kind, ns, _), obj in self.objects.items()
+            if kind == plural and (namespace is None or ns == namespace)
+            and _matches(obj.get("metadata", {}).get("labels") or {}, selector)
+        ]
+        metadata = {"resourceVersion": resource_version}
+        if limit and offset + limit < len(items):
+            metadata["continue"] = f"{resource_version}:{offset + limit}"
+        return web.json_response({
+            "kind": "List",
+            "apiVersion": "v1",
+            "metadata": metadata,
+            "items": items[offset:offset + limit] if limit else items[offset:],
+        })
+
+    async def _watch(
+        self,
+        request: web.Request,
+        plural: str,
+        namespace: Optional[str],
+        selector: List[Tuple[str, Any]]
+    ) -> web.StreamResponse:
+        """以换行分隔的 JSON 流返回 resourceVersion 之后的事件，直到 timeoutSeconds 到期或客户端断开"""
+        since = int(request.query.get("resourceVersion") or 0)
+        timeout = float(request.query.get("timeoutSeconds") or 300)
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await response.prepare(request)
+        if since and since < self._history_floor:
+            expired = {"type": "ERROR", "object": {"kind": "Status", "apiVersion": "v1", "status": "Failure",
+                                                   "reason": "Expired", "message": "too old resource version", "code": 410}}
+            await response.write((json.dumps(expired) + "\n").encode())
+            return response
+
+        # 回放窗口中的事件和注册 watch 之间没有 await，不会漏掉事件
+        queue: asyncio.Queue = asyncio.Queue()
+        backlog = [
+            line for rv, kind, ns, labels, line in self._history
+            if rv > since and kind == plural and (namespace is None or ns == namespace) and _matches(labels, selector)
+        ]
+        watcher = (plural, namespace, selector, queue)
+        self._watchers.append(watcher)
+        try:
+            for line in backlog:
+                await response.write(line)
+            deadline = self._loop.time() + timeout
+            while True:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    line = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if line is None:
+                    break
+                await response.write(line)
+        except ConnectionResetError:
+            pass
+        finally:
+            self._watchers.remove(watcher)
+        return response
+
+    async def _get(self, request: web.Request) -> web.Response:
+        key = (request.match_info["plural"], request.match_info.get("namespace"), request.match_info["name"])
+        obj = self.objects.get(key)
+        if obj is None:
+            return _status(404, "NotFound", f'{key[0]} "{key[2]}" not found')
+        return web.json_response(obj)
+
+    async def _delete(self, request: web.Request) -> web.Response:
+        key = (request.match_info["plural"], request.match_info.get("namespace"), request.match_info["name"])
+        obj = self.objects.pop(key, None)
+        if obj is None:
+            return _status(404, "NotFound", f'{key[0]} "{key[2]}" not found')
+        obj["metadata"]["resourceVersion"] = str(next(self._resource_version))
+        self._notify("DELETED", key[0], obj)
+        return web.json_response(obj)
+
+    async def _resize(self, request: web.Request) -> web.Response:
+        if not self.resize_supported or request.match_info["plural"] != "pods":
+            return _status(404, "NotFound", "the server could not find the requested resource")
+        return await self._patch(request)
+
+    async def _patch(self, request: web.Request) -> web.Response:
+        key = (request.match_info["plural"], request.match_info.get("namespace"), request.match_info["name"])
+        obj = self.objects.get(key)
+        patch = await request.json()
+        if request.content_type == "application/apply-patch+yaml" and obj is None:
+            # server-side apply：对象不存在时直接创建
+            obj = self.put_object(key[0], key[1], patch)
+            return web.json_response(obj, status=201)
+        if obj is None:
+            return _status(404, "NotFound", f'{key[0]} "{key[2]}" not found')
+        if key[0] == "persistentvolumeclaims" and isinstance(patch, dict) \
+                and "dataSource" in patch.get("spec", {}) and patch["spec"]["dataSource"] != obj.get("spec", {}).get("dataSource"):
+            return _status(422, "Invalid", "spec is immutable after creation except resources.requests")
+        if isinstance(patch, dict):
+            expected = (patch.get("metadata") or {}).get("resourceVersion")
+            if expected and expected != obj["metadata"].get("resourceVersion"):
+                return _status(409, "Conflict", f'Operation cannot be fulfilled on {key[0]} "{key[2]}": the object has been modified')
+            # 先在副本上合并，校验失败时对象保持不变
+            merged = copy.deepcopy(obj)
+            _merge(merged, patch, request.content_type == "application/strategic-merge-patch+json")
+            invalid = _validate(merged)
+            if invalid is not None:
+                return invalid
+            obj.clear()
+            obj.update(merged)
+        obj["metadata"]["resourceVersion"] = str(next(self._resource_version))
+        self._notify("MODIFIED", key[0], obj)
+        return web.json_response(obj)
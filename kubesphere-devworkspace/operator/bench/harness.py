@@ -0,0 +1,78 @@
+"""
+基准测试的公共工具：启动假 API Server、加载 Operator 模块、统计延迟分布
+"""
+
+import importlib
+import os
+import sys
+
+from typing import Dict, List, Tuple
+
+from fake_apiserver import FakeApiServer
+
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+EXAMPLE_TEMPLATE = {
+    "apiVersion": "devworkspace.kubesphere.io/v1alpha1",
+    "kind": "DevWorkspaceTemplate",
+    "metadata": {"name": "python-3.9"},
+    "spec": {
+        "displayName": "Python 3.9",
+        "environment": {"image": "codercom/code-server:4.9.1"},
+        "resources": {
+            "requests": {"cpu": "500m", "memory": "1Gi"},
+            "limits": {"cpu": "1", "memory": "2Gi"},
+        },
+        "storage": {"size": "5Gi"},
+        "ports": [{"name": "http", "containerPort": 8080, "protocol": "TCP"}],
+    },
+}
+
+
+def start_fake_cluster(latency: float) -> Tuple[FakeApiServer, object]:
+    """
+    启动假 API Server，并让 Operator 模块连接到它
+
+    Returns:
+        (假 API Server, 已导入的 main 模块)
+    """
+    server = FakeApiServer(latency=latency)
+    server.start()
+    server.put_object("devworkspacetemplates", None, EXAMPLE_TEMPLATE)
+
+    os.environ.pop("KUBERNETES_SERVICE_HOST", None)  # 强制使用 kubeconfig 而不是 in-cluster 配置
+    kubeconfig = server.write_kubeconfig()
+    os.environ["KUBECONFIG"] = kubeconfig
+    # kubernetes 客户端在导入时就读取了 KUBECONFIG，如果已经被导入过需要同步修改默认路径
+    from kubernetes.config import kube_config
+    kube_config.KUBE_CONFIG_DEFAULT_LOCATION = kubeconfig
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+    main = importlib.import_module("main")
+    # 导入 main 没有副作用，这里显式创建运行上下文（加载上面的 kubeconfig）
+    main.operator_context()
+    return server, main
+
+
+def workspace_body(name: str, namespace: str, template: str = "python-3.9") -> Dict[str, object]:
+    """构造一个最小的 DevWorkspace 对象"""
+    return {
+        "apiVersion": "devworkspace.kubesphere.io/v1alpha1",
+        "kind": "DevWorkspace",
+        "metadata": {"name": name, "namespace": namespace},
+        "spec": {"templateRef": template},
+    }
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """计算 p50 / p95 / p99 / max（毫秒）"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 2)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": pick(1.0)}
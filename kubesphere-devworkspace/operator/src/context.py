@@ -0,0 +1,86 @@
+"""
+Operator 的运行上下文
+
+导入 main.py 不再有任何副作用：kube config 的加载、Kubernetes 客户端和执行 API 调用的线程池
+都集中在 OperatorContext 中，由 main() 启动时显式创建；
+基准测试等在进程内直接调用 handler 的场景，在第一次访问 API 时惰性创建（见 main.operator_context）。
+"""
+
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from kubernetes import client, config
+
+
+def load_kube_config(logger: logging.Logger):
+    """
+    加载 Kubernetes 配置：优先使用 in-cluster 配置，其次是 kubeconfig
+
+    Raises:
+        kubernetes.config.ConfigException: 两种配置都不可用
+    """
+    try:
+        config.load_incluster_config()  # 如果代码在集群内部运行
+        logger.info("Running inside Kubernetes cluster, using in-cluster config")
+    except config.ConfigException:
+        try:
+            config.load_kube_config()  # 如果代码在集群外部运行
+            logger.info("Running outside Kubernetes cluster, using kubeconfig")
+        except config.ConfigException:
+            logger.error("Could not configure kubernetes client")
+            raise
+
+
+class OperatorContext:
+    """
+    一个 Operator 进程共享的 Kubernetes 客户端和执行资源
+
+    Attributes:
+        api_client: 共享连接池的 ApiClient
+        core_v1 / custom_api / apps_v1 / coordination_v1: 基于 api_client 的各组 API
+        executor: 执行同步 API 调用的线程池，线程数与连接池中留给请求的连接数一致
+        setup_seconds: 加载配置并构造客户端的耗时
+    """
+
+    __slots__ = ("api_client", "core_v1", "custom_api", "apps_v1", "coordination_v1", "executor", "setup_seconds")
+
+    def __init__(self, api_client: client.ApiClient, pool_size: int):
+        self.api_client = api_client
+        self.core_v1 = client.CoreV1Api(api_client)
+        self.custom_api = client.CustomObjectsApi(api_client)
+        self.apps_v1 = client.AppsV1Api(api_client)
+        self.coordination_v1 = client.CoordinationV1Api(api_client)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="k8s-api")
+        self.setup_seconds = 0.0
+
+    @classmethod
+    def create(cls, pool_size: int, extra_connections: int, logger: logging.Logger) -> "OperatorContext":
+        """
+        加载 kube config 并构造客户端
+
+        urllib3 默认每个主机只保留 10 个连接，并发请求超过时会不断新建、丢弃连接，
+        因此连接池按线程数加上长期占用连接的 watch 数量配置。
+
+        Args:
+            pool_size: 同时进行中的 API 请求数上限（线程数）
+            extra_connections: 为长期占用连接的 watch 额外预留的连接数
+            logger: 日志对象
+
+        Returns:
+            OperatorContext
+        """
+        started = time.perf_counter()
+        load_kube_config(logger)
+        configuration = client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = pool_size + extra_connections
+        context = cls(client.ApiClient(configuration), pool_size)
+        context.setup_seconds = time.perf_counter() - started
+        return context
+
+    def close(self):
+        """关闭线程池和连接池，正在执行的请求不会被中断"""
+        self.executor.shutdown(wait=False)
+        self.api_client.close()
+        self.api_client.rest_client.pool_manager.clear()
@@ -0,0 +1,180 @@
+"""
+周期性的漂移检测
+
+informer 的 watch 在断线重连期间可能漏掉事件，Pod / Service / PVC 也可能被人手动删除，
+而 DevWorkspace 的 status 仍停留在 Running，url 指向已经不存在的 ClusterIP。
+每个周期按 app=devworkspace 标签各 LIST 一次 Pod、Service、PVC（固定 3 次 API 调用，与工作空间数量无关），
+把结果整理成 ClusterSnapshot，再与内存中（kopf 索引中的 WorkspaceRecord）的所有 DevWorkspace 逐一比较，
+只有出现漂移的工作空间才会被修复或更新 status。
+
+为避免与正在进行的变更竞争（例如重建 Pod 时旧 Pod 已删除、新 Pod 尚未创建），
+同一个漂移必须在连续两个周期中都被观察到，才会交给 Operator 修复（见 DriftTracker）。
+"""
+
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+
+# 漂移的种类
+DRIFT_PVC_MISSING = "pvc_missing"            # PVC 不存在：数据已经丢失，只能把工作空间标记为 Failed
+DRIFT_SERVICE_MISSING = "service_missing"    # Service 不存在：重新创建
+DRIFT_POD_MISSING = "pod_missing"            # Running / Starting 的工作空间没有 Pod：重新创建
+DRIFT_POD_NOT_RUNNING = "pod_not_running"    # Running 的工作空间的 Pod 不在运行：回到 Starting 重新等待
+DRIFT_URL_STALE = "url_stale"                # status.url 与 Service 当前的 ClusterIP / 端口不一致：更新 url
+
+DRIFT_KINDS = (DRIFT_PVC_MISSING, DRIFT_SERVICE_MISSING, DRIFT_POD_MISSING, DRIFT_POD_NOT_RUNNING, DRIFT_URL_STALE)
+
+# 参与检查的阶段，Provisioning / Failed 等阶段由各自的 handler 负责
+CHECKED_PHASES = ("Running", "Starting", "Stopped")
+
+Key = Tuple[str, str]
+
+
+def _key(obj: Mapping[str, Any]) -> Key:
+    metadata = obj.get("metadata") or {}
+    return metadata.get("namespace"), metadata.get("name")
+
+
+def compact_item(obj: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    LIST 的一个 item 中 ClusterSnapshot 需要的部分（形式不变），分页 LIST 时每页解码后立即精简，
+    一个周期内不会同时持有所有 Pod / Service / PVC 的完整对象
+    """
+    metadata = obj.get("metadata") or {}
+    spec = obj.get("spec") or {}
+    compact: Dict[str, Any] = {"metadata": {
+        "namespace": metadata.get("namespace"),
+        "name": metadata.get("name"),
+        "deletionTimestamp": metadata.get("deletionTimestamp"),
+    }}
+    if "phase" in (obj.get("status") or {}):
+        compact["status"] = {"phase": obj["status"]["phase"]}
+    if "clusterIP" in spec:
+        compact["spec"] = {"clusterIP": spec["clusterIP"], "ports": (spec.get("ports") or [])[:1]}
+    return compact
+
+
+def _pod_phase(pod: Mapping[str, Any]) -> Optional[str]:
+    """Pod 的阶段，正在删除的 Pod 记为 Terminating"""
+    if (pod.get("metadata") or {}).get("deletionTimestamp"):
+        return "Terminating"
+    return (pod.get("status") or {}).get("phase")
+
+
+def _service_url(service: Mapping[str, Any]) -> Optional[str]:
+    """与 get_service_url 相同格式的访问 URL，尚未分配 ClusterIP 时为 None"""
+    spec = service.get("spec") or {}
+    cluster_ip, ports = spec.get("clusterIP"), spec.get("ports") or ()
+    if not cluster_ip or cluster_ip == "None" or not ports:
+        return None
+    return f"http://{cluster_ip}:{ports[0].get('port')}"
+
+
+class ClusterSnapshot:
+    """
+    一个周期内 LIST 到的 Pod / Service / PVC，只保留比较需要的字段
+
+    Attributes:
+        pods: (namespace, name) -> Pod 的阶段
+        services: (namespace, name) -> 访问 URL（尚未分配 ClusterIP 时为 None）
+        pvcs: 存在的 PVC 的 (namespace, name) 集合
+    """
+
+    __slots__ = ("pods", "services", "pvcs")
+
+    def __init__(self, pods: Dict[Key, Optional[str]], services: Dict[Key, Optional[str]], pvcs: frozenset):
+        self.pods = pods
+        self.services = services
+        self.pvcs = pvcs
+
+    @classmethod
+    def from_lists(
+        cls,
+        pods: Iterable[Mapping[str, Any]],
+        services: Iterable[Mapping[str, Any]],
+        pvcs: Iterable[Mapping[str, Any]]
+    ) -> "ClusterSnapshot":
+        """
+        由三次 LIST 返回的 items（JSON 解码后的 dict）构造快照
+
+        正在删除的 PVC 视为不存在。
+        """
+        return cls(
+            {_key(pod): _pod_phase(pod) for pod in pods},
+            {_key(service): _service_url(service) for service in services},
+            frozenset(
+                _key(pvc) for pvc in pvcs
+                if not (pvc.get("metadata") or {}).get("deletionTimestamp")
+            ),
+        )
+
+
+def detect_drift(workspace: Any, snapshot: ClusterSnapshot) -> Optional[str]:
+    """
+    比较一个工作空间的 status 与集群中的实际对象
+
+    每个工作空间最多报告一种漂移，按 PVC、Service、Pod、url 的顺序检查，前面的修复往往会顺带解决后面的问题。
+
+    Args:
+        workspace: workspaces_by_template 索引中的 WorkspaceRecord
+        snapshot: 本周期的 ClusterSnapshot
+
+    Returns:
+        漂移的种类（DRIFT_*），没有漂移时为 None
+    """
+    phase = workspace.phase
+    if phase not in CHECKED_PHASES:
+        return None
+    name, namespace = workspace.name, workspace.namespace
+
+    pvc_name = workspace.pvc_name
+    if pvc_name and (namespace, pvc_name) not in snapshot.pvcs:
+        return DRIFT_PVC_MISSING
+
+    service_name = workspace.service_name or name
+    if (namespace, service_name) not in snapshot.services:
+        return DRIFT_SERVICE_MISSING
+    if phase == "Stopped":
+        return None
+
+    pod_key = (namespace, workspace.pod_name or name)
+    if pod_key not in snapshot.pods:
+        return DRIFT_POD_MISSING
+    if phase == "Starting":
+        # Pod 尚未运行是正常的，由 advance_starting_workspace 继续等待
+        return None
+    if snapshot.pods[pod_key] != "Running":
+        return DRIFT_POD_NOT_RUNNING
+
+    url = snapshot.services[(namespace, service_name)]
+    if url and workspace.url != url:
+        return DRIFT_URL_STALE
+    return None
+
+
+class DriftTracker:
+    """
+    只确认在连续两个周期中保持不变的漂移
+
+    上一个周期观察到、本周期仍然存在且种类相同的漂移才会被确认；
+    确认的漂移交给调用方修复后即被遗忘，修复没有生效时需要重新观察两个周期。
+    """
+
+    __slots__ = ("_pending",)
+
+    def __init__(self):
+        self._pending: Dict[Key, str] = {}
+
+    def confirm(self, observed: Dict[Key, str]) -> Dict[Key, str]:
+        """
+        Args:
+            observed: 本周期观察到的 (namespace, name) -> 漂移种类
+
+        Returns:
+            需要修复的 (namespace, name) -> 漂移种类
+        """
+        confirmed = {key: drift for key, drift in observed.items() if self._pending.get(key) == drift}
+        self._pending = {key: drift for key, drift in observed.items() if key not in confirmed}
+        return confirmed
+
+    def __len__(self) -> int:
+        return len(self._pending)
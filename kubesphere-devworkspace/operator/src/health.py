@@ -0,0 +1,79 @@
+"""
+启动耗时与就绪检查
+
+StartupTracker 记录启动过程中各阶段完成的时间（相对于 main.py 开始导入），并汇总若干就绪条件：
+- 存活（liveness）：事件循环能够及时响应即可，由 kopf 自带的 liveness 端点负责；
+- 就绪（readiness）：Kubernetes 客户端已经创建、共享的 watch 缓存都完成了首次 LIST（分片模式下还要求已加入成员列表）。
+  滚动重启时新副本就绪后旧副本才会退出，缓存是热的，新副本接手后不需要再等待。
+
+serve_readiness 在单独的端口上提供 /readyz：全部条件满足时返回 200，否则返回 503，响应体是各条件和阶段耗时的 JSON。
+Operator 退出（cleanup）时调用 drain()，readiness 立即变为未就绪。
+"""
+
+import logging
+import time
+
+from aiohttp import web
+
+from typing import Callable, Dict, Optional, Tuple
+
+
+class StartupTracker:
+    """
+    记录启动阶段的耗时并判断是否就绪
+
+    Args:
+        started: 计时起点（time.perf_counter() 的值）
+    """
+
+    def __init__(self, started: float):
+        self._started = started
+        self._stages: Dict[str, float] = {}
+        self._checks: Dict[str, Callable[[], bool]] = {}
+        self._draining = False
+
+    def mark(self, stage: str) -> float:
+        """记录一个阶段完成，返回从计时起点到现在的秒数；同一阶段只记录第一次"""
+        elapsed = time.perf_counter() - self._started
+        return self._stages.setdefault(stage, round(elapsed, 3))
+
+    def stage(self, stage: str) -> Optional[float]:
+        """阶段完成时距计时起点的秒数，尚未完成时为 None"""
+        return self._stages.get(stage)
+
+    def add_check(self, name: str, check: Callable[[], bool]):
+        """注册一个就绪条件，check 在每次检查时调用，必须足够廉价"""
+        self._checks[name] = check
+
+    def drain(self):
+        """Operator 即将退出，之后一直报告未就绪"""
+        self._draining = True
+
+    def report(self) -> Tuple[bool, Dict[str, object]]:
+        """
+        Returns:
+            (是否就绪, 各条件的结果和阶段耗时)
+        """
+        checks = {name: bool(check()) for name, check in self._checks.items()}
+        ready = not self._draining and all(checks.values())
+        return ready, {"ready": ready, "draining": self._draining, "checks": checks, "stages": dict(self._stages)}
+
+
+async def serve_readiness(tracker: StartupTracker, port: int, logger: logging.Logger) -> web.AppRunner:
+    """
+    在 port 上启动 /readyz 端点
+
+    Returns:
+        AppRunner，退出时调用 cleanup() 关闭
+    """
+    async def readyz(request: web.Request) -> web.Response:
+        ready, report = tracker.report()
+        return web.json_response(report, status=200 if ready else 503)
+
+    app = web.Application()
+    app.router.add_get("/readyz", readyz)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    logger.info(f"Serving readiness checks on port {port}")
+    return runner
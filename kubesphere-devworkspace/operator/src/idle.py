@@ -0,0 +1,134 @@
+"""
+空闲工作空间的活跃度检测
+
+Operator 通过 ActivityProbe 判断一个工作空间在最近一段时间内是否有人使用：
+
+- MetricsActivityProbe：读取 metrics-server（metrics.k8s.io）提供的 Pod CPU 用量，
+  超过阈值即视为活跃。code-server 在有连接时会持续消耗 CPU。
+- AnnotationActivityProbe：读取 DevWorkspace 上的 devworkspace.kubesphere.io/last-activity
+  注解（RFC 3339 时间戳），由网关或其他组件在有连接时刷新；
+  也可以作为本地 / 测试环境中没有 metrics-server 时的替代方案。
+
+"没有活动"和"无法判断"是两种结果：前者返回 None，空闲时长继续累计；
+后者抛出 ActivityUnknown，调用方不应据此暂停工作空间。
+"""
+
+import abc
+import datetime
+import re
+
+from kubernetes.client.rest import ApiException
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+LAST_ACTIVITY_ANNOTATION = "devworkspace.kubesphere.io/last-activity"
+
+_DURATION_RE = re.compile(r'^([0-9]+)(s|m|h)$')
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: Any) -> Optional[int]:
+    """
+    把 "90s"、"30m"、"2h" 这样的时长解析为秒数
+
+    Args:
+        value: 时长字符串或整数秒数
+
+    Returns:
+        秒数；value 为空或格式不合法时返回 None
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, int):
+        return value
+    match = _DURATION_RE.match(str(value))
+    if not match:
+        return None
+    return int(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+def parse_cpu(quantity: str) -> float:
+    """
+    把 Kubernetes 的 CPU 数量（例如 "250m"、"1"、"12345n"）解析为核数
+    """
+    suffixes = {"n": 1e-9, "u": 1e-6, "m": 1e-3}
+    if quantity and quantity[-1] in suffixes:
+        return float(quantity[:-1]) * suffixes[quantity[-1]]
+    return float(quantity)
+
+
+class ActivityUnknown(Exception):
+    """无法判断工作空间是否活跃（例如 metrics-server 未安装、尚未采集到该 Pod 或暂时不可用）"""
+
+
+class ActivityProbe(abc.ABC):
+    """
+    活跃度探测的接口
+
+    last_activity 返回最近一次观察到活动的时间（UTC），没有观察到活动时返回 None，
+    无法判断时抛出 ActivityUnknown。
+    """
+
+    @abc.abstractmethod
+    async def last_activity(self, name: str, namespace: str, body: Dict[str, Any]) -> Optional[datetime.datetime]:
+        """
+        返回工作空间最近一次活动的时间（UTC）
+
+        Returns:
+            最近一次活动的时间；没有观察到活动时返回 None
+
+        Raises:
+            ActivityUnknown: 无法判断工作空间是否活跃
+        """
+
+
+class AnnotationActivityProbe(ActivityProbe):
+    """
+    从 DevWorkspace 的 last-activity 注解读取最近一次活动时间
+
+    没有注解表示还没有上报过活动；注解的值不合法时无法判断，抛出 ActivityUnknown。
+    """
+
+    async def last_activity(self, name: str, namespace: str, body: Dict[str, Any]) -> Optional[datetime.datetime]:
+        value = body.get('metadata', {}).get('annotations', {}).get(LAST_ACTIVITY_ANNOTATION)
+        if not value:
+            return None
+        try:
+            parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise ActivityUnknown(f"invalid {LAST_ACTIVITY_ANNOTATION} annotation {value!r}")
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed
+
+
+class MetricsActivityProbe(ActivityProbe):
+    """
+    通过 metrics-server 的 Pod CPU 用量判断活跃度
+
+    读取 PodMetrics 失败（metrics-server 未安装或尚未采集到该 Pod 时为 404，
+    metrics API 不可用时为 503 等）或其中没有容器的用量时无法判断，抛出 ActivityUnknown。
+
+    Args:
+        fetch_pod_metrics: 读取 metrics.k8s.io/v1beta1 PodMetrics 的协程函数，参数为 (namespace, pod_name)
+        cpu_threshold: CPU 用量（核）超过该值即视为活跃
+    """
+
+    def __init__(self, fetch_pod_metrics: Callable[[str, str], Awaitable[Dict[str, Any]]], cpu_threshold: float):
+        self._fetch = fetch_pod_metrics
+        self._cpu_threshold = cpu_threshold
+
+    async def last_activity(self, name: str, namespace: str, body: Dict[str, Any]) -> Optional[datetime.datetime]:
+        pod_name = body.get('status', {}).get('podName') or name
+        try:
+            metrics = await self._fetch(namespace, pod_name)
+        except ApiException as e:
+            raise ActivityUnknown(f"failed to read metrics of pod {pod_name}: {e.status} {e.reason}") from e
+        containers = metrics.get('containers') or []
+        if not containers:
+            raise ActivityUnknown(f"no container metrics for pod {pod_name}")
+        usage = sum(parse_cpu(container.get('usage', {}).get('cpu', '0')) for container in containers)
+        if usage >= self._cpu_threshold:
+            return datetime.datetime.now(datetime.timezone.utc)
+        return None
@@ -0,0 +1,208 @@
+"""
+工作空间镜像的预拉取
+
+工作空间 Pod 落到一个没有缓存镜像的节点上时，整个镜像拉取都发生在等待 Pod 就绪的过程中。
+Operator 维护一个 DaemonSet，为所有 DevWorkspaceTemplate 和工作空间覆盖配置中用到的每个镜像各运行一个容器，
+从而让每个节点提前拉取这些镜像。
+
+镜像本身不一定带有 shell 或 sleep，因此 DaemonSet 的 init 容器先从一个很小的辅助镜像（busybox）
+把静态链接的 sleep 复制到共享的 emptyDir 中，各镜像容器再运行这个 sleep 常驻，几乎不消耗资源。
+
+各节点的拉取状态来自 DaemonSet Pod 的 containerStatuses，由 main.py 中的 informer 维护。
+"""
+
+import asyncio
+import hashlib
+import logging
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from informer import ResourceCache
+
+
+PREPULL_LABEL_SELECTOR = "app=devworkspace-image-prepull"
+
+# 容器等待原因中表示拉取失败的那些
+_PULL_FAILURE_REASONS = ("ErrImagePull", "ImagePullBackOff", "InvalidImageName", "ErrImageNeverPull")
+
+
+def container_name_for(image: str) -> str:
+    """
+    返回预拉取某个镜像的容器名称
+
+    名称由镜像名的哈希得到，镜像集合变化时已有镜像对应的容器保持不变。
+    """
+    return "img-" + hashlib.sha1(image.encode()).hexdigest()[:12]
+
+
+def daemonset_manifest(name: str, namespace: str, images: List[str], helper_image: str) -> Dict[str, Any]:
+    """
+    生成预拉取 DaemonSet 的清单
+
+    Args:
+        name: DaemonSet 名称
+        namespace: DaemonSet 所在的命名空间
+        images: 需要预拉取的镜像
+        helper_image: 提供静态 sleep 可执行文件的辅助镜像
+
+    Returns:
+        DaemonSet 清单
+    """
+    labels = {"app": "devworkspace-image-prepull"}
+    containers = [{
+        "name": container_name_for(image),
+        "image": image,
+        "command": ["/prepull/sleep", "2147483647"],
+        "volumeMounts": [{"name": "prepull", "mountPath": "/prepull"}],
+        "resources": {
+            "requests": {"cpu": "1m", "memory": "4Mi"},
+            "limits": {"cpu": "10m", "memory": "16Mi"}
+        }
+    } for image in images]
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "DaemonSet",
+        "metadata": {"name": name, "namespace": namespace, "labels": labels},
+        "spec": {
+            "selector": {"matchLabels": labels},
+            "updateStrategy": {"type": "RollingUpdate", "rollingUpdate": {"maxUnavailable": "25%"}},
+            "template": {
+                "metadata": {"labels": labels},
+                "spec": {
+                    "terminationGracePeriodSeconds": 0,
+                    "initContainers": [{
+                        "name": "copy-sleep",
+                        "image": helper_image,
+                        "command": ["cp", "/bin/sleep", "/prepull/sleep"],
+                        "volumeMounts": [{"name": "prepull", "mountPath": "/prepull"}]
+                    }],
+                    "containers": containers,
+                    "volumes": [{"name": "prepull", "emptyDir": {}}],
+                    "tolerations": [{"operator": "Exists"}]
+                }
+            }
+        }
+    }
+
+
+def pod_snapshot(pod: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    只保留 DaemonSet Pod 所在的节点和每个镜像的拉取状态（pod 为 JSON 解码后的 dict）
+
+    拉取状态为 Pulled（容器已运行或镜像已存在）、Pulling 或 Failed。
+    """
+    spec = pod.get("spec") or {}
+    images = {container.get("name"): container.get("image") for container in spec.get("containers") or []}
+    states = {image: "Pulling" for image in images.values()}
+    for status in (pod.get("status") or {}).get("containerStatuses") or []:
+        image = images.get(status.get("name"))
+        if image is None:
+            continue
+        state = status.get("state") or {}
+        waiting = state.get("waiting")
+        if waiting is not None and waiting.get("reason") in _PULL_FAILURE_REASONS:
+            states[image] = "Failed"
+        elif status.get("imageID") or state.get("running") or state.get("terminated"):
+            states[image] = "Pulled"
+    return {"node": spec.get("nodeName"), "images": states}
+
+
+class ImagePrePuller:
+    """
+    记录所有模板和工作空间覆盖配置用到的镜像，并在集合变化时同步预拉取 DaemonSet
+
+    Args:
+        debounce: 集合变化后等待多久再同步（秒），用于合并 Operator 启动时的大量事件
+    """
+
+    RETRY_SECONDS = 30
+
+    def __init__(self, debounce: float = 2.0):
+        self.cache = ResourceCache("image prepull pod", pod_snapshot)
+        self._debounce = debounce
+        # 来源 -> 镜像；来源为 ("template", 名称) 或 ("workspace", "命名空间/名称")
+        self._sources: Dict[Tuple[str, str], str] = {}
+        self._applied: Optional[List[str]] = None
+        self._dirty = False
+        # asyncio.Event 必须在事件循环中创建，因此在 run 中才初始化
+        self._changed: Optional[asyncio.Event] = None
+
+    def set_image(self, source: Tuple[str, str], image: Optional[str]):
+        """
+        记录（image 为 None 时移除）某个来源引用的镜像
+
+        Args:
+            source: ("template", 模板名称) 或 ("workspace", "命名空间/名称")
+            image: 镜像，None 表示该来源不再引用任何镜像
+        """
+        if image:
+            changed = self._sources.get(source) != image
+            self._sources[source] = image
+        else:
+            changed = self._sources.pop(source, None) is not None
+        if changed:
+            self._dirty = True
+            if self._changed is not None:
+                self._changed.set()
+
+    def images(self) -> List[str]:
+        """返回当前需要预拉取的镜像（去重并排序）"""
+        return sorted(set(self._sources.values()))
+
+    def node_status(self) -> Dict[str, Dict[str, str]]:
+        """
+        返回每个节点上各镜像的拉取状态
+
+        Returns:
+            {节点名称: {镜像: Pulled | Pulling | Failed}}
+        """
+        return {snap['node']: snap['images'] for _, snap in self.cache.items() if snap['node']}
+
+    def image_status(self, image: str) -> Dict[str, Any]:
+        """
+        汇总某个镜像在所有节点上的拉取状态
+
+        Returns:
+            包含节点总数、已拉取 / 拉取中的节点数和拉取失败的节点列表的字典
+        """
+        summary = {"image": image, "nodesTotal": 0, "nodesPulled": 0, "nodesPulling": 0, "failedNodes": []}
+        for node, images in sorted(self.node_status().items()):
+            state = images.get(image)
+            if state is None:
+                continue
+            summary["nodesTotal"] += 1
+            if state == "Pulled":
+                summary["nodesPulled"] += 1
+            elif state == "Pulling":
+                summary["nodesPulling"] += 1
+            else:
+                summary["failedNodes"].append(node)
+        return summary
+
+    async def run(self, sync: Callable[[List[str]], Awaitable[None]], logger: logging.Logger):
+        """
+        在镜像集合变化时调用 sync 同步 DaemonSet，直到任务被取消
+
+        Args:
+            sync: 以镜像列表为参数、负责创建 / 更新 / 删除 DaemonSet 的协程函数
+            logger: 日志对象
+        """
+        self._changed = asyncio.Event()
+        if self._dirty:
+            self._changed.set()
+        while True:
+            await self._changed.wait()
+            await asyncio.sleep(self._debounce)
+            self._changed.clear()
+            self._dirty = False
+            images = self.images()
+            if images == self._applied:
+                continue
+            try:
+                await sync(images)
+                self._applied = images
+                logger.info(f"Image prepull DaemonSet synced with {len(images)} image(s)")
+            except Exception as e:
+                logger.error(f"Failed to sync image prepull DaemonSet: {e}")
+                await asyncio.sleep(self.RETRY_SECONDS)
+                self._changed.set()
@@ -0,0 +1,287 @@
+"""
+共享的 list + watch 缓存（informer）
+
+每种资源只维持一个 watch 连接，通过 label selector（以及可选的 field selector）只关注 Operator 自己创建的对象。
+LIST 和 watch 都跳过 kubernetes 客户端的模型反序列化，直接使用 JSON 解码后的 dict，
+并在 informer 线程中立即转换为精简的快照，完整的对象不会在内存中常驻；
+LIST 按页读取，首次同步（以及 410 之后的重新 LIST）时的内存峰值与单页的大小成正比，而不是与对象总数成正比。
+等待方（例如等待 Pod 进入 Running）在缓存上注册条件，watch 事件到达时立即被唤醒，
+不再对每个工作空间单独轮询 API Server。
+
+watch 在独立的守护线程中运行（kubernetes 客户端是同步的），
+事件通过 loop.call_soon_threadsafe 投递回事件循环，
+因此 ResourceCache 的所有读写都只发生在事件循环线程中，无需加锁。
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ratelimit import backoff_delay
+
+
+Key = Tuple[str, str]  # (namespace, name)
+
+
+def object_key(obj: Dict[str, Any]) -> Key:
+    """JSON 解码后的对象的 (namespace, name)，命名空间字符串在所有键之间共享"""
+    metadata = obj.get("metadata") or {}
+    namespace = metadata.get("namespace")
+    return (sys.intern(namespace) if namespace else namespace), metadata.get("name")
+
+
+class _RawWatch(watch.Watch):
+    """watch 事件中的对象保持为 JSON 解码后的 dict，不反序列化为客户端的模型对象"""
+
+    def get_return_type(self, func):
+        return None
+
+
+class ResourceCache:
+    """
+    以 (namespace, name) 为键保存对象快照，并支持按条件等待
+
+    Args:
+        kind: 资源类型名称，仅用于日志
+        snapshot: 把 watch / LIST 得到的对象（JSON 解码后的 dict）转换为缓存中保存的精简快照的函数
+    """
+
+    def __init__(self, kind: str, snapshot: Callable[[Any], Any]):
+        self.kind = kind
+        self._snapshot = snapshot
+        self._items: Dict[Key, Any] = {}
+        self._waiters: Dict[Key, List[Tuple[Callable[[Any], bool], asyncio.Future]]] = {}
+        self._listeners: List[Callable[[str, Key, Any], None]] = []
+        # 首次 LIST 完成之前，缓存中不存在的对象不能被当作"已删除"
+        self.synced = False
+        self._sync_waiters: List[asyncio.Future] = []
+
+    def get(self, namespace: str, name: str) -> Optional[Any]:
+        """返回缓存中的快照，不存在时返回 None"""
+        return self._items.get((namespace, name))
+
+    def items(self) -> List[Tuple[Key, Any]]:
+        """返回缓存中所有 (键, 快照) 的列表"""
+        return list(self._items.items())
+
+    def snapshot(self, obj: Dict[str, Any]) -> Any:
+        """把一个对象转换为精简快照（纯函数，informer 在自己的线程中调用）"""
+        return self._snapshot(obj)
+
+    def add_listener(self, listener: Callable[[str, Key, Any], None]):
+        """注册一个回调，在每个 watch 事件应用到缓存之后被调用"""
+        self._listeners.append(listener)
+
+    def replace(self, fresh: Dict[Key, Any]):
+        """
+        用一次 LIST 的结果（键 -> 快照）整体替换缓存内容
+
+        LIST 中不存在的对象视为已删除，相应的等待方也会被唤醒。
+        """
+        gone = [key for key in self._items if key not in fresh]
+        self._items = fresh
+        for key in gone:
+            self._notify('DELETED', key, None)
+        for key, snap in fresh.items():
+            self._notify('ADDED', key, snap)
+        self.synced = True
+        for future in self._sync_waiters:
+            if not future.done():
+                future.set_result(None)
+        self._sync_waiters.clear()
+
+    async def wait_synced(self):
+        """等待首次 LIST 完成"""
+        if self.synced:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._sync_waiters.append(future)
+        await future
+
+    def apply(self, event_type: str, key: Key, snap: Any):
+        """把一个 watch 事件（已转换为快照，DELETED 时为 None）应用到缓存"""
+        if event_type == 'DELETED':
+            self._items.pop(key, None)
+            snap = None
+        else:
+            self._items[key] = snap
+        self._notify(event_type, key, snap)
+
+    def _notify(self, event_type: str, key: Key, snap: Any):
+        for listener in self._listeners:
+            listener(event_type, key, snap)
+
+        waiters = self._waiters.get(key)
+        if not waiters:
+            return
+        for predicate, future in list(waiters):
+            if not future.done() and predicate(snap):
+                future.set_result(snap)
+
+    async def wait_for(
+        self,
+        namespace: str,
+        name: str,
+        predicate: Callable[[Any], bool],
+        timeout: float
+    ) -> Any:
+        """
+        等待指定对象的快照满足条件
+
+        Args:
+            namespace: 命名空间
+            name: 对象名称
+            predicate: 判断条件，参数为快照（对象不存在时为 None）
+            timeout: 超时时间（秒）
+
+        Returns:
+            满足条件时的快照
+
+        Raises:
+            asyncio.TimeoutError: 超时仍未满足条件
+        """
+        key = (namespace, name)
+        current = self._items.get(key)
+        if predicate(current) and (current is not None or self.synced):
+            return current
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (predicate, future)
+        self._waiters.setdefault(key, []).append(entry)
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            waiters = self._waiters.get(key, [])
+            if entry in waiters:
+                waiters.remove(entry)
+            if not waiters:
+                self._waiters.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class Informer:
+    """
+    在后台线程中对一种资源执行 LIST + WATCH，并把结果同步到 ResourceCache
+
+    Args:
+        list_fn: 集群范围的 list 方法，例如 core_v1.list_pod_for_all_namespaces
+        cache: 接收事件的缓存
+        label_selector: 只关注带有这些标签的对象
+        logger: 日志对象
+        field_selector: 进一步按字段筛选对象，例如 metadata.namespace=kube-system
+        page_size: LIST 每页的对象数，0 表示一次读取全部
+    """
+
+    # 单次 watch 请求的超时时间，到期后从最新的 resourceVersion 继续 watch
+    WATCH_TIMEOUT_SECONDS = 300
+    # 出错后的重试间隔按连续失败次数指数增长（加随机抖动），避免所有 informer 同时重连
+    ERROR_BACKOFF_SECONDS = 1
+    ERROR_BACKOFF_MAX_SECONDS = 60
+
+    def __init__(
+        self,
+        list_fn: Callable[..., Any],
+        cache: ResourceCache,
+        label_selector: str,
+        logger: logging.Logger,
+        field_selector: Optional[str] = None,
+        page_size: int = 0
+    ):
+        self._list_fn = list_fn
+        self._cache = cache
+        self._selectors = {"label_selector": label_selector}
+        if field_selector:
+            self._selectors["field_selector"] = field_selector
+        self._page_size = page_size
+        self._logger = logger
+        self._stopped = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._failures = 0
+
+    def start(self):
+        """启动后台 watch 线程，必须在事件循环中调用"""
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"informer-{self._cache.kind}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """请求停止 watch，线程会在当前 watch 请求结束后退出"""
+        self._stopped.set()
+
+    def _backoff(self):
+        time.sleep(backoff_delay(self._failures, self.ERROR_BACKOFF_SECONDS, self.ERROR_BACKOFF_MAX_SECONDS))
+        self._failures += 1
+
+    def _run(self):
+        resource_version = None
+        self._failures = 0
+        while not self._stopped.is_set():
+            try:
+                if resource_version is None:
+                    resource_version = self._relist()
+                    self._failures = 0
+
+                w = _RawWatch()
+                for event in w.stream(
+                    self._list_fn,
+                    resource_version=resource_version,
+                    timeout_seconds=self.WATCH_TIMEOUT_SECONDS,
+                    allow_watch_bookmarks=True,
+                    **self._selectors
+                ):
+                    if self._stopped.is_set():
+                        w.stop()
+                        break
+                    obj = event['object']
+                    resource_version = obj['metadata']['resourceVersion']
+                    # BOOKMARK 只推进 resourceVersion，重连时不必从更旧的版本开始（减少 410 导致的重新 LIST）
+                    if event['type'] == 'BOOKMARK':
+                        continue
+                    snap = None if event['type'] == 'DELETED' else self._cache.snapshot(obj)
+                    self._loop.call_soon_threadsafe(self._cache.apply, event['type'], object_key(obj), snap)
+
+            except ApiException as e:
+                if e.status == 410:  # resourceVersion 过期，需要重新 LIST
+                    self._logger.info(f"Watch on {self._cache.kind} expired, relisting")
+                else:
+                    self._logger.error(f"Error watching {self._cache.kind}: {e}")
+                    self._backoff()
+                resource_version = None
+            except Exception as e:
+                self._logger.error(f"Unexpected error watching {self._cache.kind}: {e}")
+                resource_version = None
+                self._backoff()
+
+    def _relist(self) -> str:
+        # 每一页解码后立即转换为快照，上一页的完整对象在读取下一页之前即可释放
+        fresh: Dict[Key, Any] = {}
+        kwargs: Dict[str, Any] = dict(self._selectors)
+        if self._page_size > 0:
+            kwargs["limit"] = self._page_size
+        while True:
+            response = self._list_fn(_preload_content=False, **kwargs)
+            page = json.loads(response.data)
+            for obj in page.get("items") or []:
+                fresh[object_key(obj)] = self._cache.snapshot(obj)
+            metadata = page.get("metadata") or {}
+            if not metadata.get("continue"):
+                break
+            kwargs["_continue"] = metadata["continue"]
+        self._loop.call_soon_threadsafe(self._cache.replace, fresh)
+        self._logger.info(f"Listed {len(fresh)} {self._cache.kind}(s) for the shared cache")
+        return metadata.get("resourceVersion")
@@ -0,0 +1,195 @@
+"""
+Operator 的日志管线
+
+handler（以及 call_api 的工作线程）只把日志记录放进内存队列（QueueHandler），
+格式化和文件 / 控制台 I/O 都在 QueueListener 的后台线程中完成，不占用调和（reconcile）路径。
+
+进入队列之前，WorkspaceLogFilter 会：
+- 在 LOG_DEDUP_WINDOW 秒内丢弃同一工作空间的重复消息，窗口结束后的下一条消息会附带被合并的条数；
+- 按工作空间做令牌桶限流（LOG_RATE_LIMIT_PER_WORKSPACE 条/秒，突发 LOG_RATE_LIMIT_BURST 条）。
+WARNING 及以上级别的日志永远不会被丢弃。
+
+环境变量：
+- LOG_MODE：text（默认）或 json，json 模式下每行是一个 JSON 对象
+- LOG_SINKS：逗号分隔的输出目标，可选 console、file，默认 console,file
+- LOG_FILE：file 输出的路径，默认 operator.log（10MB 轮转，保留 5 个备份）
+- LOG_LEVEL：日志级别，默认 INFO
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+from typing import Any, Dict, Optional, Tuple
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    把日志记录格式化为单行 JSON
+
+    kopf 的 per-object logger 会在记录上附带 k8s_ref，据此输出 workspace / namespace 字段，
+    便于按工作空间检索。
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        workspace, namespace = _workspace_of(record)
+        if workspace:
+            entry["workspace"] = workspace
+        if namespace:
+            entry["namespace"] = namespace
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _workspace_of(record: logging.LogRecord) -> Tuple[Optional[str], Optional[str]]:
+    """从 kopf 附带的 k8s_ref 中取出对象的名称和命名空间"""
+    ref = getattr(record, 'k8s_ref', None)
+    if not isinstance(ref, dict):
+        return None, None
+    return ref.get('name'), ref.get('namespace')
+
+
+class WorkspaceLogFilter(logging.Filter):
+    """
+    按工作空间去重和限流
+
+    没有关联工作空间的日志只做去重，不限流。过滤器会被多个线程调用，内部状态由锁保护。
+
+    Args:
+        rate: 每个工作空间每秒允许的日志条数
+        burst: 令牌桶容量
+        dedup_window: 重复消息的合并窗口（秒）
+    """
+
+    def __init__(self, rate: float, burst: int, dedup_window: float):
+        super().__init__()
+        self._rate = rate
+        self._burst = burst
+        self._dedup_window = dedup_window
+        self._lock = threading.Lock()
+        # (workspace, message) -> [首次输出的时间, 被合并的条数]
+        self._recent: Dict[Tuple[Optional[str], str], list] = {}
+        # workspace -> [剩余令牌, 上次补充的时间]
+        self._buckets: Dict[str, list] = {}
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        workspace, namespace = _workspace_of(record)
+        key_workspace = f"{namespace}/{workspace}" if workspace else None
+        message = record.getMessage()
+        now = time.monotonic()
+
+        with self._lock:
+            if len(self._recent) > 10000:
+                self._expire(now)
+
+            recent = self._recent.get((key_workspace, message))
+            if recent is not None and now - recent[0] < self._dedup_window:
+                recent[1] += 1
+                self.suppressed += 1
+                return False
+
+            if key_workspace is not None and not self._take_token(key_workspace, now):
+                self.suppressed += 1
+                return False
+
+            merged = recent[1] if recent is not None else 0
+            self._recent[(key_workspace, message)] = [now, 0]
+
+        if merged:
+            record.msg = f"{message} (repeated {merged} more time(s))"
+            record.args = None
+        return True
+
+    def _take_token(self, workspace: str, now: float) -> bool:
+        bucket = self._buckets.get(workspace)
+        if bucket is None:
+            bucket = self._buckets[workspace] = [float(self._burst), now]
+        tokens = min(self._burst, bucket[0] + (now - bucket[1]) * self._rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def _expire(self, now: float):
+        """清理过期的去重记录和已经回满的令牌桶，避免状态无限增长"""
+        self._recent = {key: value for key, value in self._recent.items() if now - value[0] < self._dedup_window}
+        self._buckets = {
+            key: value for key, value in self._buckets.items()
+            if value[0] + (now - value[1]) * self._rate < self._burst
+        }
+
+
+def _build_sinks(sinks: str, formatter: logging.Formatter) -> list:
+    handlers = []
+    for sink in (item.strip() for item in sinks.split(",")):
+        if sink == "console":
+            handler = logging.StreamHandler()
+        elif sink == "file":
+            # 当文件达到 10MB 时会自动轮转，最多保留 5 个备份文件
+            handler = logging.handlers.RotatingFileHandler(
+                os.environ.get("LOG_FILE", "operator.log"),
+                maxBytes=10*1024*1024,
+                backupCount=5
+            )
+        elif sink:
+            raise ValueError(f"Unknown log sink: {sink}")
+        else:
+            continue
+        handler.setFormatter(formatter)
+        handlers.append(handler)
+    return handlers
+
+
+def configure_logging(text_format: str) -> logging.handlers.QueueListener:
+    """
+    配置根 logger：记录经过滤后进入队列，由后台线程写到各个输出目标
+
+    Args:
+        text_format: LOG_MODE=text 时使用的格式字符串
+
+    Returns:
+        已启动的 QueueListener（进程退出时自动停止并刷新剩余日志）
+    """
+    if os.environ.get("LOG_MODE", "text") == "json":
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(text_format)
+
+    listener = logging.handlers.QueueListener(
+        queue.SimpleQueue(),
+        *_build_sinks(os.environ.get("LOG_SINKS", "console,file"), formatter),
+        respect_handler_level=True
+    )
+    queue_handler = logging.handlers.QueueHandler(listener.queue)
+    queue_handler.addFilter(WorkspaceLogFilter(
+        rate=float(os.environ.get("LOG_RATE_LIMIT_PER_WORKSPACE", "5")),
+        burst=int(os.environ.get("LOG_RATE_LIMIT_BURST", "20")),
+        dedup_window=float(os.environ.get("LOG_DEDUP_WINDOW", "30"))
+    ))
+
+    root = logging.getLogger()
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -7,69 +7,396 @@ KubeSphere DevWorkspace Operator
 
 注意: 本文件中的 kopf 处理函数使用 **kwargs 参数形式，这可能导致 linter(pylint) 报告类型检查错误。
 这些错误可以被忽略，因为实际运行时 kopf 1.35.6 会正确传递所需的参数。
+
+所有 handler 都是 async 函数，由 kopf 直接在事件循环中调度；
+对 Kubernetes API 的同步调用统一通过 call_api 放到线程池中执行。
 """
 
 
+import time
+# 启动计时的起点：导入 kopf 和 kubernetes 客户端本身就要花费可观的时间，也计入启动耗时
+_IMPORT_STARTED = time.perf_counter()
+
 import kopf
 import logging
-import logging.handlers
 
-import time
-from kubernetes import client, config
+import asyncio
+import datetime
+import functools
+import json
+import os
+import socket
+import uuid
+import urllib3
+from kubernetes import client
 from kubernetes.client.rest import ApiException
 
-from typing import Dict, Any, Optional, cast
+from typing import Callable, Dict, Any, List, Optional, Tuple, cast
+
+from context import OperatorContext
+from image_prepull import PREPULL_LABEL_SELECTOR, ImagePrePuller, daemonset_manifest
+from drift import (
+    DRIFT_POD_MISSING, DRIFT_POD_NOT_RUNNING, DRIFT_PVC_MISSING, DRIFT_SERVICE_MISSING, DRIFT_URL_STALE,
+    ClusterSnapshot, DriftTracker, compact_item, detect_drift
+)
+from health import StartupTracker, serve_readiness
+from idle import ActivityUnknown, AnnotationActivityProbe, MetricsActivityProbe, parse_duration
+from informer import Informer, ResourceCache
+from logging_config import configure_logging
+from manifests import WORKSPACE_CONTAINER, CompiledWorkspace, ManifestRenderer
+import metrics
+from ratelimit import TokenBucket, backoff_delay, retry_after
+from records import PodRecord, ServiceRecord, WorkspaceRecord
+from scheduler import BACKGROUND, BULK, INTERACTIVE, NORMAL, ReconcileScheduler
+from seed import (
+    SEED_TEMPLATE_LABEL, SNAPSHOT_GROUP, SNAPSHOT_PLURAL, SNAPSHOT_VERSION,
+    SeedSnapshots, data_source, plan_refresh, seeds_namespace, snapshot_manifest
+)
+from sharding import ShardCoordinator, finalizer_for, handoff_patch
+from status_writer import StatusWriter
+from template_cache import TemplateCache
+from update_plan import plan_update, resize_patch
+from warm_pool import GENERATION_LABEL, POOL_LABEL, WarmPool
+from workspace_config import config_hash, freeze, merge_configs
+from workspace_set import SET_LABEL, WorkspaceSetRegistry, active_budget, aggregate, member_manifest, member_names
 
 
 # 配置日志
-# 定义日志格式，包含时间戳、日志名称、日志级别和消息
+# 定义日志格式，包含时间戳、日志名称、日志级别和消息；日志管线（队列、输出目标、限流）在 main() 中配置，见 logging_config.py
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
-# 配置 logging 模块
-logging.basicConfig(
-    level=logging.INFO,
-    format=LOG_FORMAT,
-    handlers=[
-        # 添加一个轮转文件 handler，将日志写入 operator.log 文件
-        # 当文件达到 10MB 时会自动轮转，最多保留 5 个备份文件
-        logging.handlers.RotatingFileHandler(
-            'operator.log',
-            maxBytes=10*1024*1024, # 10 MB
-            backupCount=5
-        ),
-        # 同时保留控制台输出
-        logging.StreamHandler()
-    ]
-)
-
 logger = logging.getLogger("devworkspace-operator")
 
-# 尝试加载 Kubernetes 配置
-try:
-    config.load_incluster_config()#如果代码在集群内部运行
-    logger.info("Running inside Kubernetes cluster, using in-cluster config")
-except config.ConfigException:
-    try:
-        config.load_kube_config()#如果代码在集群外部运行
-        logger.info("Running outside Kubernetes cluster, using kubeconfig")
-    except config.ConfigException:
-        logger.error("Could not configure kubernetes client")
-        raise
-
-# 创建 Kubernetes API 客户端
-api_client = client.ApiClient()
-core_v1 = client.CoreV1Api(api_client)
-custom_api = client.CustomObjectsApi(api_client)
+# 客户端限速：整个 Operator 平均每秒最多 API_QPS 个请求，最多突发 API_BURST 个，API_QPS 为 0 时不限速
+API_QPS = float(os.environ.get("API_QPS", "100"))
+API_BURST = int(os.environ.get("API_BURST", "200"))
+# 同时进行中的 API 请求数上限：执行同步调用的线程数，也是 HTTP 连接池的大小
+API_CONNECTION_POOL_SIZE = int(os.environ.get("API_CONNECTION_POOL_SIZE", "32"))
+# 429、5xx 和连接错误的重试次数，以及指数退避的初始值和上限（秒）
+API_MAX_RETRIES = int(os.environ.get("API_MAX_RETRIES", "5"))
+API_RETRY_BASE_SECONDS = float(os.environ.get("API_RETRY_BASE_SECONDS", "0.5"))
+API_RETRY_MAX_SECONDS = float(os.environ.get("API_RETRY_MAX_SECONDS", "30"))
+# handler 抛出 TemporaryError 后 kopf 重试的退避初始值和上限（秒）
+HANDLER_RETRY_BASE_SECONDS = float(os.environ.get("HANDLER_RETRY_BASE_SECONDS", "10"))
+HANDLER_RETRY_MAX_SECONDS = float(os.environ.get("HANDLER_RETRY_MAX_SECONDS", "300"))
+# informer 的 watch 长期各占一个连接，连接池为它们额外预留
+WATCH_CONNECTIONS = 4
+# informer 和漂移检测 LIST 时每页的对象数，限制 LIST 期间的内存峰值，为 0 时一次读取全部
+API_LIST_PAGE_SIZE = int(os.environ.get("API_LIST_PAGE_SIZE", "500"))
+# 跨命名空间的公平调度：同时执行的 handler 数量上限（为 0 时不调度）、每个命名空间的上限，
+# 以及低优先级请求等待多久（秒）后不再让位于高优先级请求
+RECONCILE_MAX_CONCURRENCY = int(os.environ.get("RECONCILE_MAX_CONCURRENCY", "50"))
+RECONCILE_NAMESPACE_CONCURRENCY = int(os.environ.get("RECONCILE_NAMESPACE_CONCURRENCY", "10"))
+RECONCILE_PROMOTE_AFTER_SECONDS = float(os.environ.get("RECONCILE_PROMOTE_AFTER_SECONDS", "30"))
 
 # 定义 API 版本和资源组
 API_GROUP = "devworkspace.kubesphere.io"
 API_VERSION = "v1alpha1"
 DEV_WORKSPACE_TEMPLATE_KIND = "DevWorkspaceTemplate"
 DEV_WORKSPACE_KIND = "DevWorkspace"
+DEV_WORKSPACE_SET_KIND = "DevWorkspaceSet"
+
+# 模板变更滚动更新时，同一时刻最多允许多少个工作空间处于重建中（不可用）
+TEMPLATE_ROLLOUT_MAX_UNAVAILABLE = int(os.environ.get("TEMPLATE_ROLLOUT_MAX_UNAVAILABLE", "10"))
+
+# 资源变更时是否尝试原地调整 Pod 资源（in-place pod resize），关闭或集群不支持时重建 Pod
+IN_PLACE_RESIZE_ENABLED = os.environ.get("IN_PLACE_RESIZE_ENABLED", "true").lower() == "true"
+
+# 空闲检测的间隔（秒）
+IDLE_CHECK_INTERVAL = float(os.environ.get("IDLE_CHECK_INTERVAL", "60"))
+# 空闲检测使用的活跃度来源：metrics（metrics-server 的 Pod CPU 用量）或 annotation（last-activity 注解）
+IDLE_ACTIVITY_SOURCE = os.environ.get("IDLE_ACTIVITY_SOURCE", "metrics")
+# Pod CPU 用量（核）不低于该值时视为有人在使用
+IDLE_CPU_THRESHOLD = float(os.environ.get("IDLE_CPU_THRESHOLD", "0.05"))
+
+# 预热 Pod 池的维护间隔（秒）
+WARM_POOL_RECONCILE_INTERVAL = float(os.environ.get("WARM_POOL_RECONCILE_INTERVAL", "10"))
+
+# 检查种子快照是否需要刷新的间隔（秒），快照本身按模板的 spec.storage.seed.refreshInterval 刷新
+SEED_SNAPSHOT_CHECK_INTERVAL = float(os.environ.get("SEED_SNAPSHOT_CHECK_INTERVAL", "60"))
+# 是否 watch 种子快照（集群没有安装 VolumeSnapshot CRD 时可以关闭）；开启分片时，不负责模板的副本靠它得知最新的快照
+SEED_SNAPSHOT_WATCH_ENABLED = os.environ.get("SEED_SNAPSHOT_WATCH_ENABLED", "true").lower() == "true"
+
+# 漂移检测的间隔（秒）：每个周期 LIST 一次 Pod / Service / PVC，修复与 DevWorkspace status 不一致的工作空间，为 0 时关闭
+DRIFT_RESYNC_INTERVAL = float(os.environ.get("DRIFT_RESYNC_INTERVAL", "60"))
+# 同时进行的漂移修复数量上限
+DRIFT_REPAIR_CONCURRENCY = int(os.environ.get("DRIFT_REPAIR_CONCURRENCY", "10"))
+
+# Prometheus /metrics 端点的端口，为 0 时不启动
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9090"))
+# 刷新各内存缓存条目数指标（devworkspace_cache_entries）的间隔（秒）
+CACHE_METRICS_INTERVAL = float(os.environ.get("CACHE_METRICS_INTERVAL", "15"))
+# kopf liveness 端点（/healthz，同时暴露各 probe 的结果）和 readiness 端点（/readyz）的端口，为 0 时不启动
+LIVENESS_PORT = int(os.environ.get("LIVENESS_PORT", "8080"))
+READINESS_PORT = int(os.environ.get("READINESS_PORT", "8081"))
+
+# 不等待结果的中间状态（例如 Provisioning）最多延迟多久（秒）写入，以便与随后的状态合并为一次写入
+STATUS_COALESCE_SECONDS = float(os.environ.get("STATUS_COALESCE_SECONDS", "0.05"))
+
+# 镜像预拉取：是否启用、DaemonSet 所在的命名空间和名称、提供 sleep 的辅助镜像、状态上报间隔（秒）
+IMAGE_PREPULL_ENABLED = os.environ.get("IMAGE_PREPULL_ENABLED", "true").lower() == "true"
+IMAGE_PREPULL_NAMESPACE = os.environ.get("IMAGE_PREPULL_NAMESPACE", "kube-system")
+IMAGE_PREPULL_NAME = "devworkspace-image-prepull"
+IMAGE_PREPULL_HELPER_IMAGE = os.environ.get("IMAGE_PREPULL_HELPER_IMAGE", "busybox:1.36")
+IMAGE_PREPULL_STATUS_INTERVAL = float(os.environ.get("IMAGE_PREPULL_STATUS_INTERVAL", "30"))
+
+# DevWorkspaceSet 未设置 spec.maxConcurrency / spec.qps 时的默认并发和 API QPS 预算，以及汇总状态的刷新间隔（秒）
+WORKSPACE_SET_MAX_CONCURRENCY = int(os.environ.get("WORKSPACE_SET_MAX_CONCURRENCY", "20"))
+WORKSPACE_SET_QPS = float(os.environ.get("WORKSPACE_SET_QPS", "50"))
+WORKSPACE_SET_STATUS_INTERVAL = float(os.environ.get("WORKSPACE_SET_STATUS_INTERVAL", "5"))
+
+# 多副本分片：开启后各副本按一致性哈希分担 DevWorkspace / DevWorkspaceTemplate，成员关系通过 Lease 维护
+SHARDING_ENABLED = os.environ.get("SHARDING_ENABLED", "false").lower() == "true"
+# 副本标识，通常通过 downward API 注入 Pod 名称
+SHARD_IDENTITY = os.environ.get("POD_NAME") or socket.gethostname()
+SHARD_LEASE_NAMESPACE = os.environ.get("POD_NAMESPACE", "kube-system")
+# 副本超过 SHARD_LEASE_DURATION 秒未续约即视为退出，每 SHARD_RENEW_INTERVAL 秒续约并刷新成员列表
+SHARD_LEASE_DURATION = int(os.environ.get("SHARD_LEASE_DURATION", "15"))
+SHARD_RENEW_INTERVAL = float(os.environ.get("SHARD_RENEW_INTERVAL", "5"))
+# 设置后，带有该标签的工作空间按标签值（而不是 namespace/name）分片
+SHARD_KEY_LABEL = os.environ.get("SHARD_KEY_LABEL") or None
+
+# Operator 创建的 Pod、Service、PVC 都带有该标签，共享 watch 只关注这些对象
+WORKSPACE_LABEL_SELECTOR = "app=devworkspace"
+
+# 共享的 Pod / Service 缓存，由 startup 时启动的 informer 持续更新，只保存精简记录（见 records.py）
+pod_cache = ResourceCache("pod", PodRecord.from_object)
+service_cache = ResourceCache("service", ServiceRecord.from_object)
+# 预热 Pod 池，只 watch 带有池标签（尚未被认领）的 Pod
+warm_pool = WarmPool()
+
+# 每个（模板，命名空间）最近一个就绪的种子快照，由种子快照的 informer 和 refresh_seed_snapshots 维护
+seed_snapshots = SeedSnapshots()
+# 各 DevWorkspaceSet 的并发和 QPS 预算
+workspace_sets = WorkspaceSetRegistry(WORKSPACE_SET_MAX_CONCURRENCY, WORKSPACE_SET_QPS)
+# 镜像预拉取 DaemonSet 的 Pod 反映各节点的镜像拉取状态
+image_prepuller = ImagePrePuller()
+# 由 informer 维护的缓存：(缓存, CoreV1Api 的 list 方法名, label selector, field selector)
+# 尚未被认领的池成员只由 warm_pool.cache 关注，不进入共享 Pod 缓存；预拉取 DaemonSet 的 Pod 只在它所在的命名空间中 watch
+watched_caches = [
+    (pod_cache, "list_pod_for_all_namespaces", f"{WORKSPACE_LABEL_SELECTOR},!{POOL_LABEL}", None),
+    (service_cache, "list_service_for_all_namespaces", WORKSPACE_LABEL_SELECTOR, None),
+    (warm_pool.cache, "list_pod_for_all_namespaces", f"{WORKSPACE_LABEL_SELECTOR},{POOL_LABEL}", None),
+]
+if IMAGE_PREPULL_ENABLED:
+    watched_caches.append((
+        image_prepuller.cache, "list_pod_for_all_namespaces", PREPULL_LABEL_SELECTOR, f"metadata.namespace={IMAGE_PREPULL_NAMESPACE}"
+    ))
+# startup 时按 OperatorContext 创建的 informer
+informers: List[Informer] = []
+
+# 整个 Operator 共享的令牌桶
+api_limiter = TokenBucket(API_QPS, API_BURST)
+
+# 按命名空间公平、按优先级发放 handler 的执行名额
+scheduler = ReconcileScheduler(RECONCILE_MAX_CONCURRENCY, RECONCILE_NAMESPACE_CONCURRENCY, RECONCILE_PROMOTE_AFTER_SECONDS)
+
+# 启动各阶段的耗时和就绪条件
+startup = StartupTracker(_IMPORT_STARTED)
+
+# Kubernetes 客户端和执行 API 调用的线程池，由 main() 创建（见 operator_context）
+_context: Optional[OperatorContext] = None
+
+def operator_context() -> OperatorContext:
+    """
+    返回 Operator 的运行上下文，第一次调用时加载 kube config 并创建客户端
+
+    main() 在启动时显式调用一次；在进程内直接调用 handler 的场景（例如基准测试）则在第一次访问 API 时创建，
+    只导入本模块不会产生任何副作用。
+    """
+    global _context
+    if _context is None:
+        _context = OperatorContext.create(API_CONNECTION_POOL_SIZE, WATCH_CONNECTIONS, logger)
+        startup.mark("context")
+    return _context
+
+async def call_api(fn, *args, idempotent: Optional[bool] = None, **kwargs):
+    """
+    在线程池中执行一次同步的 Kubernetes API 调用，并以协程的方式返回结果
+
+    kubernetes 客户端本身是同步的，这里只在单次 HTTP 往返期间占用线程，
+    handler 中的等待（asyncio.sleep）不会占用任何线程，
+    因此单个 Operator 副本可以同时推进大量工作空间的创建。
+
+    - 每个请求先从共享的令牌桶取令牌，属于 DevWorkspaceSet 批次的请求还要从批次的令牌桶取令牌；
+    - 429：按 Retry-After（没有时按指数退避）暂停共享的令牌桶后重试，所有调用方一起退让；
+    - 5xx 和连接错误：按指数退避加抖动重试，只重试幂等的请求；
+    最多重试 API_MAX_RETRIES 次，之后把最后一次的异常抛给调用方。
+
+    Args:
+        fn: kubernetes 客户端的方法，例如 operator_context().core_v1.read_namespaced_pod
+        *args, **kwargs: 透传给 fn 的参数
+        idempotent: 请求重复执行是否安全；默认 create_* 方法视为不安全，
+                    带 resourceVersion 的条件更新等调用方应显式传 False
+
+    Returns:
+        fn 的返回值
+    """
+    operation = _api_operation(fn, args)
+    if idempotent is None:
+        idempotent = not operation.startswith("create_")
+    budget = active_budget.get()
+    loop = asyncio.get_running_loop()
+    attempt = 0
+    while True:
+        waited = await api_limiter.acquire()
+        if budget is not None:
+            # 属于 DevWorkspaceSet 批次的请求受该批次的 QPS 预算限制
+            waited += await budget.bucket.acquire()
+        if waited:
+            metrics.API_RATE_LIMIT_WAIT.observe(waited)
+
+        started = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(operator_context().executor, functools.partial(fn, *args, **kwargs))
+        except (ApiException, urllib3.exceptions.HTTPError) as e:
+            code = str(e.status or "error") if isinstance(e, ApiException) else "error"
+            metrics.observe_api_call(operation, time.perf_counter() - started, code)
+            delay = _api_retry_delay(e, attempt, idempotent)
+            if delay is None:
+                raise
+            metrics.API_RETRIES.labels(operation=operation, code=code).inc()
+            logger.info(f"Retrying {operation} in {delay:.2f}s after error {code}")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        except Exception:
+            metrics.observe_api_call(operation, time.perf_counter() - started, "error")
+            raise
+        metrics.observe_api_call(operation, time.perf_counter() - started)
+        return result
+
+def _api_retry_delay(error: BaseException, attempt: int, idempotent: bool) -> Optional[float]:
+    """
+    返回第 attempt 次失败后应等待多久再重试，不应重试时返回 None
+    """
+    if attempt >= API_MAX_RETRIES:
+        return None
+    status = error.status if isinstance(error, ApiException) else None
+    if status == 429:
+        # 请求没有被处理，任何请求都可以重试；暂停共享的令牌桶，其他请求也一起等待
+        delay = retry_after(error) or backoff_delay(attempt, API_RETRY_BASE_SECONDS, API_RETRY_MAX_SECONDS)
+        api_limiter.pause(delay)
+        return delay
+    if not idempotent or (status and status < 500):
+        return None
+    delay = retry_after(error) if isinstance(error, ApiException) else None
+    return delay if delay is not None else backoff_delay(attempt, API_RETRY_BASE_SECONDS, API_RETRY_MAX_SECONDS)
+
+def _retry_delay(retry: int) -> float:
+    """
+    handler 抛出 TemporaryError 时 kopf 的重试间隔
+
+    按 kopf 传入的重试次数指数退避并加上抖动，API Server 故障恢复后各工作空间的重试在时间上被打散。
+    """
+    return backoff_delay(retry, HANDLER_RETRY_BASE_SECONDS, HANDLER_RETRY_MAX_SECONDS)
+
+def _api_operation(fn, args: tuple) -> str:
+    """
+    返回 API 调用在指标中的操作名称
+
+    通常就是客户端方法名（例如 read_namespaced_pod）；
+    直接通过 ApiClient.call_api 发出的请求（server-side apply、resize）记为 <method>_<资源复数名>[_<子资源>]，
+    例如 patch_pods、patch_pods_resize。
+    """
+    name = getattr(fn, '__name__', 'unknown')
+    if name == 'call_api' and len(args) >= 2:
+        # 路径形如 .../namespaces/<ns>/<复数名>/<名称>[/<子资源>]
+        parts = str(args[0]).strip('/').split('/')
+        rest = parts[parts.index('namespaces') + 2:] if 'namespaces' in parts else parts[-2:]
+        resource = '_'.join([rest[0]] + rest[2:3])
+        return f"{str(args[1]).lower()}_{resource}"
+    return name
+
+async def _fetch_pod_metrics(namespace: str, pod_name: str) -> Dict[str, Any]:
+    """读取 metrics-server 提供的 PodMetrics"""
+    return await call_api(
+        operator_context().custom_api.get_namespaced_custom_object,
+        group="metrics.k8s.io",
+        version="v1beta1",
+        namespace=namespace,
+        plural="pods",
+        name=pod_name
+    )
+
+# 空闲检测使用的活跃度探测
+if IDLE_ACTIVITY_SOURCE == "annotation":
+    activity_probe = AnnotationActivityProbe()
+else:
+    activity_probe = MetricsActivityProbe(_fetch_pod_metrics, IDLE_CPU_THRESHOLD)
+
+# 分片协调器，由 start_sharding 创建，未开启分片时为 None
+shard_coordinator: Optional[ShardCoordinator] = None
 
-def get_workspace_template(name: str) -> Optional[Dict[str, Any]]:
+def _owned(name: str, namespace: Optional[str], labels: Optional[Dict[str, str]] = None, **kwargs) -> bool:
+    """handler 过滤条件：未开启分片，或对象由本副本负责"""
+    return shard_coordinator is None or shard_coordinator.owns(namespace, name, dict(labels or {}))
+
+def _utc_now() -> str:
+    """返回 RFC 3339 格式的当前 UTC 时间"""
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+# 由 devworkspacetemplates watch 维护的模板缓存
+template_cache = TemplateCache()
+
+# 按（模板，有效配置）编译的 Pod / Service / PVC 清单骨架，模板变化时失效
+manifest_renderer = ManifestRenderer()
+
+@kopf.on.event(DEV_WORKSPACE_TEMPLATE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION)
+async def on_template_event(event: Dict[str, Any], name: str, body: kopf.Body, **kwargs):
+    """
+    把 DevWorkspaceTemplate 的变化同步到模板缓存
+    """
+    if event.get('type') == 'DELETED':
+        manifest_renderer.invalidate(name)
+        template_cache.delete(name)
+        image_prepuller.set_image(("template", name), None)
+        seed_snapshots.forget(name)
+    else:
+        _cache_template(name, body.get('metadata', {}).get('generation'), body.get('spec', {}))
+        image_prepuller.set_image(("template", name), body.get('spec', {}).get('environment', {}).get('image'))
+
+def _cache_template(name: str, generation: Optional[int], spec: Dict[str, Any]):
+    """
+    把模板保存到模板缓存；只有 generation 或 spec 变化时才丢弃它已编译的清单骨架
+
+    模板对象的每次变化（包括 labels、annotations 以及 kopf 自己写入的注解）都会产生事件，
+    这些变化不影响编译结果，不需要让骨架重新编译。
+    """
+    cached = template_cache.peek(name)
+    spec = freeze(spec or {})
+    if cached is None or cached['metadata'].get('generation') != generation or cached['spec'] != spec:
+        manifest_renderer.invalidate(name)
+    template_cache.put(name, {"metadata": {"name": name, "generation": generation}, "spec": spec})
+
+@kopf.on.event(DEV_WORKSPACE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION)
+async def on_workspace_event(event: Dict[str, Any], name: str, namespace: str, meta: Dict[str, Any], spec: Dict[str, Any], status: Dict[str, Any], **kwargs):
+    """
+    记录工作空间覆盖配置中的镜像，使其同样被预拉取；
+    同时把观察到的 status 交给 status_writer，用于跳过不会产生变化的写入
+    """
+    deleted = event.get('type') == 'DELETED'
+    image = None
+    if not deleted:
+        image = spec.get('overrides', {}).get('environment', {}).get('image')
+    image_prepuller.set_image(("workspace", f"{namespace}/{name}"), image)
+    status_writer.observe(namespace, name, None if deleted else status, meta.get('resourceVersion'))
+
+def _template_generation(name: Optional[str]) -> Optional[int]:
+    """
+    返回缓存中模板的 metadata.generation，用于记录工作空间基于哪个版本的模板创建
+    """
+    template = template_cache.peek(name) if name else None
+    if not template:
+        return None
+    return template.get('metadata', {}).get('generation')
+
+async def get_workspace_template(name: str) -> Optional[Dict[str, Any]]:
     """
     获取指定名称的 DevWorkspaceTemplate 资源
+
+    优先从 watch 维护的缓存中读取，缓存未命中时（例如 Operator 刚启动、
+    初始 LIST 尚未完成）才回退为一次 API 读取。返回的是缓存中冻结的对象，不能修改。
     
     Args:
         name: DevWorkspaceTemplate 的名称
@@ -77,15 +404,21 @@ def get_workspace_template(name: str) -> Optional[Dict[str, Any]]:
     Returns:
         DevWorkspaceTemplate 资源对象，如果找不到则返回 None
     """
+    template = template_cache.get(name)
+    if template is not None:
+        return template
+
     try:
-        template = custom_api.get_cluster_custom_object(
+        template = await call_api(
+            operator_context().custom_api.get_cluster_custom_object,
             group=API_GROUP,
             version=API_VERSION,
             plural="devworkspacetemplates",
             name=name
         )
         logger.info(f"Found template: {name}")
-        return cast(Dict[str, Any], template)
+        template_cache.put(name, cast(Dict[str, Any], template))
+        return template_cache.peek(name)
     except ApiException as e:
         if e.status == 404:
             logger.error(f"Template {name} not found")
@@ -94,291 +427,259 @@ def get_workspace_template(name: str) -> Optional[Dict[str, Any]]:
             logger.error(f"Error getting template {name}: {e}")
             raise
 
-def merge_configs(template_spec: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+# server-side apply 使用的 field manager 名称
+FIELD_MANAGER = "devworkspace-operator"
+
+# apply_manifest 支持的资源类型：kind -> (API 路径前缀, 复数名称)
+RESOURCE_PATHS = {
+    "Pod": ("/api/v1", "pods"),
+    "Service": ("/api/v1", "services"),
+    "PersistentVolumeClaim": ("/api/v1", "persistentvolumeclaims"),
+    "DaemonSet": ("/apis/apps/v1", "daemonsets"),
+}
+
+async def apply_manifest(manifest: Dict[str, Any]) -> Dict[str, Any]:
     """
-    合并模板配置和实例中的覆盖配置
-    
+    以 server-side apply 的方式创建或更新一个命名空间级别的资源
+
+    对象不存在时创建，存在时把 Operator 管理的字段收敛到清单中的值（force=true 会接管冲突字段），
+    因此重复调用是幂等的，也不会像"409 已存在"那样掩盖配置漂移。
+
     Args:
-        template_spec: 模板的 spec 部分
-        overrides: 实例中的覆盖配置
-        
+        manifest: 完整的资源清单，必须包含 apiVersion、kind、metadata.name 和 metadata.namespace
+
     Returns:
-        合并后的配置
+        API Server 返回的对象
     """
-    result = template_spec.copy()
-    
-    # 如果没有覆盖配置，直接返回模板配置
-    if not overrides:
-        return result
-        
-    # 处理资源覆盖
-    if 'resources' in overrides and 'resources' in result:
-        for resource_type in ['requests', 'limits']:
-            if resource_type in overrides.get('resources', {}) and resource_type in result.get('resources', {}):
-                result['resources'][resource_type].update(overrides['resources'][resource_type])
-            elif resource_type in overrides.get('resources', {}):
-                if 'resources' not in result:
-                    result['resources'] = {}
-                result['resources'][resource_type] = overrides['resources'][resource_type]
-    
-    # 处理存储覆盖
-    if 'storage' in overrides and 'storage' in result:
-        result['storage'].update(overrides['storage'])
-    elif 'storage' in overrides:
-        result['storage'] = overrides['storage']
-    
-    # 处理环境覆盖
-    if 'environment' in overrides and 'environment' in result:
-        result['environment'].update(overrides['environment'])
-    elif 'environment' in overrides:
-        result['environment'] = overrides['environment']
-        
-    # 处理端口覆盖 (完全替换)
-    if 'ports' in overrides:
-        result['ports'] = overrides['ports']
-    
-    return result
+    metadata = manifest["metadata"]
+    prefix, plural = RESOURCE_PATHS[manifest["kind"]]
+    return await call_api(
+        operator_context().api_client.call_api,
+        f"{prefix}/namespaces/{metadata['namespace']}/{plural}/{metadata['name']}",
+        "PATCH",
+        query_params=[("fieldManager", FIELD_MANAGER), ("force", "true")],
+        header_params={
+            "Accept": "application/json",
+            "Content-Type": "application/apply-patch+yaml"
+        },
+        body=manifest,
+        response_type="object",
+        auth_settings=["BearerToken"],
+        _return_http_data_only=True
+    )
+
+async def merge_patch(kind: str, name: str, namespace: str, body: Dict[str, Any], idempotent: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    以 JSON merge patch（RFC 7386）修改一个命名空间级别的资源
+
+    kubernetes 客户端的 patch_namespaced_* 把 dict 作为 strategic merge patch 发送，
+    其中 ownerReferences 按 uid 合并，无法替换已有的 controller 引用；merge patch 中的列表整体替换。
+
+    Args:
+        kind: 资源类型，取值见 RESOURCE_PATHS
+        name: 资源名称
+        namespace: 命名空间
+        body: merge patch，值为 None 的字段被删除
+        idempotent: 传给 call_api，是否可以在超时后重试
+
+    Returns:
+        API Server 返回的对象
+    """
+    prefix, plural = RESOURCE_PATHS[kind]
+    return await call_api(
+        operator_context().api_client.call_api,
+        f"{prefix}/namespaces/{namespace}/{plural}/{name}",
+        "PATCH",
+        header_params={
+            "Accept": "application/json",
+            "Content-Type": "application/merge-patch+json"
+        },
+        body=body,
+        response_type="object",
+        auth_settings=["BearerToken"],
+        _return_http_data_only=True,
+        idempotent=idempotent
+    )
 
-def create_pvc(instance_name: str, namespace: str, storage_size: str) -> str:
+def pvc_name_for(instance_name: str) -> str:
     """
-    创建 PersistentVolumeClaim 资源
+    返回工作空间 PVC 的名称
+
+    名称是确定的，因此 Pod 可以在 PVC 创建完成之前就引用它。
+    """
+    return f"{instance_name}-pvc"
+
+def workspace_labels(instance_name: str) -> Dict[str, str]:
+    """返回工作空间的 Pod、Service、PVC 共用的标签"""
+    return {
+        "app": "devworkspace",
+        "instance": instance_name
+    }
+
+async def create_pvc(
+    instance_name: str,
+    namespace: str,
+    manifests: CompiledWorkspace,
+    owner: Optional[Dict[str, Any]] = None,
+    labels: Optional[Dict[str, str]] = None,
+    seed: Optional[Dict[str, str]] = None
+) -> str:
+    """
+    以 server-side apply 的方式创建 PersistentVolumeClaim 资源
     
     Args:
         instance_name: 工作空间实例的名称
         namespace: 命名空间
-        storage_size: 存储大小
+        manifests: 工作空间配置编译后的清单骨架
+        owner: 所属的对象，设置后 PVC 会带上指向它的 ownerReference
+        labels: PVC 的标签，默认为 workspace_labels(instance_name)
+        seed: PVC 的数据源（见 seed_source），设置后 PVC 以 CSI 克隆的方式创建
         
     Returns:
         创建的 PVC 的名称
     """
-    pvc_name = f"{instance_name}-pvc"
-    
-    pvc_manifest = {
-        "apiVersion": "v1",
-        "kind": "PersistentVolumeClaim",
-        "metadata": {
-            "name": pvc_name,
-            "namespace": namespace
-        },
-        "spec": {
-            "accessModes": ["ReadWriteOnce"],
-            "resources": {
-                "requests": {
-                    "storage": storage_size
-                }
-            }
-        }
-    }
+    pvc_name = pvc_name_for(instance_name)
+    pvc_manifest = manifests.render_pvc(pvc_name, namespace, labels or workspace_labels(instance_name), seed)
     
+    if owner is not None:
+        kopf.append_owner_reference(pvc_manifest, owner=owner)
+
     try:
-        core_v1.create_namespaced_persistent_volume_claim(
-            namespace=namespace,
-            body=pvc_manifest
-        )
-        logger.info(f"Created PVC: {pvc_name}")
+        with metrics.phase("pvc_create", instance_name, namespace):
+            await apply_manifest(pvc_manifest)
+        if seed:
+            logger.info(f"Applied PVC: {pvc_name} (cloned from {seed['kind']} {seed['name']})")
+        else:
+            logger.info(f"Applied PVC: {pvc_name}")
         return pvc_name
     except ApiException as e:
-        if e.status == 409:  # Already exists 参考链接：https://cloud.tencent.com/developer/ask/sof/106389732
-            logger.info(f"PVC {pvc_name} already exists")
+        # PVC 的 dataSource 创建后不可修改：重试时种子快照可能已经刷新，已经存在的 PVC 保持原来的数据源
+        if seed and e.status == 422 and await _pvc_exists(pvc_name, namespace):
+            logger.info(f"PVC {pvc_name} already exists, keeping its original data source")
             return pvc_name
-        else:
-            logger.error(f"Error creating PVC {pvc_name}: {e}")
-            raise
+        logger.error(f"Error applying PVC {pvc_name}: {e}")
+        raise
+
+async def _pvc_exists(pvc_name: str, namespace: str) -> bool:
+    try:
+        await call_api(operator_context().core_v1.read_namespaced_persistent_volume_claim, name=pvc_name, namespace=namespace)
+        return True
+    except ApiException as e:
+        if e.status == 404:
+            return False
+        raise
+
+def seed_source(template_name: Optional[str], config: Dict[str, Any], namespace: str) -> Optional[Dict[str, str]]:
+    """
+    按模板的 spec.storage.seed 选择新 PVC 的数据源（见 seed.py），不使用种子时为 None
+    """
+    return data_source(template_name, config.get('storage') or {}, namespace, seed_snapshots)
 
-def create_pod(
+async def create_pod(
     instance_name: str, 
     namespace: str, 
     pvc_name: str, 
-    image: str, 
-    resources: Dict[str, Any],
-    ports: list
+    manifests: CompiledWorkspace,
+    owner: Optional[Dict[str, Any]] = None,
+    labels: Optional[Dict[str, str]] = None
 ) -> str:
     """
-    创建 Pod 资源
+    以 server-side apply 的方式创建 Pod 资源
     
     Args:
         instance_name: 工作空间实例的名称
         namespace: 命名空间
         pvc_name: PVC 的名称
-        image: 容器镜像
-        resources: 资源配置
-        ports: 端口配置
+        manifests: 工作空间配置编译后的清单骨架
+        owner: 所属的对象，设置后 Pod 会带上指向它的 ownerReference
+        labels: Pod 的标签，默认为 workspace_labels(instance_name)
         
     Returns:
         创建的 Pod 的名称
     """
     pod_name = f"{instance_name}"
+    pod_manifest = manifests.render_pod(pod_name, namespace, pvc_name, labels or workspace_labels(instance_name))
     
-    # 确定容器监听的端口，默认为 8080
-    container_listen_port = 8080
-    if ports and ports[0].get('containerPort'):
-        container_listen_port = ports[0]['containerPort']
-
-    container_ports = []
-    if ports:
-        for port in ports:
-            container_ports.append({
-                "name": port.get("name", f"port-{port['containerPort']}"),
-                "containerPort": port["containerPort"],
-                "protocol": port.get("protocol", "TCP")
-            })
-    
-    pod_manifest = {
-        "apiVersion": "v1",
-        "kind": "Pod",
-        "metadata": {
-            "name": pod_name,
-            "namespace": namespace,
-            "labels": {
-                "app": "devworkspace",
-                "instance": instance_name
-            }
-        },
-        "spec": {
-            "containers": [{
-                "name": "vscode-server",
-                "image": image,
-                "ports": container_ports,
-                "volumeMounts": [{
-                    "name": "workspace-storage",
-                    "mountPath": "/workspace"
-                }],
-                "resources": resources,
-                "command": [
-                    "code-server",
-                    "--bind-addr",
-                    f"0.0.0.0:{container_listen_port}",
-                    "--auth",
-                    "none",
-                    "/workspace"
-                ]
-            }],
-            "volumes": [{
-                "name": "workspace-storage",
-                "persistentVolumeClaim": {
-                    "claimName": pvc_name
-                }
-            }]
-        }
-    }
-    
+    if owner is not None:
+        kopf.append_owner_reference(pod_manifest, owner=owner)
+
     try:
-        core_v1.create_namespaced_pod(
-            namespace=namespace,
-            body=pod_manifest
-        )
-        logger.info(f"Created Pod: {pod_name}")
+        with metrics.phase("pod_create", instance_name, namespace):
+            await apply_manifest(pod_manifest)
+        logger.info(f"Applied Pod: {pod_name}")
         return pod_name
     except ApiException as e:
-        if e.status == 409:  # Already exists
-            logger.info(f"Pod {pod_name} already exists")
-            return pod_name
-        else:
-            logger.error(f"Error creating Pod {pod_name}: {e}")
-            raise
+        logger.error(f"Error applying Pod {pod_name}: {e}")
+        raise
 
-def create_service(instance_name: str, namespace: str, ports: list) -> str:
+async def create_service(instance_name: str, namespace: str, manifests: CompiledWorkspace, owner: Optional[Dict[str, Any]] = None) -> str:
     """
-    创建 Service 资源
+    以 server-side apply 的方式创建 Service 资源
     
     Args:
         instance_name: 工作空间实例的名称
         namespace: 命名空间
-        ports: 端口配置
+        manifests: 工作空间配置编译后的清单骨架
+        owner: 所属的 DevWorkspace 对象，设置后 Service 会带上指向它的 ownerReference
         
     Returns:
         创建的 Service 的名称
     """
     service_name = f"{instance_name}"
+    labels = workspace_labels(instance_name)
+    service_manifest = manifests.render_service(service_name, namespace, labels, labels)
     
-    service_ports = []
-    if ports:
-        for port in ports:
-            service_ports.append({
-                "name": port.get("name", f"port-{port['containerPort']}"),
-                "port": port["containerPort"],
-                "targetPort": port["containerPort"],
-                "protocol": port.get("protocol", "TCP")
-            })
-    else:
-        # 默认端口
-        service_ports.append({
-            "name": "http",
-            "port": 8080,
-            "targetPort": 8080,
-            "protocol": "TCP"
-        })
-    
-    service_manifest = {
-        "apiVersion": "v1",
-        "kind": "Service",
-        "metadata": {
-            "name": service_name,
-            "namespace": namespace
-        },
-        "spec": {
-            "selector": {
-                "app": "devworkspace",
-                "instance": instance_name
-            },
-            "ports": service_ports
-        }
-    }
-    
+    if owner is not None:
+        kopf.append_owner_reference(service_manifest, owner=owner)
+
     try:
-        core_v1.create_namespaced_service(
-            namespace=namespace,
-            body=service_manifest
-        )
-        logger.info(f"Created Service: {service_name}")
+        with metrics.phase("service_create", instance_name, namespace):
+            await apply_manifest(service_manifest)
+        logger.info(f"Applied Service: {service_name}")
         return service_name
     except ApiException as e:
-        if e.status == 409:  # Already exists
-            logger.info(f"Service {service_name} already exists")
-            return service_name
-        else:
-            logger.error(f"Error creating Service {service_name}: {e}")
-            raise
+        logger.error(f"Error applying Service {service_name}: {e}")
+        raise
 
-def get_service_url(service_name: str, namespace: str) -> str:
+async def get_service_url(service_name: str, namespace: str) -> str:
     """
-    获取服务的访问 URL，带有重试逻辑以等待 ClusterIP 分配
-    
+    获取服务的访问 URL，等待共享 watch 缓存中出现已分配的 ClusterIP
+
     Args:
         service_name: 服务名称
         namespace: 命名空间
-        
+
     Returns:
         服务的访问 URL，如果超时则返回 "Unknown"
     """
-    retries = 10
-    delay = 2  # seconds
-    for i in range(retries):
-        try:
-            service = core_v1.read_namespaced_service(
-                name=service_name,
-                namespace=namespace
-            )
-            # 使用类型检查和安全访问
-            if service and isinstance(service, client.V1Service):
-                if service.spec and service.spec.cluster_ip:
-                    port = service.spec.ports[0].port
-                    logger.info(f"Service {service_name} has ClusterIP {service.spec.cluster_ip}")
-                    return f"http://{service.spec.cluster_ip}:{port}"
-                else:
-                    logger.info(f"Service {service_name} does not have a ClusterIP yet. Retrying... ({i+1}/{retries})")
-                    time.sleep(delay)
-            else:
-                logger.info(f"Service {service_name} is not properly initialized. Retrying... ({i+1}/{retries})")
-                time.sleep(delay)
-        except ApiException as e:
-            logger.error(f"Error getting service {service_name}: {e}. Retrying... ({i+1}/{retries})")
-            time.sleep(delay)
-            
-    logger.error(f"Failed to get ClusterIP for service {service_name} after {retries} retries.")
+    timeout = 20  # seconds
+    try:
+        service = await service_cache.wait_for(
+            namespace, service_name,
+            lambda svc: svc is not None and bool(svc.cluster_ip),
+            timeout=timeout
+        )
+        logger.info(f"Service {service_name} has ClusterIP {service.cluster_ip}")
+        return f"http://{service.cluster_ip}:{service.port}"
+    except asyncio.TimeoutError:
+        pass
+
+    # 旧版本创建的 Service 没有 app=devworkspace 标签，不在缓存中，回退为一次直接读取
+    try:
+        service = await call_api(
+            operator_context().core_v1.read_namespaced_service,
+            name=service_name,
+            namespace=namespace
+        )
+        if service and isinstance(service, client.V1Service) and service.spec and service.spec.cluster_ip:
+            return f"http://{service.spec.cluster_ip}:{service.spec.ports[0].port}"
+    except ApiException as e:
+        logger.error(f"Error getting service {service_name}: {e}")
+
+    logger.error(f"Failed to get ClusterIP for service {service_name} after {timeout} seconds.")
     return "Unknown"
 
-def _get_workspace_config(spec: Dict[str, Any], logger: logging.Logger) -> Optional[Dict[str, Any]]:
+async def _get_workspace_config(spec: Dict[str, Any], logger: logging.Logger) -> Optional[Dict[str, Any]]:
     """
     辅助函数：获取并合并工作空间配置
     """
@@ -387,14 +688,15 @@ def _get_workspace_config(spec: Dict[str, Any], logger: logging.Logger) -> Optio
         logger.error("No templateRef specified")
         return None
     
-    template = get_workspace_template(template_ref)
+    with metrics.phase("template_fetch"):
+        template = await get_workspace_template(template_ref)
     if not template:
         logger.error(f"Template {template_ref} not found")
         return None
     
-    template_spec = template.get('spec', {})
-    overrides = spec.get('overrides', {})
-    config = merge_configs(template_spec, overrides)
+    with metrics.phase("merge"):
+        # 缓存中的模板已经冻结，合并不会修改它，也不需要复制
+        config = merge_configs(template.get('spec', {}), spec.get('overrides'))
     
     if not config.get('environment', {}).get('image'):
         logger.error("No image specified in template")
@@ -402,57 +704,273 @@ def _get_workspace_config(spec: Dict[str, Any], logger: logging.Logger) -> Optio
         
     return config
 
-@kopf.on.create(DEV_WORKSPACE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION)
-def create_workspace_instance(body: Dict[str, Any], name: str, namespace: str, logger: logging.Logger, **kwargs):
+def _is_transient_error(error: BaseException) -> bool:
+    """
+    判断创建失败是否是暂时性的（值得重试）
+
+    API Server 的 5xx、429 以及连接错误都视为暂时性错误，其余 4xx（例如清单非法）视为永久性错误。
+    """
+    if isinstance(error, ApiException):
+        return error.status is None or error.status == 429 or error.status >= 500
+    return not isinstance(error, (kopf.PermanentError, ValueError, TypeError, KeyError))
+
+async def _handle_partial_creation(name: str, namespace: str, results: list, logger: logging.Logger, retry: int = 0):
+    """
+    处理并行创建 PVC / Pod / Service 时的部分失败
+
+    - 暂时性错误：保留已经创建成功的资源并抛出 TemporaryError，
+      kopf 重试时 server-side apply 是幂等的，会直接接管（adopt）这些资源
+    - 永久性错误：回滚本次创建成功的资源，再把错误抛给调用方
+
+    Args:
+        name: 工作空间实例的名称
+        namespace: 命名空间
+        results: asyncio.gather 的结果，顺序为 PVC、Pod、Service
+        logger: 日志对象
+        retry: kopf 传入的重试次数，用于计算退避间隔
+    """
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if not errors:
+        return
+
+    if all(_is_transient_error(error) for error in errors):
+        raise kopf.TemporaryError(f"Failed to create resources: {errors[0]}", delay=_retry_delay(retry))
+
+    pvc_name, pod_name, service_name = results
+    deleters = [
+        (pod_name, operator_context().core_v1.delete_namespaced_pod),
+        (service_name, operator_context().core_v1.delete_namespaced_service),
+        (pvc_name, operator_context().core_v1.delete_namespaced_persistent_volume_claim),
+    ]
+    for resource_name, delete_fn in deleters:
+        if resource_name is None or isinstance(resource_name, BaseException):
+            continue
+        try:
+            await call_api(delete_fn, name=resource_name, namespace=namespace)
+            logger.info(f"Rolled back {resource_name} after failed creation of {name}")
+        except ApiException as e:
+            if e.status != 404:
+                logger.error(f"Error rolling back {resource_name}: {e}")
+
+    raise next(error for error in errors if not _is_transient_error(error))
+
+def _can_use_warm_pool(spec: Dict[str, Any]) -> bool:
+    """
+    判断工作空间能否使用预热 Pod
+
+    池成员严格按模板创建，带有覆盖配置（镜像、资源、端口、存储大小）的工作空间只能冷启动。
+    """
+    return not spec.get('paused') and not spec.get('overrides')
+
+async def claim_warm_pod(name: str, namespace: str, owner: Dict[str, Any], template_ref: str, logger: logging.Logger) -> Optional[Tuple[str, str]]:
+    """
+    从模板的预热池中认领一个 Pod 及其 PVC
+
+    认领通过一次带 resourceVersion 的 merge patch 完成：移除池标签、加上 instance 标签、
+    并把 ownerReference 换成工作空间，工作空间的 Service 随即选中该 Pod。
+    resourceVersion 保证多个 Operator 副本不会认领同一个 Pod（冲突时返回 409，换下一个成员重试）。
+
+    Args:
+        name: 工作空间实例的名称
+        namespace: 命名空间
+        owner: DevWorkspace 对象
+        template_ref: 模板名称
+        logger: 日志对象
+
+    Returns:
+        (Pod 名称, PVC 名称)，池中没有可用成员时返回 None
+    """
+    generation = _template_generation(template_ref)
+    while True:
+        member = warm_pool.reserve(template_ref, namespace, generation)
+        if member is None:
+            return None
+
+        # merge patch 整体替换 ownerReferences：模板的 controller 引用换成工作空间的，
+        # strategic merge 会按 uid 保留模板的引用，两个 controller 引用会被 API Server 以 422 拒绝
+        patch = {"metadata": {
+            "resourceVersion": member['resourceVersion'],
+            "labels": dict(workspace_labels(name), **{POOL_LABEL: None, GENERATION_LABEL: None}),
+        }}
+        kopf.append_owner_reference(patch, owner=owner)
+        claimed = False
+        try:
+            # 条件更新：超时后重试可能把自己刚认领的 Pod 当作被别人抢走，因此不自动重试
+            await merge_patch("Pod", member['name'], namespace, patch, idempotent=False)
+            claimed = True
+        except ApiException as e:
+            if e.status not in (404, 409):
+                raise
+            logger.info(f"Warm pod {member['name']} was taken concurrently, trying another one")
+        finally:
+            warm_pool.release(member, claimed)
+        if claimed:
+            break
+
+    logger.info(f"Claimed warm pod {member['name']} ({member['phase']}) for workspace {name}")
+    return member['name'], member['pvcName']
+
+async def adopt_warm_pvc(name: str, namespace: str, owner: Dict[str, Any], pvc_name: str, logger: logging.Logger, retry: int = 0):
+    """
+    把认领的预热 Pod 的 PVC 转交给工作空间（ownerReference 换成工作空间），删除工作空间时由垃圾回收器清理
+
+    PVC 只被这一个 Pod 使用，不存在竞争；merge patch 是幂等的，kopf 重试时再执行一次即可。
+
+    Raises:
+        kopf.TemporaryError: 转交失败，PVC 仍由模板持有
+    """
+    pvc_patch = {"metadata": {"labels": dict(workspace_labels(name), **{POOL_LABEL: None, GENERATION_LABEL: None})}}
+    kopf.append_owner_reference(pvc_patch, owner=owner)
+    try:
+        await merge_patch("PersistentVolumeClaim", pvc_name, namespace, pvc_patch)
+    except ApiException as e:
+        logger.error(f"Failed to adopt PVC {pvc_name} of the claimed warm pod: {e}")
+        raise kopf.TemporaryError(f"Failed to adopt PVC {pvc_name}: {e}", delay=_retry_delay(retry))
+
+@kopf.on.create(DEV_WORKSPACE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION, when=_owned)
+async def create_workspace_instance(body: Dict[str, Any], name: str, namespace: str, logger: logging.Logger, status: Optional[Dict[str, Any]] = None, retry: int = 0, **kwargs):
     """
     处理 DevWorkspace 的创建事件
+
+    属于 DevWorkspaceSet 的工作空间在该集合的并发和 QPS 预算内、以 BULK 优先级创建资源，
+    单独创建的工作空间是有人在等待的交互式操作，以 INTERACTIVE 优先级创建。
+    先占用集合的预算再等待调度名额，避免集合中排队的成员占着名额空等。
+    """
+    set_name = body.get('metadata', {}).get('labels', {}).get(SET_LABEL)
+    budget = workspace_sets.budget_for(namespace, set_name)
+    if budget is None:
+        async with scheduler.slot(namespace, BULK if set_name else INTERACTIVE):
+            await provision_workspace_instance(body, name, namespace, logger, status, retry)
+        return
+    async with budget.limit(), scheduler.slot(namespace, BULK):
+        await provision_workspace_instance(body, name, namespace, logger, status, retry)
+
+async def provision_workspace_instance(body: Dict[str, Any], name: str, namespace: str, logger: logging.Logger, status: Optional[Dict[str, Any]] = None, retry: int = 0):
+    """
+    创建工作空间的 PVC、Pod 和 Service（或认领预热 Pod），并把状态推进到 Starting
     """
     logger.info(f"Creating devworkspace: {name} in namespace {namespace}")
-    patch_status(name, namespace, {"phase": "Provisioning", "message": "Creating resources..."})
+    # 资源通常很快创建完成，Provisioning 会与随后的 Starting 合并为一次写入
+    await patch_status(name, namespace, {"phase": "Provisioning", "message": "Creating resources..."}, wait=False)
 
-    config = _get_workspace_config(body.get('spec', {}), logger)
+    config = await _get_workspace_config(body.get('spec', {}), logger)
     if not config:
-        patch_status(name, namespace, {"phase": "Failed", "message": "Failed to get workspace config"})
+        await patch_status(name, namespace, {"phase": "Failed", "message": "Failed to get workspace config"})
         return
 
-    # 获取配置参数
-    image = config.get('environment', {}).get('image')
-    resources = config.get('resources', {})
-    storage_size = config.get('storage', {}).get('size', '10Gi')
-    ports = config.get('ports', [])
+    try:
+        manifests = manifest_renderer.compile(body['spec']['templateRef'], config)
+    except ValueError as e:
+        logger.error(str(e))
+        await patch_status(name, namespace, {"phase": "Failed", "message": str(e)})
+        return
+
+    # 创建时就处于暂停状态的工作空间只创建 PVC 和 Service，恢复时再创建 Pod
+    paused = bool(body.get('spec', {}).get('paused'))
+    
+    status = status or {}
     
     try:
-        pvc_name = create_pvc(name, namespace, storage_size)
-        pod_name = create_pod(name, namespace, pvc_name, image, resources, ports)
-        service_name = create_service(name, namespace, ports)
+        # 优先从预热池中认领 Pod；认领结果先写入 status，kopf 重试时直接沿用而不会再认领一个
+        claimed = None
+        if status.get('warmPodClaimed'):
+            claimed = status['podName'], status['pvcName']
+        elif _can_use_warm_pool(body.get('spec', {})):
+            claimed = await claim_warm_pod(name, namespace, body, body['spec']['templateRef'], logger)
+            if claimed:
+                await patch_status(name, namespace, {
+                    "podName": claimed[0],
+                    "pvcName": claimed[1],
+                    "warmPodClaimed": True
+                })
 
-        wait_for_pod_running(pod_name, namespace, logger)
-        url = get_service_url(service_name, namespace)
-        
-        final_status = {
-            "phase": "Running",
-            "message": "Workspace is ready",
+        if claimed:
+            pod_name, pvc_name = claimed
+            await adopt_warm_pvc(name, namespace, body, pvc_name, logger, retry)
+            results = await asyncio.gather(create_service(name, namespace, manifests, owner=body), return_exceptions=True)
+            # 认领的 Pod 和 PVC 不属于本次创建，部分失败时不回滚
+            await _handle_partial_creation(name, namespace, [None, None, results[0]], logger, retry)
+            service_name = results[0]
+        else:
+            # 三个资源互不依赖：Pod 通过确定的名称引用 PVC，API Server 接受引用尚不存在的 PVC 的 Pod，
+            # Pod 在 PVC 绑定前由调度器保持 Pending，创建请求不会因此失败或重试。
+            # 同时发出只在 API 线程池（API_CONNECTION_POOL_SIZE）有空闲时缩短单个工作空间的创建时间；
+            # 大量工作空间同时创建时延迟和吞吐量由线程池和限速决定（见 bench/bench_provisioning.py）
+            pvc_name = pvc_name_for(name)
+            results = await asyncio.gather(
+                create_pvc(name, namespace, manifests, owner=body, seed=seed_source(body['spec']['templateRef'], config, namespace)),
+                asyncio.sleep(0) if paused else create_pod(name, namespace, pvc_name, manifests, owner=body),
+                create_service(name, namespace, manifests, owner=body),
+                return_exceptions=True
+            )
+            await _handle_partial_creation(name, namespace, results, logger, retry)
+            pvc_name, pod_name, service_name = results
+
+        if paused:
+            await patch_status(name, namespace, {
+                "phase": "Stopped",
+                "message": "Workspace is paused",
+                "pvcName": pvc_name,
+                "serviceName": service_name,
+                "templateGeneration": _template_generation(body.get('spec', {}).get('templateRef')),
+                "configHash": config_hash(config),
+                "resourcesOwned": True
+            })
+            logger.info(f"Workspace instance {name} created in paused state")
+            return
+
+        # 资源创建完成后立即返回，由 advance_starting_workspace 在 Pod 就绪后推进到 Running
+        await patch_status(name, namespace, {
+            "phase": "Starting",
+            "message": "Waiting for warm pod to become ready" if claimed else "Waiting for pod to start",
             "podName": pod_name,
             "pvcName": pvc_name,
             "serviceName": service_name,
-            "url": url
-        }
-        patch_status(name, namespace, final_status)
-        logger.info(f"Workspace instance {name} is running at {url}")
+            "templateGeneration": _template_generation(body.get('spec', {}).get('templateRef')),
+            "configHash": config_hash(config),
+            "resourcesOwned": True
+        })
+        logger.info(f"Resources for workspace instance {name} created, waiting for pod to start")
 
     except kopf.TemporaryError as e:
         message = f"Failed to create workspace, will retry: {e}"
-        patch_status(name, namespace, {"phase": "Provisioning", "message": message})
+        await patch_status(name, namespace, {"phase": "Provisioning", "message": message})
         raise
     except Exception as e:
         logger.error(f"Failed to create devworkspace {name}: {e}", exc_info=True)
         message = f"An unexpected error occurred: {e}"
-        patch_status(name, namespace, {"phase": "Failed", "message": message})
+        await patch_status(name, namespace, {"phase": "Failed", "message": message})
 
-@kopf.on.update(DEV_WORKSPACE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION)
-def update_workspace_instance(body: Dict[str, Any], name: str, namespace: str, status: Dict[str, Any], logger: logging.Logger, diff: kopf.Diff, **kwargs):
+@kopf.on.update(DEV_WORKSPACE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION, when=_owned)
+async def update_workspace_instance(body: Dict[str, Any], name: str, namespace: str, status: Dict[str, Any], logger: logging.Logger, diff: kopf.Diff, memo: kopf.Memo, old: Optional[Dict[str, Any]] = None, retry: int = 0, **kwargs):
     """
     处理 DevWorkspace 的更新事件
+
+    恢复是有人在等待的交互式操作，以 INTERACTIVE 优先级执行；暂停以 BACKGROUND 优先级执行，其余更新为 NORMAL。
+    """
+    pause_changed = any(path == ('spec', 'paused') for op, path, old_value, new_value in diff)
+    if not pause_changed:
+        priority = NORMAL
+    elif body.get('spec', {}).get('paused'):
+        priority = BACKGROUND
+    else:
+        priority = INTERACTIVE
+    async with scheduler.slot(namespace, priority):
+        await update_workspace(body, name, namespace, status, logger, pause_changed, memo, old, retry)
+
+async def update_workspace(
+    body: Dict[str, Any],
+    name: str,
+    namespace: str,
+    status: Dict[str, Any],
+    logger: logging.Logger,
+    pause_changed: bool,
+    memo: kopf.Memo,
+    old: Optional[Dict[str, Any]] = None,
+    retry: int = 0
+):
+    """
+    按变更的内容暂停、恢复或更新工作空间
     """
     logger.info(f"Updating devworkspace: {name} in namespace {namespace}")
     
@@ -460,242 +978,1415 @@ def update_workspace_instance(body: Dict[str, Any], name: str, namespace: str, s
         logger.info(f"Instance {name} is in Failed state, skipping update")
         return
 
-    config = _get_workspace_config(body.get('spec', {}), logger)
+    spec = body.get('spec', {})
+    if spec.get('paused'):
+        if pause_changed:
+            await stop_workspace(name, namespace, status, logger, retry)
+        else:
+            # 暂停期间的配置变更在恢复时才生效
+            logger.info(f"Instance {name} is paused, changes will be applied on resume")
+        return
+
+    config = await _get_workspace_config(spec, logger)
     if not config:
-        patch_status(name, namespace, {"phase": "Failed", "message": "Failed to get workspace config"})
+        await patch_status(name, namespace, {"phase": "Failed", "message": "Failed to get workspace config"})
         return
 
-    # 定义需要重启 Pod 的变更字段路径
-    # Pod 的 image, ports, resources, 和引用的 template 都是不可变或需要重建的
-    restart_trigger_paths = [
-        ('spec', 'templateRef'),
-        ('spec', 'overrides', 'ports'),
-        ('spec', 'overrides', 'environment'), # 任何环境变化都重启
-        ('spec', 'overrides', 'resources'),
-    ]
+    if pause_changed:
+        # 恢复时 Pod 直接按当前配置创建，暂停期间的其他变更也一并生效
+        memo.pop('lastActive', None)
+        await resume_workspace(name, namespace, body, status, config, logger, retry)
+        return
 
-    should_recreate_pod = False
-    for op, path, old, new in diff:
-        # 检查变更的字段路径是否以任何一个触发路径开头
-        if any(path[:len(trigger)] == trigger for trigger in restart_trigger_paths):
-            logger.info(f"Detected change in a critical field: {path}. Recreation is required.")
-            should_recreate_pod = True
-            break
+    # 有效配置与当前 Pod 所基于的配置相同（例如只修改了 idleTimeout），不需要比较旧配置
+    if status.get('configHash') == config_hash(config):
+        logger.info(f"Effective config of {name} is unchanged, skipping update")
+        return
 
-    if should_recreate_pod:
-        logger.info(f"Recreating resources for instance {name}")
-        pod_name = status.get('podName')
-        service_name = status.get('serviceName')
+    # 与变更前的配置比较，按变化的字段选择代价最小的更新方式；旧模板已被删除时无法比较，按重建 Pod 处理
+    old_spec = dict((old or {}).get('spec') or {})
+    old_config = await _get_workspace_config(old_spec, logger) if old_spec.get('templateRef') else None
+    await apply_config_change(name, namespace, body, spec, status, old_config, config, logger)
 
-        # 1. 删除旧的 Pod 和 Service (先删除 Service，再删除 Pod)
-        if service_name:
-            try:
-                core_v1.delete_namespaced_service(name=service_name, namespace=namespace)
-                # 等待 Service 被彻底删除
-                wait_for_service_deletion(service_name, namespace, logger)
-                logger.info(f"Deleted Service: {service_name}")
-                
-            except ApiException as e:
-                if e.status != 404: logger.error(f"Error deleting Service {service_name}: {e}")
-        
-        if pod_name:
-            try:
-                core_v1.delete_namespaced_pod(name=pod_name, namespace=namespace)
-                # 等待 Pod 被彻底删除
-                wait_for_pod_deletion(pod_name, namespace, logger)
-                logger.info(f"Deleted Pod: {pod_name}")
-                
-            except ApiException as e:
-                if e.status != 404: logger.error(f"Error deleting Pod {pod_name}: {e}")
+async def apply_config_change(
+    name: str,
+    namespace: str,
+    owner: Dict[str, Any],
+    spec: Dict[str, Any],
+    status: Dict[str, Any],
+    old_config: Optional[Dict[str, Any]],
+    config: Dict[str, Any],
+    logger: logging.Logger
+) -> bool:
+    """
+    把配置变更应用到运行中的工作空间，按变化的字段选择代价最小的方式（见 update_plan.plan_update）
 
-        # 2. 创建新的 Pod 和 Service
-        try:
-            image = config.get('environment', {}).get('image')
-            resources = config.get('resources', {})
-            ports = config.get('ports', [])
-            pvc_name = status.get('pvcName') # PVC 不应重新创建
+    - 端口变化：通过 server-side apply 更新 Service，ClusterIP 不变；
+    - 资源变化：原地调整 Pod 的资源，集群不支持时重建 Pod；
+    - 镜像或 code-server 监听端口变化：只重建 Pod，Service 保留，status.url 保持不变。
 
-            if not pvc_name:
-                 raise kopf.PermanentError("Cannot recreate Pod without a PVC name in status.")
+    Args:
+        name: 工作空间实例的名称
+        namespace: 命名空间
+        owner: DevWorkspace 对象（至少包含 apiVersion、kind、metadata.name 和 metadata.uid）
+        spec: 工作空间的 spec
+        status: 工作空间当前的 status
+        old_config: 变更前合并后的配置，未知时为 None
+        config: 变更后合并后的配置
+        logger: 日志对象
 
-            new_pod_name = create_pod(name, namespace, pvc_name, image, resources, ports)
-            new_service_name = create_service(name, namespace, ports)
+    Returns:
+        Pod 是否被重建（重建后需要等待它重新进入 Running）
+    """
+    plan = plan_update(old_config, config)
+    if not plan:
+        logger.info(f"No significant changes detected for {name}. Skipping resource update.")
+        return False
 
-            wait_for_pod_running(new_pod_name, namespace, logger)
-            url = get_service_url(new_service_name, namespace)
+    logger.info(f"Updating workspace instance {name}: {plan.describe()}")
+    try:
+        if plan.update_service:
+            manifests = manifest_renderer.compile(spec.get('templateRef'), config)
+            await create_service(name, namespace, manifests, owner=owner)
+        if plan.resize and not plan.recreate_pod:
+            old_resources = (old_config or {}).get('resources') or {}
+            plan.recreate_pod = not await resize_pod(name, namespace, status, old_resources, config.get('resources') or {}, logger)
+        if plan.recreate_pod:
+            await recreate_workspace_pod(name, namespace, owner, spec, status, config, logger)
+            return True
 
-            final_status = {
-                "phase": "Running",
-                "message": "Workspace is updated",
-                "podName": new_pod_name,
-                "pvcName": pvc_name,
-                "serviceName": new_service_name,
-                "url": url
-            }
-            patch_status(name, namespace, final_status)
-            logger.info(f"Workspace instance {name} has been updated and is running at {url}")
+        await patch_status(name, namespace, {
+            "message": "Resources resized in place" if plan.resize else "Service ports updated",
+            "templateGeneration": _template_generation(spec.get('templateRef')),
+            "configHash": config_hash(config)
+        })
+        logger.info(f"Workspace instance {name} updated without restarting its pod")
+        return False
 
-        except Exception as e:
-            logger.error(f"Failed to update devworkspace {name}: {e}", exc_info=True)
-            message = f"An unexpected error occurred during update: {e}"
-            patch_status(name, namespace, {"phase": "Failed", "message": message})
-    else:
-        logger.info(f"No significant changes detected for {name}. Skipping resource recreation.")
+    except Exception as e:
+        logger.error(f"Failed to update devworkspace {name}: {e}", exc_info=True)
+        message = f"An unexpected error occurred during update: {e}"
+        await patch_status(name, namespace, {"phase": "Failed", "message": message})
+        return False
 
-@kopf.on.delete(DEV_WORKSPACE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION)
-def delete_workspace_instance(name: str, namespace: str, status: Dict[str, Any], logger: logging.Logger, **kwargs):
+async def resize_pod(
+    name: str,
+    namespace: str,
+    status: Dict[str, Any],
+    old_resources: Dict[str, Any],
+    resources: Dict[str, Any],
+    logger: logging.Logger
+) -> bool:
     """
-    处理 DevWorkspace 的删除事件
+    原地调整工作空间 Pod 的资源（in-place pod resize），容器不重启
+
+    优先使用 Pod 的 resize 子资源（Kubernetes 1.33+）；API Server 没有该子资源时直接 patch Pod
+    （1.27 - 1.32 开启 InPlacePodVerticalScaling 特性门控时可用）。
+    集群不支持原地调整，或者变更无法原地完成（例如会改变 Pod 的 QoS 类别）时 API Server 会拒绝请求。
+
+    Args:
+        name: 工作空间实例的名称
+        namespace: 命名空间
+        status: 工作空间当前的 status
+        old_resources: 变更前的资源配置
+        resources: 变更后的资源配置
+        logger: 日志对象
+
+    Returns:
+        是否调整成功；返回 False 时调用方应重建 Pod
     """
-    logger.info(f"Deleting devworkspace: {name} in namespace {namespace}")
-    
-    if not status:
-        logger.warning(f"Workspace instance {name} has no status, nothing to delete.")
-        return
+    if not IN_PLACE_RESIZE_ENABLED:
+        return False
+
+    pod_name = status.get('podName') or name
+    body = resize_patch(WORKSPACE_CONTAINER, old_resources, resources)
+    pod_path = f"/api/v1/namespaces/{namespace}/pods/{pod_name}"
+    for path in (f"{pod_path}/resize", pod_path):
+        try:
+            with metrics.phase("pod_resize", name, namespace):
+                await call_api(
+                    operator_context().api_client.call_api,
+                    path,
+                    "PATCH",
+                    header_params={
+                        "Accept": "application/json",
+                        "Content-Type": "application/strategic-merge-patch+json"
+                    },
+                    body=body,
+                    response_type="object",
+                    auth_settings=["BearerToken"],
+                    _return_http_data_only=True
+                )
+            logger.info(f"Resized pod {pod_name} in place")
+            return True
+        except ApiException as e:
+            if path != pod_path and e.status in (403, 404):
+                # 1.33 之前没有 resize 子资源（或者 RBAC 未授权），改为直接 patch Pod
+                continue
+            if e.status in (400, 403, 404, 409, 422):
+                logger.info(f"In-place resize of pod {pod_name} was rejected ({e.status} {e.reason}), recreating it")
+                return False
+            raise
+    return False
+
+async def recreate_workspace_pod(
+    name: str,
+    namespace: str,
+    owner: Dict[str, Any],
+    spec: Dict[str, Any],
+    status: Dict[str, Any],
+    config: Dict[str, Any],
+    logger: logging.Logger
+):
+    """
+    用新的配置重建工作空间的 Pod（保留 PVC 和 Service），并把状态置为 Starting
+
+    Service 不删除，ClusterIP 和 status.url 保持不变；它的 selector 只依赖工作空间名称，新 Pod 就绪后自动接管流量。
 
-    # 获取当前的 Pod、PVC 和 Service
+    Args:
+        name: 工作空间实例的名称
+        namespace: 命名空间
+        owner: DevWorkspace 对象（至少包含 apiVersion、kind、metadata.name 和 metadata.uid）
+        spec: 工作空间的 spec
+        status: 工作空间当前的 status
+        config: 合并后的配置
+        logger: 日志对象
+    """
+    logger.info(f"Recreating pod for instance {name}")
     pod_name = status.get('podName')
-    pvc_name = status.get('pvcName')
-    service_name = status.get('serviceName')
-    
-    # 删除 Pod
+    pvc_name = status.get('pvcName') # PVC 不应重新创建
+    if not pvc_name:
+        raise kopf.PermanentError("Cannot recreate Pod without a PVC name in status.")
+
+    # 1. 删除旧的 Pod
     if pod_name:
         try:
-            core_v1.delete_namespaced_pod(
-                name=pod_name,
-                namespace=namespace
-            )
-            # 等待 Pod 被彻底删除
-            wait_for_pod_deletion(pod_name, namespace, logger)
+            await call_api(operator_context().core_v1.delete_namespaced_pod, name=pod_name, namespace=namespace)
+            # 等待 Pod 被彻底删除（最长 150 秒），等待期间归还调度名额，删除完成后重新排队再创建新的 Pod
+            with metrics.phase("delete_wait", name, namespace):
+                async with scheduler.suspended():
+                    await wait_for_pod_deletion(pod_name, namespace, logger)
             logger.info(f"Deleted Pod: {pod_name}")
-            
-        except ApiException as e:
-            if e.status != 404:  # 忽略 "Not Found" 错误
-                logger.error(f"Error deleting Pod {pod_name}: {e}")
-    
-    # 删除 Service
-    if service_name:
-        try:
-            core_v1.delete_namespaced_service(
-                name=service_name,
-                namespace=namespace
-            )
-            # 等待 Service 被彻底删除
-            wait_for_service_deletion(service_name, namespace, logger)
-            logger.info(f"Deleted Service: {service_name}")
-        except ApiException as e:
-            if e.status != 404:  # 忽略 "Not Found" 错误
-                logger.error(f"Error deleting Service {service_name}: {e}")
-    
-    # 删除 PVC（可选，取决于是否要保留数据）
-    # 在实际使用中，可能需要根据策略来决定是否删除 PVC
-    if pvc_name:
-        try:
-            core_v1.delete_namespaced_persistent_volume_claim(
-                name=pvc_name,
-                namespace=namespace
-            )
-            logger.info(f"Deleted PVC: {pvc_name}")
+
         except ApiException as e:
-            if e.status != 404:  # 忽略 "Not Found" 错误
-                logger.error(f"Error deleting PVC {pvc_name}: {e}")
-    
-    # 不需要返回任何状态，因为资源正在被删除
+            if e.status != 404: logger.error(f"Error deleting Pod {pod_name}: {e}")
 
-def patch_status(name: str, namespace: str, status: Dict[str, Any]):
+    # 2. 创建新的 Pod
+    manifests = manifest_renderer.compile(spec.get('templateRef'), config)
+    new_pod_name = await create_pod(name, namespace, pvc_name, manifests, owner=owner)
+
+    await patch_status(name, namespace, {
+        "phase": "Starting",
+        "message": "Waiting for updated pod to start",
+        "podName": new_pod_name,
+        "templateGeneration": _template_generation(spec.get('templateRef')),
+        "configHash": config_hash(config)
+    })
+    logger.info(f"Pod for workspace instance {name} recreated, waiting for it to start")
+
+async def stop_workspace(name: str, namespace: str, status: Dict[str, Any], logger: logging.Logger, retry: int = 0):
     """
-    通过 patch 方法更新 DevWorkspace 的状态
+    暂停工作空间：只删除 Pod，保留 PVC 和 Service，恢复时不需要重新分配存储和 ClusterIP
+
+    Args:
+        name: 工作空间实例的名称
+        namespace: 命名空间
+        status: 工作空间当前的 status
+        logger: 日志对象
+        retry: kopf 传入的重试次数，用于计算退避间隔
     """
+    pod_name = status.get('podName') or name
     try:
-        custom_api.patch_namespaced_custom_object_status(
+        await call_api(operator_context().core_v1.delete_namespaced_pod, name=pod_name, namespace=namespace)
+        logger.info(f"Deleted Pod {pod_name} of paused workspace {name}")
+    except ApiException as e:
+        if e.status != 404:
+            logger.error(f"Error deleting Pod {pod_name}: {e}")
+            raise kopf.TemporaryError(f"Failed to stop workspace: {e}", delay=_retry_delay(retry))
+
+    await patch_status(name, namespace, {
+        "phase": "Stopped",
+        "message": "Workspace is paused",
+        "podName": None,
+        "url": None,
+        "resumeStartedAt": None
+    })
+
+async def resume_workspace(
+    name: str,
+    namespace: str,
+    owner: Dict[str, Any],
+    status: Dict[str, Any],
+    config: Dict[str, Any],
+    logger: logging.Logger,
+    retry: int = 0
+):
+    """
+    恢复已暂停的工作空间：按当前配置重新创建 Pod，PVC 和 Service 沿用暂停前的对象
+
+    Service 同样以 server-side apply 重新应用一次（幂等），以便暂停期间的端口变更生效。
+    resumeStartedAt 记录恢复开始的时间，advance_starting_workspace 在 Pod 就绪后据此计算恢复耗时。
+
+    Args:
+        name: 工作空间实例的名称
+        namespace: 命名空间
+        owner: DevWorkspace 对象
+        status: 工作空间当前的 status
+        config: 合并后的配置
+        logger: 日志对象
+        retry: kopf 传入的重试次数，用于计算退避间隔
+    """
+    logger.info(f"Resuming workspace {name}")
+    resume_started_at = _utc_now()
+    pvc_name = status.get('pvcName') or pvc_name_for(name)
+
+    try:
+        manifests = manifest_renderer.compile(owner.get('spec', {}).get('templateRef'), config)
+        pod_name, service_name = await asyncio.gather(
+            create_pod(name, namespace, pvc_name, manifests, owner=owner),
+            create_service(name, namespace, manifests, owner=owner)
+        )
+    except ValueError as e:
+        logger.error(str(e))
+        await patch_status(name, namespace, {"phase": "Failed", "message": str(e)})
+        return
+    except ApiException as e:
+        if _is_transient_error(e):
+            raise kopf.TemporaryError(f"Failed to resume workspace: {e}", delay=_retry_delay(retry))
+        logger.error(f"Failed to resume devworkspace {name}: {e}")
+        await patch_status(name, namespace, {"phase": "Failed", "message": f"Failed to resume workspace: {e}"})
+        return
+
+    await patch_status(name, namespace, {
+        "phase": "Starting",
+        "message": "Resuming workspace",
+        "podName": pod_name,
+        "pvcName": pvc_name,
+        "serviceName": service_name,
+        "resumeStartedAt": resume_started_at,
+        "templateGeneration": _template_generation(owner.get('spec', {}).get('templateRef')),
+        "configHash": config_hash(config)
+    })
+
+def _is_idle_candidate(spec: Dict[str, Any], status: Dict[str, Any], **kwargs) -> bool:
+    """timer 过滤条件：只检查设置了 idleTimeout、正在运行且未暂停、由本副本负责的工作空间"""
+    return bool(spec.get('idleTimeout')) and not spec.get('paused') and status.get('phase') == "Running" and _owned(**kwargs)
+
+@kopf.timer(
+    DEV_WORKSPACE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION,
+    interval=IDLE_CHECK_INTERVAL, when=_is_idle_candidate
+)
+async def stop_idle_workspace(name: str, namespace: str, body: kopf.Body, spec: Dict[str, Any], memo: kopf.Memo, logger: logging.Logger, **kwargs):
+    """
+    空闲超过 spec.idleTimeout 的工作空间自动缩容到零
+
+    最近一次活动时间保存在 kopf 的 per-object memo 中，初始值为首次检查的时间，
+    因此 Operator 重启后最多把空闲时长多算一个 idleTimeout，而不会误停正在使用的工作空间。
+    无法判断活跃度时（例如 metrics-server 未安装或不可用）按活跃处理：最近一次活动时间刷新为本次检查的时间，
+    不会因为读不到活跃度而暂停工作空间。
+    这里只把 spec.paused 置为 true，真正的停止由 update handler 完成，与手动暂停走同一条路径。
+    """
+    timeout = parse_duration(spec.get('idleTimeout'))
+    if timeout is None:
+        logger.warning(f"Invalid idleTimeout {spec.get('idleTimeout')!r} on {name}, skipping idle check")
+        return
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    last_active = memo.get('lastActive') or now
+    try:
+        observed = await activity_probe.last_activity(name, namespace, body)
+    except (ActivityUnknown, ApiException) as e:
+        logger.warning(f"Cannot determine activity of workspace {name}, treating it as active: {e}")
+        memo['lastActive'] = now
+        return
+    if observed is not None and observed > last_active:
+        last_active = observed
+    memo['lastActive'] = last_active
+
+    idle_seconds = (now - last_active).total_seconds()
+    if idle_seconds < timeout:
+        return
+
+    logger.info(f"Workspace {name} has been idle for {int(idle_seconds)}s, pausing it")
+    async with scheduler.slot(namespace, BACKGROUND):
+        await call_api(
+            operator_context().custom_api.patch_namespaced_custom_object,
             group=API_GROUP,
             version=API_VERSION,
             namespace=namespace,
             plural=DEV_WORKSPACE_KIND.lower() + "s",
             name=name,
-            body={"status": status}
+            body={"spec": {"paused": True}}
         )
-    except ApiException as e:
-        logger.error(f"Failed to patch status for {name}: {e}")
+    memo.pop('lastActive', None)
+
+# 模板变更时需要更新运行中工作空间的配置字段
+POD_AFFECTING_FIELDS = ('environment', 'resources', 'ports', 'podTemplate')
+
+def _workspace_owner(workspace: WorkspaceRecord) -> Dict[str, Any]:
+    """索引中的工作空间作为 ownerReference 来源时的 DevWorkspace 对象"""
+    return workspace.owner(f"{API_GROUP}/{API_VERSION}", DEV_WORKSPACE_KIND)
+
+@kopf.index(DEV_WORKSPACE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION)
+async def workspaces_by_template(name: str, namespace: str, uid: str, labels: Dict[str, str], meta: Dict[str, Any], spec: Dict[str, Any], status: Dict[str, Any], **kwargs):
+    """
+    反向索引：模板名称 -> 引用该模板的 DevWorkspace
 
-def wait_for_pod_running(pod_name: str, namespace: str, logger):
+    索引常驻内存、随工作空间数量线性增长，因此只保存滚动更新和漂移检测需要的字段（WorkspaceRecord），
+    kopf 会在每次 DevWorkspace 变化时刷新索引。
     """
-    等待 Pod 进入 Running 状态
+    template_ref = spec.get('templateRef')
+    if not template_ref:
+        return None
+    shard_labels = {SHARD_KEY_LABEL: labels[SHARD_KEY_LABEL]} if SHARD_KEY_LABEL and SHARD_KEY_LABEL in labels else None
+    return {template_ref: WorkspaceRecord(
+        name, namespace, uid, shard_labels, bool(meta.get('deletionTimestamp')), spec, status
+    )}
+
+@kopf.on.update(DEV_WORKSPACE_TEMPLATE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION, field='spec', when=_owned)
+async def rollout_template_change(name: str, body: kopf.Body, old: Dict[str, Any], new: Dict[str, Any], workspaces_by_template: kopf.Index, logger: logging.Logger, **kwargs):
+    """
+    把 DevWorkspaceTemplate 的变更滚动应用到所有引用它的工作空间
+
+    同一时刻最多 TEMPLATE_ROLLOUT_MAX_UNAVAILABLE 个工作空间处于重建中，
+    一个工作空间重新进入 Running 后才开始重建下一个。
+    已经基于新版本模板重建过的工作空间（status.templateGeneration）会被跳过，
+    因此 Operator 在滚动过程中重启后可以从中断处继续。
+    开启分片时由负责该模板的副本滚动所有依赖的工作空间（不论它们由哪个副本负责），
+    重建后的工作空间进入 Starting，再由各自负责的副本推进到 Running。
     """
-    retries = 30 # 30 * 10s = 5 minutes timeout
-    delay = 10
-    for i in range(retries):
+    generation = body.get('metadata', {}).get('generation')
+    _cache_template(name, generation, new)
+
+    old_spec = freeze(old or {})
+    new_spec = template_cache.peek(name)['spec']
+    dependents = list(workspaces_by_template.get(name, []))
+    logger.info(f"Template {name} changed, checking {len(dependents)} dependent workspace(s)")
+
+    pending = []
+    for workspace in dependents:
+        if workspace.phase not in ("Running", "Starting"):
+            continue
+        if generation is not None and workspace.template_generation == generation:
+            continue
+        old_config = merge_configs(old_spec, workspace.overrides)
+        new_config = merge_configs(new_spec, workspace.overrides)
+        if workspace.config_hash == config_hash(new_config):
+            continue
+        if all(old_config.get(field) == new_config.get(field) for field in POD_AFFECTING_FIELDS):
+            continue
+        pending.append((workspace, old_config, new_config))
+
+    if not pending:
+        logger.info(f"No workspace needs to be updated for template {name}")
+        return
+
+    logger.info(f"Rolling out template {name} to {len(pending)} workspace(s), "
+                f"max unavailable {TEMPLATE_ROLLOUT_MAX_UNAVAILABLE}")
+    semaphore = asyncio.Semaphore(max(1, TEMPLATE_ROLLOUT_MAX_UNAVAILABLE))
+
+    async def rollout_one(workspace: WorkspaceRecord, old_config: Dict[str, Any], config: Dict[str, Any]) -> bool:
+        ws_name, ws_namespace = workspace.name, workspace.namespace
+        async with semaphore:
+            # 只有变更本身的 API 调用占用调度名额，等待旧 Pod 删除（见 recreate_workspace_pod）和新 Pod 就绪期间不占用
+            async with scheduler.slot(ws_namespace, BACKGROUND):
+                recreated = await apply_config_change(
+                    ws_name, ws_namespace, _workspace_owner(workspace), workspace.spec(), workspace.status(), old_config, config, logger
+                )
+            if not recreated:
+                # 只更新了 Service 或原地调整了资源，工作空间一直可用
+                return True
+            try:
+                await wait_for_pod_running(ws_name, ws_namespace, logger)
+                return True
+            except (kopf.TemporaryError, kopf.PermanentError) as e:
+                # 失败的工作空间由 advance_starting_workspace 负责记录状态，这里只是不再占用名额
+                logger.error(f"Workspace {ws_namespace}/{ws_name} did not become ready during rollout: {e}")
+                return False
+
+    results = await asyncio.gather(*(rollout_one(*item) for item in pending))
+    logger.info(f"Template {name} rollout finished: {sum(results)}/{len(results)} workspace(s) ready")
+
+def _is_starting(status: Dict[str, Any], **kwargs) -> bool:
+    """daemon 过滤条件：只在工作空间处于 Starting 阶段且由本副本负责时运行"""
+    return status.get('phase') == "Starting" and _owned(**kwargs)
+
+@kopf.daemon(
+    DEV_WORKSPACE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION,
+    when=_is_starting, cancellation_timeout=1.0
+)
+async def advance_starting_workspace(name: str, namespace: str, status: Dict[str, Any], stopped: kopf.DaemonStopped, logger: logging.Logger, **kwargs):
+    """
+    把处于 Starting 阶段的工作空间推进到 Running
+
+    等待过程只挂在共享 watch 缓存上，不占用任何线程；
+    Operator 重启后 kopf 会为仍处于 Starting 的工作空间重新启动该 daemon，从而接着等待，
+    而不是重新执行一遍创建流程。
+    """
+    pod_name = status.get('podName')
+    service_name = status.get('serviceName')
+
+    try:
+        with metrics.phase("time_to_running", name, namespace):
+            await wait_for_pod_running(pod_name, namespace, logger)
+        with metrics.phase("time_to_url", name, namespace):
+            url = await get_service_url(service_name, namespace)
+
+        final_status = {
+            "phase": "Running",
+            "message": "Workspace is ready",
+            "url": url
+        }
+        resume_started_at = status.get('resumeStartedAt')
+        if resume_started_at:
+            # 从恢复开始到再次可用的耗时
+            started = datetime.datetime.fromisoformat(resume_started_at.replace("Z", "+00:00"))
+            elapsed = datetime.datetime.now(datetime.timezone.utc) - started
+            final_status["lastResumeSeconds"] = round(elapsed.total_seconds(), 3)
+            final_status["resumeStartedAt"] = None
+        await patch_status(name, namespace, final_status)
+        logger.info(f"Workspace instance {name} is running at {url}")
+
+    except kopf.TemporaryError as e:
+        # 超时后由 kopf 稍后重新启动 daemon 继续等待
+        await patch_status(name, namespace, {"phase": "Starting", "message": f"Pod is still starting, will retry: {e}"})
+        raise
+    except kopf.PermanentError as e:
+        logger.error(f"Workspace instance {name} failed to start: {e}")
+        await patch_status(name, namespace, {"phase": "Failed", "message": str(e)})
+
+    # 自行退出的 daemon 不会被 kopf 再次启动；这里一直等到阶段变化导致过滤条件不再满足，
+    # 这样工作空间下次回到 Starting 时（例如更新后）仍能重新启动 daemon
+    await stopped.wait()
+
+@kopf.on.delete(DEV_WORKSPACE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION, when=_owned)
+async def delete_workspace_instance(name: str, namespace: str, status: Dict[str, Any], logger: logging.Logger, **kwargs):
+    """
+    处理 DevWorkspace 的删除事件
+
+    Pod、Service 和 PVC 都带有指向 DevWorkspace 的 ownerReference（status.resourcesOwned），
+    DevWorkspace 删除后由 Kubernetes 垃圾回收器级联删除，handler 不发出任何请求。
+    引入 ownerReference 之前的版本创建的工作空间没有这个标记，它们的资源不会被级联删除，
+    只对这些工作空间补发一次不等待的后台删除请求；资源名称在 status 缺失时回退为确定的默认名称。
+    """
+    status = status or {}
+    if status.get('resourcesOwned'):
+        logger.info(f"Devworkspace {name} in namespace {namespace} deleted, its resources are garbage collected")
+        return
+
+    logger.info(f"Deleting resources of legacy devworkspace: {name} in namespace {namespace}")
+    deletions = [
+        (status.get('podName') or name, operator_context().core_v1.delete_namespaced_pod),
+        (status.get('serviceName') or name, operator_context().core_v1.delete_namespaced_service),
+        # PVC（可选，取决于是否要保留数据）
+        # 在实际使用中，可能需要根据策略来决定是否删除 PVC
+        (status.get('pvcName') or pvc_name_for(name), operator_context().core_v1.delete_namespaced_persistent_volume_claim),
+    ]
+
+    async def delete(resource_name: str, delete_fn):
         try:
-            pod = core_v1.read_namespaced_pod(name=pod_name, namespace=namespace)
-            # 使用类型检查和安全访问
-            if pod and isinstance(pod, client.V1Pod):
-                if pod.status and pod.status.phase == 'Running':
-                    logger.info(f"Pod {pod_name} is running.")
-                    return
-                elif pod.status and (pod.status.phase == 'Failed' or pod.status.phase == 'Unknown'):
-                    raise kopf.PermanentError(f"Pod {pod_name} entered {pod.status.phase} state.")
-                else:
-                    phase = pod.status.phase if pod.status else "Unknown"
-                    logger.info(f"Pod {pod_name} is in {phase} phase. Waiting...")
-                    time.sleep(delay)
-            else:
-                logger.info(f"Pod {pod_name} is not properly initialized. Waiting...")
-                time.sleep(delay)
+            await call_api(delete_fn, name=resource_name, namespace=namespace, propagation_policy='Background')
+            logger.info(f"Requested deletion of {resource_name}")
         except ApiException as e:
-            logger.error(f"Error reading pod status for {pod_name}: {e}")
-            time.sleep(delay)
-    
-    raise kopf.TemporaryError(f"Pod {pod_name} did not become ready in time.", delay=60)
+            if e.status != 404:  # 忽略 "Not Found" 错误（通常已被垃圾回收）
+                logger.error(f"Error deleting {resource_name}: {e}")
+
+    async with scheduler.slot(namespace, BACKGROUND):
+        await asyncio.gather(*(delete(resource_name, delete_fn) for resource_name, delete_fn in deletions))
+    # 不需要返回任何状态，也不需要等待，资源由垃圾回收器异步清理
+
+async def _write_status(namespace: str, name: str, status: Dict[str, Any]):
+    """
+    通过 patch 方法更新 DevWorkspace 的状态（由 status_writer 调用）
 
-def wait_for_pod_deletion(pod_name: str, namespace: str, logger: logging.Logger):
+    Returns:
+        更新后的 DevWorkspace 对象，status_writer 用其中的 resourceVersion 忽略更旧的 watch 事件
     """
-    等待 Pod 被彻底删除
+    return await call_api(
+        operator_context().custom_api.patch_namespaced_custom_object_status,
+        group=API_GROUP,
+        version=API_VERSION,
+        namespace=namespace,
+        plural=DEV_WORKSPACE_KIND.lower() + "s",
+        name=name,
+        body={"status": status}
+    )
+
+# 所有 DevWorkspace status 写入都经过它：跳过没有变化的写入，并合并同一对象的连续写入
+status_writer = StatusWriter(_write_status, STATUS_COALESCE_SECONDS, logger)
+
+async def patch_status(name: str, namespace: str, status: Dict[str, Any], wait: bool = True):
     """
-    retries = 30  # 30 * 5s = 2.5 minutes timeout
-    delay = 5
+    更新 DevWorkspace 的状态
+
+    Args:
+        name: 工作空间名称
+        namespace: 命名空间
+        status: merge patch 形式的状态，值为 None 的字段会被删除
+        wait: 是否等待写入完成；为 False 时写入可能被延迟，并与随后的状态写入合并
+    """
+    done = status_writer.write(namespace, name, status, wait=wait)
+    if wait:
+        await done
+
+async def wait_for_pod_running(pod_name: str, namespace: str, logger):
+    """
+    等待 Pod 进入 Running 状态（由共享的 Pod watch 唤醒）
+    """
+    timeout = 300  # 5 minutes
+    try:
+        pod = await pod_cache.wait_for(
+            namespace, pod_name,
+            lambda p: p is not None and p.phase in ('Running', 'Failed', 'Unknown'),
+            timeout=timeout
+        )
+    except asyncio.TimeoutError:
+        raise kopf.TemporaryError(f"Pod {pod_name} did not become ready in time.", delay=60)
+
+    if pod.phase != 'Running':
+        raise kopf.PermanentError(f"Pod {pod_name} entered {pod.phase} state.")
+    logger.info(f"Pod {pod_name} is running.")
+
+async def wait_for_pod_deletion(pod_name: str, namespace: str, logger: logging.Logger):
+    """
+    等待 Pod 被彻底删除（由共享的 Pod watch 唤醒）
+    """
+    timeout = 150  # 2.5 minutes
     logger.info(f"Waiting for Pod {pod_name} to be deleted...")
-    for _ in range(retries):
-        try:
-            core_v1.read_namespaced_pod(name=pod_name, namespace=namespace)
-            logger.info(f"Pod {pod_name} still exists. Waiting...")
-            time.sleep(delay)
-        except ApiException as e:
-            if e.status == 404:
-                logger.info(f"Pod {pod_name} has been deleted.")
-                return
-            else:
-                logger.error(f"Error while waiting for pod deletion: {e}")
-                time.sleep(delay)  # retry on other errors too
-    raise kopf.TemporaryError(f"Pod {pod_name} was not deleted in time.")
-
-def wait_for_service_deletion(service_name: str, namespace: str, logger: logging.Logger):
-    """
-    等待 Service 被彻底删除
-    """
-    retries = 30  # 30 * 5s = 2.5 minutes timeout
-    delay = 5
-    logger.info(f"Waiting for Service {service_name} to be deleted...")
-    for _ in range(retries):
+    try:
+        await pod_cache.wait_for(namespace, pod_name, lambda p: p is None, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise kopf.TemporaryError(f"Pod {pod_name} was not deleted in time.")
+    logger.info(f"Pod {pod_name} has been deleted.")
+
+@kopf.index(DEV_WORKSPACE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION)
+async def workspaces_by_set(name: str, namespace: str, labels: Dict[str, str], status: Dict[str, Any], **kwargs):
+    """
+    反向索引：(命名空间, DevWorkspaceSet 名称) -> 集合中的工作空间及其阶段
+    """
+    set_name = labels.get(SET_LABEL)
+    if not set_name:
+        return None
+    return {(namespace, set_name): {"name": name, "phase": status.get('phase')}}
+
+@kopf.on.event(DEV_WORKSPACE_SET_KIND.lower() + "s", group=API_GROUP, version=API_VERSION)
+async def on_workspace_set_event(event: Dict[str, Any], name: str, namespace: str, spec: Dict[str, Any], **kwargs):
+    """
+    把 DevWorkspaceSet 的并发和 QPS 设置同步到预算表
+
+    子工作空间可能由其他副本负责（开启分片时），因此每个副本都维护所有集合的预算。
+    """
+    workspace_sets.update(namespace, name, None if event.get('type') == 'DELETED' else dict(spec))
+
+async def _patch_set_status(name: str, namespace: str, status: Dict[str, Any]):
+    """更新 DevWorkspaceSet 的 status"""
+    await call_api(
+        operator_context().custom_api.patch_namespaced_custom_object_status,
+        group=API_GROUP,
+        version=API_VERSION,
+        namespace=namespace,
+        plural=DEV_WORKSPACE_SET_KIND.lower() + "s",
+        name=name,
+        body={"status": status}
+    )
+
+@kopf.on.create(DEV_WORKSPACE_SET_KIND.lower() + "s", group=API_GROUP, version=API_VERSION, when=_owned)
+@kopf.on.update(DEV_WORKSPACE_SET_KIND.lower() + "s", group=API_GROUP, version=API_VERSION, field='spec', when=_owned)
+async def reconcile_workspace_set(body: kopf.Body, name: str, namespace: str, spec: Dict[str, Any], workspaces_by_set: kopf.Index, logger: logging.Logger, retry: int = 0, **kwargs):
+    """
+    让 DevWorkspaceSet 包含 spec.replicas 个子工作空间
+
+    模板只在这里解析一次（引用的模板不存在或配置不完整时整个集合直接失败），
+    缺少的子工作空间按序号创建，序号超出 replicas 的删除。子对象的创建和它们随后各自的资源创建
+    都受集合的并发和 QPS 预算限制，资源创建由 DevWorkspace 的 handler 完成。
+    """
+    # handler 可能先于 on_workspace_set_event 执行，这里先登记预算
+    workspace_sets.update(namespace, name, dict(spec))
+    budget = workspace_sets.budget_for(namespace, name)
+
+    config = await _get_workspace_config(dict(spec), logger)
+    if not config:
+        await _patch_set_status(name, namespace, {"phase": "Failed", "message": f"Failed to resolve template {spec.get('templateRef')}"})
+        return
+
+    desired = member_names(name, spec)
+    existing = {member['name'] for member in workspaces_by_set.get((namespace, name), [])}
+    missing = [member_name for member_name in desired if member_name not in existing]
+    extra = sorted(existing - set(desired))
+    logger.info(f"Workspace set {name}: {len(existing)}/{len(desired)} existing, "
+                f"creating {len(missing)}, deleting {len(extra)}")
+    await _patch_set_status(name, namespace, {
+        "phase": "Provisioning",
+        "desired": len(desired),
+        "templateGeneration": _template_generation(spec.get('templateRef'))
+    })
+
+    workspace_set = dict(body)
+    plural = DEV_WORKSPACE_KIND.lower() + "s"
+
+    async def create_member(member_name: str):
+        async with budget.limit(), scheduler.slot(namespace, BULK):
+            try:
+                await call_api(
+                    operator_context().custom_api.create_namespaced_custom_object,
+                    group=API_GROUP,
+                    version=API_VERSION,
+                    namespace=namespace,
+                    plural=plural,
+                    body=member_manifest(workspace_set, member_name, f"{API_GROUP}/{API_VERSION}")
+                )
+            except ApiException as e:
+                if e.status != 409:
+                    raise
+
+    async def delete_member(member_name: str):
+        async with budget.limit(), scheduler.slot(namespace, BULK):
+            try:
+                await call_api(
+                    operator_context().custom_api.delete_namespaced_custom_object,
+                    group=API_GROUP,
+                    version=API_VERSION,
+                    namespace=namespace,
+                    plural=plural,
+                    name=member_name
+                )
+            except ApiException as e:
+                if e.status != 404:
+                    raise
+
+    results = await asyncio.gather(
+        *(create_member(member_name) for member_name in missing),
+        *(delete_member(member_name) for member_name in extra),
+        return_exceptions=True
+    )
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures:
+        raise kopf.TemporaryError(f"{len(failures)} workspace(s) of set {name} failed to reconcile: {failures[0]}", delay=_retry_delay(retry))
+
+@kopf.timer(
+    DEV_WORKSPACE_SET_KIND.lower() + "s", group=API_GROUP, version=API_VERSION,
+    interval=WORKSPACE_SET_STATUS_INTERVAL, when=_owned
+)
+async def report_workspace_set_status(name: str, namespace: str, spec: Dict[str, Any], status: Dict[str, Any], workspaces_by_set: kopf.Index, logger: logging.Logger, **kwargs):
+    """
+    把子工作空间的阶段汇总到 DevWorkspaceSet 的 status，只在汇总结果变化时写入
+    """
+    members = list(workspaces_by_set.get((namespace, name), []))
+    if status.get('phase') == "Failed" and not members:
+        return  # 模板解析失败，保留失败原因
+    summary = aggregate(members, len(member_names(name, spec)))
+    if all(status.get(key) == value for key, value in summary.items()):
+        return
+    try:
+        await _patch_set_status(name, namespace, summary)
+    except ApiException as e:
+        logger.error(f"Failed to patch status for workspace set {name}: {e}")
+
+def _warm_pool_spec(spec: Dict[str, Any]) -> Tuple[int, list]:
+    """返回模板 spec.warmPool 中的 (size, namespaces)"""
+    pool = spec.get('warmPool') or {}
+    return max(0, int(pool.get('size') or 0)), list(pool.get('namespaces') or [])
+
+@kopf.timer(DEV_WORKSPACE_TEMPLATE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION, interval=WARM_POOL_RECONCILE_INTERVAL, when=_owned)
+async def maintain_warm_pool(name: str, body: kopf.Body, spec: Dict[str, Any], logger: logging.Logger, **kwargs):
+    """
+    让模板在每个配置的命名空间中保持 spec.warmPool.size 个预热 Pod
+
+    - 数量不足时按模板当前的配置补齐（Pod 和各自的 PVC 都属于模板，模板删除时由垃圾回收器清理）
+    - 基于旧版本模板创建的成员、以及超出数量或已不在配置中的命名空间里的成员会被删除
+    """
+    if not warm_pool.cache.synced:
+        return  # 池成员的初始 LIST 尚未完成，避免重复创建
+
+    size, namespaces = _warm_pool_spec(spec)
+    generation = str(body.get('metadata', {}).get('generation'))
+    members = warm_pool.members(name)
+    if not size and not members:
+        return
+
+    by_namespace: Dict[str, list] = {ns: [] for ns in namespaces}
+    for member in members:
+        by_namespace.setdefault(member['namespace'], []).append(member)
+
+    # 预热 Pod 不带覆盖配置，有效配置就是模板的 spec
+    config = merge_configs(spec, None)
+    manifests = manifest_renderer.compile(name, config)
+
+    async def add_member(namespace: str):
+        member_name = f"{name}-warm-{uuid.uuid4().hex[:8]}"
+        labels = {"app": "devworkspace", POOL_LABEL: name, GENERATION_LABEL: generation}
+        async with scheduler.slot(namespace, BACKGROUND):
+            await create_pvc(member_name, namespace, manifests, owner=body, labels=labels, seed=seed_source(name, config, namespace))
+            await create_pod(member_name, namespace, pvc_name_for(member_name), manifests, owner=body, labels=labels)
+
+    async def remove_member(member: Dict[str, Any]):
+        async with scheduler.slot(member['namespace'], BACKGROUND):
+            await remove_member_resources(member)
+
+    async def remove_member_resources(member: Dict[str, Any]):
+        # 先删 Pod 再删 PVC；PVC 在 Pod 退出前受 pvc-protection 保护，不会提前释放
+        for delete_fn, resource_name in (
+            (operator_context().core_v1.delete_namespaced_pod, member['name']),
+            (operator_context().core_v1.delete_namespaced_persistent_volume_claim, member['pvcName']),
+        ):
+            if not resource_name:
+                continue
+            try:
+                await call_api(delete_fn, name=resource_name, namespace=member['namespace'])
+            except ApiException as e:
+                if e.status != 404:
+                    logger.error(f"Error deleting warm pool member {resource_name}: {e}")
+
+    operations = []
+    for namespace, current in by_namespace.items():
+        desired = size if namespace in namespaces else 0
+        stale = [member for member in current if member['generation'] != generation]
+        fresh = [member for member in current if member['generation'] == generation]
+        excess = fresh[desired:]
+        operations.extend(remove_member(member) for member in stale + excess)
+        missing = desired - len(fresh)
+        operations.extend(add_member(namespace) for _ in range(max(0, missing)))
+        if stale or excess or missing > 0:
+            logger.info(f"Warm pool {name} in {namespace}: {len(fresh)}/{desired} current, "
+                        f"adding {max(0, missing)}, removing {len(stale) + len(excess)}")
+
+    results = await asyncio.gather(*operations, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            logger.error(f"Failed to reconcile warm pool {name}: {result}")
+
+def _refreshes_seed(spec: Dict[str, Any], **kwargs) -> bool:
+    """timer 过滤条件：模板以黄金 PVC 为种子并设置了刷新间隔，且由本副本负责"""
+    seed = (spec.get('storage') or {}).get('seed') or {}
+    return bool(seed.get('pvc') and seed.get('refreshInterval')) and _owned(**kwargs)
+
+@kopf.timer(DEV_WORKSPACE_TEMPLATE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION, interval=SEED_SNAPSHOT_CHECK_INTERVAL, when=_refreshes_seed)
+async def refresh_seed_snapshots(name: str, body: kopf.Body, spec: Dict[str, Any], logger: logging.Logger, **kwargs):
+    """
+    让模板的种子快照保持新鲜
+
+    每次检查按标签 LIST 一次模板的所有 VolumeSnapshot，在 seed.namespaces 的每个命名空间中：
+    记录最近一个就绪的快照（新的工作空间从它克隆），快照超过 seed.refreshInterval 时为黄金 PVC 创建新的快照，
+    并删除过期的快照。快照带有指向模板的 ownerReference，模板删除时由垃圾回收器清理。
+    """
+    seed = spec['storage']['seed']
+    interval = parse_duration(seed.get('refreshInterval'))
+    if interval is None:
+        logger.warning(f"Invalid seed refreshInterval {seed.get('refreshInterval')!r} on template {name}, skipping")
+        return
+    namespaces = list(seed.get('namespaces') or [])
+    if not namespaces:
+        logger.warning(f"Template {name} refreshes seed snapshots but sets no seed.namespaces, skipping")
+        return
+
+    response = await call_api(
+        operator_context().custom_api.list_cluster_custom_object,
+        group=SNAPSHOT_GROUP,
+        version=SNAPSHOT_VERSION,
+        plural=SNAPSHOT_PLURAL,
+        label_selector=f"{SEED_TEMPLATE_LABEL}={name}"
+    )
+    by_namespace: Dict[str, list] = {namespace: [] for namespace in namespaces}
+    for snapshot in response.get('items', []):
+        by_namespace.setdefault(snapshot['metadata']['namespace'], []).append(snapshot)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    async def refresh(namespace: str, snapshots: list):
+        if not seeds_namespace(seed, namespace):
+            # 已经不在 seed.namespaces 中的命名空间：删除所有快照
+            latest, create, stale = None, False, [snapshot['metadata']['name'] for snapshot in snapshots]
+        else:
+            latest, create, stale = plan_refresh(snapshots, interval, now)
+        seed_snapshots.update(name, namespace, latest)
+        async with scheduler.slot(namespace, BACKGROUND):
+            if create:
+                manifest = snapshot_manifest(name, namespace, seed, now.strftime("%Y%m%d%H%M%S"))
+                kopf.append_owner_reference(manifest, owner=body)
+                await call_api(
+                    operator_context().custom_api.create_namespaced_custom_object,
+                    group=SNAPSHOT_GROUP,
+                    version=SNAPSHOT_VERSION,
+                    namespace=namespace,
+                    plural=SNAPSHOT_PLURAL,
+                    body=manifest
+                )
+                logger.info(f"Created seed snapshot {manifest['metadata']['name']} of PVC {seed['pvc']} in {namespace}")
+            for snapshot_name in stale:
+                try:
+                    await call_api(
+                        operator_context().custom_api.delete_namespaced_custom_object,
+                        group=SNAPSHOT_GROUP,
+                        version=SNAPSHOT_VERSION,
+                        namespace=namespace,
+                        plural=SNAPSHOT_PLURAL,
+                        name=snapshot_name
+                    )
+                    logger.info(f"Deleted stale seed snapshot {snapshot_name} in {namespace}")
+                except ApiException as e:
+                    if e.status != 404:
+                        raise
+
+    results = await asyncio.gather(*(refresh(ns, snapshots) for ns, snapshots in by_namespace.items()), return_exceptions=True)
+    seed_snapshots.refreshes += 1
+    for namespace, result in zip(by_namespace, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Failed to refresh seed snapshots of template {name} in {namespace}: {result}")
+
+async def sync_prepull_daemonset(images: list):
+    """
+    让预拉取 DaemonSet 与镜像集合保持一致；集合为空时删除 DaemonSet
+    """
+    if images:
+        await apply_manifest(daemonset_manifest(IMAGE_PREPULL_NAME, IMAGE_PREPULL_NAMESPACE, images, IMAGE_PREPULL_HELPER_IMAGE))
+        return
+    try:
+        await call_api(operator_context().apps_v1.delete_namespaced_daemon_set, name=IMAGE_PREPULL_NAME, namespace=IMAGE_PREPULL_NAMESPACE)
+    except ApiException as e:
+        if e.status != 404:
+            raise
+
+@kopf.timer(
+    DEV_WORKSPACE_TEMPLATE_KIND.lower() + "s", group=API_GROUP, version=API_VERSION,
+    interval=IMAGE_PREPULL_STATUS_INTERVAL, when=_owned
+)
+async def report_image_prepull_status(name: str, spec: Dict[str, Any], status: Dict[str, Any], logger: logging.Logger, **kwargs):
+    """
+    把模板镜像在各节点上的预拉取情况写入 DevWorkspaceTemplate 的 status.imagePrePull
+
+    只在汇总结果变化时写入，避免每个周期都产生一次 status 更新。
+    """
+    image = spec.get('environment', {}).get('image')
+    if not IMAGE_PREPULL_ENABLED or not image or not image_prepuller.cache.synced:
+        return
+    summary = image_prepuller.image_status(image)
+    if dict(status.get('imagePrePull') or {}) == summary:
+        return
+    try:
+        await call_api(
+            operator_context().custom_api.patch_cluster_custom_object_status,
+            group=API_GROUP,
+            version=API_VERSION,
+            plural=DEV_WORKSPACE_TEMPLATE_KIND.lower() + "s",
+            name=name,
+            body={"status": {"imagePrePull": summary}}
+        )
+    except ApiException as e:
+        logger.error(f"Failed to patch image prepull status for template {name}: {e}")
+
+# 漂移检测：连续两个周期都观察到的漂移才会被修复
+drift_tracker = DriftTracker()
+drift_stats: Dict[str, Any] = {"cycles": 0, "lastCycleAt": None, "checked": 0, "drifted": 0, "repaired": 0}
+
+def _decode_page(response) -> Tuple[list, Optional[str]]:
+    """读取并解码一页 LIST 的原始响应，items 立即精简（在线程池中执行），同时返回下一页的 continue"""
+    page = json.loads(response.data)
+    return [compact_item(item) for item in page.get('items') or []], (page.get('metadata') or {}).get('continue')
+
+async def list_workspace_objects(list_fn) -> list:
+    """
+    按 app=devworkspace 标签分页 LIST 一种资源，返回 JSON 解码并精简后的 items（见 drift.compact_item）
+
+    跳过 kubernetes 客户端的模型反序列化（_preload_content=False）：
+    大集群中一次 LIST 的 CPU 开销主要在反序列化上，而漂移检测只需要少数几个字段。
+    """
+    loop = asyncio.get_running_loop()
+    kwargs: Dict[str, Any] = {"label_selector": WORKSPACE_LABEL_SELECTOR, "_preload_content": False}
+    if API_LIST_PAGE_SIZE > 0:
+        kwargs["limit"] = API_LIST_PAGE_SIZE
+    items: list = []
+    while True:
+        response = await call_api(list_fn, **kwargs)
+        page, token = await loop.run_in_executor(operator_context().executor, _decode_page, response)
+        items.extend(page)
+        if not token:
+            return items
+        kwargs["_continue"] = token
+
+async def resync_workspaces(workspaces_by_template: kopf.Index, logger: logging.Logger) -> Dict[Tuple[str, str], str]:
+    """
+    执行一个漂移检测周期
+
+    Pod、Service、PVC 各 LIST 一次，与索引中由本副本负责的所有 DevWorkspace 比较，
+    只修复连续两个周期都出现的漂移，API 调用次数与工作空间数量无关（修复本身除外）。
+
+    Args:
+        workspaces_by_template: kopf 维护的 DevWorkspace 索引
+        logger: 日志对象
+
+    Returns:
+        本周期修复的 (namespace, name) -> 漂移种类
+    """
+    with metrics.phase("drift_resync"):
+        pods, services, pvcs = await asyncio.gather(
+            list_workspace_objects(operator_context().core_v1.list_pod_for_all_namespaces),
+            list_workspace_objects(operator_context().core_v1.list_service_for_all_namespaces),
+            list_workspace_objects(operator_context().core_v1.list_persistent_volume_claim_for_all_namespaces)
+        )
+        snapshot = ClusterSnapshot.from_lists(pods, services, pvcs)
+
+        workspaces: Dict[Tuple[str, str], WorkspaceRecord] = {}
+        observed: Dict[Tuple[str, str], str] = {}
+        for store in workspaces_by_template.values():
+            for workspace in store:
+                if workspace.deleting or not _owned(workspace.name, workspace.namespace, workspace.labels):
+                    continue
+                key = (workspace.namespace, workspace.name)
+                workspaces[key] = workspace
+                drift = detect_drift(workspace, snapshot)
+                if drift:
+                    observed[key] = drift
+        confirmed = drift_tracker.confirm(observed)
+
+    drift_stats["cycles"] += 1
+    drift_stats["lastCycleAt"] = _utc_now()
+    drift_stats["checked"] = len(workspaces)
+    drift_stats["drifted"] = len(observed)
+    if not confirmed:
+        return confirmed
+
+    logger.info(f"Drift resync: {len(observed)} of {len(workspaces)} workspace(s) drifted, repairing {len(confirmed)}")
+    semaphore = asyncio.Semaphore(max(1, DRIFT_REPAIR_CONCURRENCY))
+
+    async def repair_one(key: Tuple[str, str], drift: str):
+        async with semaphore, scheduler.slot(key[0], BACKGROUND):
+            await repair_drift(workspaces[key], drift, snapshot, logger)
+        metrics.DRIFT_REPAIRS.labels(drift=drift).inc()
+        drift_stats["repaired"] += 1
+
+    results = await asyncio.gather(*(repair_one(key, drift) for key, drift in confirmed.items()), return_exceptions=True)
+    for (namespace, name), result in zip(confirmed, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Failed to repair drift {confirmed[(namespace, name)]} of workspace {namespace}/{name}: {result}")
+    return confirmed
+
+async def repair_drift(workspace: WorkspaceRecord, drift: str, snapshot: ClusterSnapshot, logger: logging.Logger):
+    """
+    修复一个已确认的漂移
+
+    - PVC 丢失：数据无法恢复，工作空间标记为 Failed；
+    - Service 丢失：重新创建，Running 的工作空间回到 Starting，由 advance_starting_workspace 写入新的 url；
+    - Pod 丢失：按当前配置重新创建，工作空间回到 Starting，Service 和 url 不变；
+    - Pod 不在运行：工作空间回到 Starting，由 advance_starting_workspace 等待它恢复或标记为 Failed；
+    - url 过期：写入 Service 当前的 url。
+
+    Args:
+        workspace: workspaces_by_template 索引中的条目
+        drift: 漂移的种类
+        snapshot: 检测到漂移的周期的 ClusterSnapshot
+        logger: 日志对象
+    """
+    name, namespace = workspace.name, workspace.namespace
+    service_name = workspace.service_name or name
+    pod_name = workspace.pod_name or name
+    logger.info(f"Repairing drift {drift} of workspace {namespace}/{name}")
+
+    if drift == DRIFT_PVC_MISSING:
+        await patch_status(name, namespace, {
+            "phase": "Failed",
+            "message": f"PersistentVolumeClaim {workspace.pvc_name} no longer exists",
+            "url": None
+        })
+        return
+    if drift == DRIFT_URL_STALE:
+        await patch_status(name, namespace, {"url": snapshot.services[(namespace, service_name)]})
+        return
+    if drift == DRIFT_POD_NOT_RUNNING:
+        await patch_status(name, namespace, {
+            "phase": "Starting",
+            "message": f"Pod {pod_name} is {snapshot.pods[(namespace, pod_name)]}, waiting for it to run again"
+        })
+        return
+
+    # Pod 或 Service 丢失：按当前的有效配置重新创建
+    config = await _get_workspace_config(workspace.spec(), logger)
+    if config is None:
+        logger.error(f"Cannot repair workspace {namespace}/{name} without a valid config")
+        return
+    manifests = manifest_renderer.compile(workspace.template_ref, config)
+
+    if drift == DRIFT_SERVICE_MISSING:
+        await create_service(name, namespace, manifests, owner=_workspace_owner(workspace))
+        if workspace.phase == "Running":
+            await patch_status(name, namespace, {
+                "phase": "Starting",
+                "message": "Service was missing and has been recreated",
+                "url": None
+            })
+        return
+
+    if drift == DRIFT_POD_MISSING:
+        pvc_name = workspace.pvc_name or pvc_name_for(name)
+        new_pod_name = await create_pod(name, namespace, pvc_name, manifests, owner=_workspace_owner(workspace))
+        await patch_status(name, namespace, {
+            "phase": "Starting",
+            "message": "Pod was missing and has been recreated",
+            "podName": new_pod_name,
+            "templateGeneration": _template_generation(workspace.template_ref),
+            "configHash": config_hash(config)
+        })
+
+async def run_drift_resync(workspaces_by_template: kopf.Index, logger: logging.Logger):
+    """
+    每 DRIFT_RESYNC_INTERVAL 秒执行一次漂移检测
+
+    第一个周期在一个间隔之后才开始，此时 kopf 已经完成初始 LIST，索引是完整的。
+    单个周期失败（例如 API Server 暂时不可用）只记录日志，下一个周期照常进行。
+    """
+    while True:
+        await asyncio.sleep(DRIFT_RESYNC_INTERVAL)
         try:
-            core_v1.read_namespaced_service(name=service_name, namespace=namespace)
-            logger.info(f"Service {service_name} still exists. Waiting...")
-            time.sleep(delay)
-        except ApiException as e:
-            if e.status == 404:
-                logger.info(f"Service {service_name} has been deleted.")
-                return
-            else:
-                logger.error(f"Error while waiting for service deletion: {e}")
-                time.sleep(delay)  # retry on other errors too
-    raise kopf.TemporaryError(f"Service {service_name} was not deleted in time.")
+            await resync_workspaces(workspaces_by_template, logger)
+        except Exception as e:
+            logger.error(f"Drift resync cycle failed: {e}")
+
+async def handoff_shard_objects(old_ring, new_ring):
+    """
+    分片成员变化后，在移交给本副本的 DevWorkspace / DevWorkspaceSet / DevWorkspaceTemplate 上写入交接注解
+
+    注解的写入会产生 watch 事件，kopf 随后在本副本上继续处理这些对象；
+    同时移除已退出副本遗留的 finalizer。每种资源只需要一次 LIST。
+    """
+    epoch = _utc_now()
+    tokens = shard_coordinator.live_tokens()
+    for kind, namespaced in ((DEV_WORKSPACE_KIND, True), (DEV_WORKSPACE_SET_KIND, True), (DEV_WORKSPACE_TEMPLATE_KIND, False)):
+        plural = kind.lower() + "s"
+        result = await call_api(operator_context().custom_api.list_cluster_custom_object, group=API_GROUP, version=API_VERSION, plural=plural)
+        candidates = shard_coordinator.handoff_candidates(old_ring, result.get('items', []))
+        if not candidates:
+            continue
+        logger.info(f"Taking over {len(candidates)} {kind}(s) after shard membership change")
+
+        async def take_over(obj: Dict[str, Any]):
+            metadata = obj.get('metadata', {})
+            name, namespace = metadata.get('name'), metadata.get('namespace')
+            target = {"group": API_GROUP, "version": API_VERSION, "plural": plural, "name": name}
+            if namespaced:
+                target["namespace"] = namespace
+            patch_fn = operator_context().custom_api.patch_namespaced_custom_object if namespaced else operator_context().custom_api.patch_cluster_custom_object
+            get_fn = operator_context().custom_api.get_namespaced_custom_object if namespaced else operator_context().custom_api.get_cluster_custom_object
+            for _ in range(3):
+                try:
+                    await call_api(patch_fn, body=handoff_patch(obj, SHARD_IDENTITY, epoch, tokens), idempotent=False, **target)
+                    return
+                except ApiException as e:
+                    if e.status == 404:
+                        return
+                    if e.status != 409:
+                        logger.error(f"Failed to take over {kind} {name}: {e}")
+                        return
+                # finalizer 列表被并发修改（resourceVersion 冲突），重新读取后再试
+                try:
+                    obj = await call_api(get_fn, **target)
+                except ApiException as e:
+                    if e.status != 404:
+                        logger.error(f"Failed to read {kind} {name} for takeover: {e}")
+                    return
+
+        await asyncio.gather(*(take_over(obj) for obj in candidates))
+
+@kopf.on.probe(id='sharding')
+async def sharding_probe(**kwargs) -> Dict[str, Any]:
+    """
+    通过 kopf 的 liveness 端点暴露本副本的分片标识和当前成员列表
+    """
+    if shard_coordinator is None:
+        return {"enabled": False}
+    peers = sorted(shard_coordinator.ring.peers) if shard_coordinator.ring else []
+    return {"enabled": True, "identity": SHARD_IDENTITY, "peers": peers}
+
+@kopf.on.probe(id='imagePrePull')
+async def image_prepull_probe(**kwargs) -> Dict[str, Any]:
+    """
+    通过 kopf 的 liveness 端点暴露每个节点上各镜像的拉取状态
+    """
+    return {"images": image_prepuller.images(), "nodes": image_prepuller.node_status()}
+
+@kopf.on.probe(id='statusWriter')
+async def status_writer_probe(**kwargs) -> Dict[str, Any]:
+    """
+    通过 kopf 的 liveness 端点暴露 status 写入、跳过和合并的次数
+    """
+    return status_writer.stats()
+
+@kopf.on.probe(id='warmPool')
+async def warm_pool_probe(**kwargs) -> Dict[str, Any]:
+    """
+    通过 kopf 的 liveness 端点暴露各模板预热池的大小和认领次数
+    """
+    return warm_pool.stats()
+
+@kopf.on.probe(id='templateCache')
+async def template_cache_probe(**kwargs) -> Dict[str, Any]:
+    """
+    通过 kopf 的 liveness 端点暴露模板缓存的命中率和陈旧程度
+    """
+    return template_cache.stats()
+
+@kopf.on.probe(id='seedSnapshots')
+async def seed_snapshots_probe(**kwargs) -> Dict[str, Any]:
+    """
+    通过 kopf 的 liveness 端点暴露记录的种子快照数和刷新次数
+    """
+    return seed_snapshots.stats()
+
+@kopf.on.probe(id='manifestCache')
+async def manifest_cache_probe(**kwargs) -> Dict[str, Any]:
+    """
+    通过 kopf 的 liveness 端点暴露清单骨架缓存的大小、命中次数和编译次数
+    """
+    return manifest_renderer.stats()
+
+@kopf.on.probe(id='startup')
+async def startup_probe(**kwargs) -> Dict[str, Any]:
+    """
+    通过 kopf 的 liveness 端点暴露启动各阶段的耗时和就绪条件
+    """
+    _, report = startup.report()
+    return report
+
+@kopf.on.probe(id='scheduler')
+async def scheduler_probe(**kwargs) -> Dict[str, Any]:
+    """
+    调度器的状态：全局和每个命名空间的排队数、占用的名额和最近一次的等待时间
+    """
+    return scheduler.stats()
+
+def cache_sizes(workspaces_by_template: kopf.Index, workspaces_by_set: kopf.Index) -> Dict[str, int]:
+    """
+    各内存缓存的条目数
+
+    随工作空间数量线性增长的是 pods、services、workspaceIndex、workspaceSetIndex 和 statusWriter，
+    其余缓存的大小取决于模板、节点和池成员的数量。
+    """
+    return {
+        "pods": len(pod_cache),
+        "services": len(service_cache),
+        "warmPods": len(warm_pool.cache),
+        "imagePrePullPods": len(image_prepuller.cache),
+        "seedSnapshots": len(seed_snapshots.cache),
+        "templates": len(template_cache),
+        "manifests": manifest_renderer.stats()["size"],
+        "statusWriter": len(status_writer),
+        "workspaceIndex": sum(len(store) for store in workspaces_by_template.values()),
+        "workspaceSetIndex": sum(len(store) for store in workspaces_by_set.values()),
+    }
+
+async def report_cache_sizes(workspaces_by_template: kopf.Index, workspaces_by_set: kopf.Index):
+    """
+    每 CACHE_METRICS_INTERVAL 秒把各内存缓存的条目数写入 devworkspace_cache_entries
+
+    在事件循环中计算，不与 watch 事件的处理并发读取缓存。
+    """
+    while True:
+        for cache, size in cache_sizes(workspaces_by_template, workspaces_by_set).items():
+            metrics.CACHE_ENTRIES.labels(cache=cache).set(size)
+        await asyncio.sleep(CACHE_METRICS_INTERVAL)
+
+@kopf.on.probe(id='caches')
+async def caches_probe(workspaces_by_template: kopf.Index, workspaces_by_set: kopf.Index, **kwargs) -> Dict[str, int]:
+    """
+    通过 kopf 的 liveness 端点暴露各内存缓存的条目数
+    """
+    return cache_sizes(workspaces_by_template, workspaces_by_set)
+
+@kopf.on.probe(id='driftResync')
+async def drift_resync_probe(**kwargs) -> Dict[str, Any]:
+    """
+    通过 kopf 的 liveness 端点暴露漂移检测的周期数、最近一次检查的结果和累计修复次数
+    """
+    return {**drift_stats, "pending": len(drift_tracker)}
+
+@kopf.on.startup()
+async def start_readiness_server(memo: kopf.Memo, logger: logging.Logger, **kwargs):
+    """
+    启动 /readyz 端点，在共享缓存完成首次 LIST 之前一直返回 503
+    """
+    if READINESS_PORT:
+        memo['readiness_runner'] = await serve_readiness(startup, READINESS_PORT, logger)
+
+@kopf.on.startup()
+async def start_sharding(settings: kopf.OperatorSettings, memo: kopf.Memo, logger: logging.Logger, **kwargs):
+    """
+    开启分片时加入副本成员列表
+
+    每个副本使用自己的 finalizer，避免不负责某个对象的副本移除负责副本添加的 finalizer。
+    kopf 在所有 startup handler 完成后才开始 watch，因此这里等待第一次成员列表建立，
+    保证初始 LIST 中属于本副本的对象都能被正确处理。
+    """
+    global shard_coordinator
+    if not SHARDING_ENABLED:
+        return
+    shard_coordinator = ShardCoordinator(
+        SHARD_IDENTITY, SHARD_LEASE_NAMESPACE, operator_context().coordination_v1, call_api,
+        SHARD_LEASE_DURATION, SHARD_RENEW_INTERVAL, logger, key_label=SHARD_KEY_LABEL
+    )
+    settings.persistence.finalizer = finalizer_for(SHARD_IDENTITY)
+    shard_coordinator.add_listener(handoff_shard_objects)
+    memo['shard_task'] = asyncio.create_task(shard_coordinator.run())
+    await shard_coordinator.wait_ready()
+    startup.mark("sharding")
+    logger.info(f"Sharding enabled as {SHARD_IDENTITY}, finalizer {settings.persistence.finalizer}")
+
+@kopf.on.startup()
+async def start_metrics_server(logger: logging.Logger, **kwargs):
+    """
+    启动 Prometheus /metrics 端点
+    """
+    if METRICS_PORT:
+        metrics.start_metrics_server(METRICS_PORT)
+        logger.info(f"Serving Prometheus metrics on port {METRICS_PORT}")
+
+@kopf.on.startup()
+async def start_informers(memo: kopf.Memo, logger: logging.Logger, **kwargs):
+    """
+    启动共享的 Pod / Service watch，并在后台等待它们完成首次 LIST 后报告就绪
+    """
+    informers[:] = _build_informers(operator_context())
+    for informer in informers:
+        informer.start()
+    memo['ready_task'] = asyncio.create_task(wait_until_ready(logger))
+
+def _build_informers(context: OperatorContext) -> List[Informer]:
+    """
+    按 watched_caches 为每个缓存创建 informer，开启时再加上种子快照的 informer
+
+    种子快照的缓存不参与就绪判断：首次 LIST 完成之前（或集群没有 VolumeSnapshot CRD 时）
+    新的 PVC 直接克隆黄金 PVC（见 seed.data_source）。
+    """
+    result = [
+        Informer(getattr(context.core_v1, method), cache, label_selector, logger, field_selector, API_LIST_PAGE_SIZE)
+        for cache, method, label_selector, field_selector in watched_caches
+    ]
+    if SEED_SNAPSHOT_WATCH_ENABLED:
+        list_snapshots = functools.partial(
+            context.custom_api.list_cluster_custom_object, SNAPSHOT_GROUP, SNAPSHOT_VERSION, SNAPSHOT_PLURAL
+        )
+        result.append(Informer(list_snapshots, seed_snapshots.cache, SEED_TEMPLATE_LABEL, logger, page_size=API_LIST_PAGE_SIZE))
+    return result
+
+async def wait_until_ready(logger: logging.Logger):
+    """
+    等待所有共享缓存完成首次 LIST，随后 /readyz 返回 200，并记录启动各阶段的耗时
+    """
+    await asyncio.gather(*(cache.wait_synced() for cache, *_ in watched_caches))
+    startup.mark("caches")
+    startup.mark("ready")
+    _, report = startup.report()
+    for stage, seconds in report["stages"].items():
+        metrics.STARTUP_DURATION.labels(stage=stage).set(seconds)
+    stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in report["stages"].items())
+    logger.info(f"Operator is ready: {stages}")
+
+@kopf.on.startup()
+async def start_cache_metrics(memo: kopf.Memo, workspaces_by_template: kopf.Index, workspaces_by_set: kopf.Index, logger: logging.Logger, **kwargs):
+    """
+    启动缓存条目数指标的刷新任务
+    """
+    if METRICS_PORT and CACHE_METRICS_INTERVAL > 0:
+        memo['cache_metrics_task'] = asyncio.create_task(report_cache_sizes(workspaces_by_template, workspaces_by_set))
+
+@kopf.on.startup()
+async def start_image_prepuller(memo: kopf.Memo, logger: logging.Logger, **kwargs):
+    """
+    启动镜像预拉取 DaemonSet 的同步任务
+    """
+    if IMAGE_PREPULL_ENABLED:
+        memo['image_prepull_task'] = asyncio.create_task(image_prepuller.run(sync_prepull_daemonset, logger))
+
+@kopf.on.startup()
+async def start_drift_resync(memo: kopf.Memo, workspaces_by_template: kopf.Index, logger: logging.Logger, **kwargs):
+    """
+    启动周期性的漂移检测任务
+
+    kopf 传给 startup handler 的索引是实时更新的，后台任务可以一直持有它。
+    """
+    if DRIFT_RESYNC_INTERVAL > 0:
+        memo['drift_resync_task'] = asyncio.create_task(run_drift_resync(workspaces_by_template, logger))
+
+@kopf.on.cleanup()
+async def stop_informers(memo: kopf.Memo, logger: logging.Logger, **kwargs):
+    """
+    停止共享的 Pod / Service watch，readiness 随即变为未就绪
+    """
+    startup.drain()
+    task = memo.get('ready_task')
+    if task is not None:
+        task.cancel()
+    for informer in informers:
+        informer.stop()
+
+@kopf.on.cleanup()
+async def stop_cache_metrics(memo: kopf.Memo, logger: logging.Logger, **kwargs):
+    """
+    停止缓存条目数指标的刷新任务
+    """
+    task = memo.get('cache_metrics_task')
+    if task is not None:
+        task.cancel()
+
+@kopf.on.cleanup()
+async def stop_image_prepuller(memo: kopf.Memo, logger: logging.Logger, **kwargs):
+    """
+    停止镜像预拉取 DaemonSet 的同步任务（DaemonSet 本身保留，Operator 重启期间镜像仍留在节点上）
+    """
+    task = memo.get('image_prepull_task')
+    if task is not None:
+        task.cancel()
+
+@kopf.on.cleanup()
+async def stop_drift_resync(memo: kopf.Memo, logger: logging.Logger, **kwargs):
+    """
+    停止漂移检测任务
+    """
+    task = memo.get('drift_resync_task')
+    if task is not None:
+        task.cancel()
+
+@kopf.on.cleanup()
+async def stop_sharding(memo: kopf.Memo, logger: logging.Logger, **kwargs):
+    """
+    退出副本成员列表，其余副本在下一次刷新时立即接手本副本负责的对象
+    """
+    task = memo.get('shard_task')
+    if task is not None:
+        task.cancel()
+        await shard_coordinator.leave()
+
+@kopf.on.cleanup()
+async def stop_readiness_server(memo: kopf.Memo, logger: logging.Logger, **kwargs):
+    """
+    关闭 /readyz 端点
+    """
+    runner = memo.get('readiness_runner')
+    if runner is not None:
+        await runner.cleanup()
+
+# 就绪条件：客户端已创建、共享缓存都完成了首次 LIST、开启分片时已加入成员列表
+startup.add_check("context", lambda: _context is not None)
+startup.add_check("caches", lambda: all(cache.synced for cache, *_ in watched_caches))
+startup.add_check("sharding", lambda: not SHARDING_ENABLED or (shard_coordinator is not None and shard_coordinator.ring is not None))
+startup.mark("import")
 
 def main():
     """
     主函数
+
+    日志管线和 Kubernetes 客户端都在这里才创建，导入本模块没有副作用。
     """
+    # 日志先进入内存队列，由后台线程写入轮转文件 operator.log 和控制台，
+    # 输出目标、JSON 格式和按工作空间的限流见 logging_config.py
+    configure_logging(LOG_FORMAT)
     logger.info("Starting KubeSphere DevWorkspace Operator")
+    # 配置无法加载时立即退出，而不是在第一个 handler 中才失败
+    operator_context()
     # 明确以 cluster-wide 模式运行，以解决 FutureWarning
-    kopf.run(clusterwide=True)
+    # 分片模式下副本之间通过 Lease 协调；kopf 自带的 peering 只让优先级最高的副本工作，因此不使用
+    kopf.run(
+        clusterwide=True,
+        standalone=SHARDING_ENABLED,
+        liveness_endpoint=f"http://0.0.0.0:{LIVENESS_PORT}/healthz" if LIVENESS_PORT else None
+    )
 
 if __name__ == "__main__":
     main() 
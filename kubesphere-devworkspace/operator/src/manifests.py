@@ -0,0 +1,226 @@
+"""
+工作空间 Pod / Service / PVC 清单的渲染
+
+每个（模板，有效配置）只编译一次：用 templates/ 目录下的 Jinja2 模板渲染出 YAML，解析并冻结为骨架
+（CompiledWorkspace），缓存在 ManifestRenderer 中，模板变化时由 on_template_event 失效。
+创建资源时只在骨架上填入实例相关的字段（名称、命名空间、标签、PVC 名称），其余部分直接共享，
+不再为每个工作空间重新拼装整个嵌套的清单。
+
+模板可以通过 spec.podTemplate 定制 Pod：
+- command / args：主容器的命令和参数，字符串中可以使用 {{ port }}（code-server 监听的端口）和 {{ image }}；
+- env / volumeMounts：主容器的环境变量和额外的挂载；
+- sidecars / initContainers：原样加入 Pod 的容器列表；
+- volumes：额外的卷（工作空间的 PVC 卷始终存在）。
+
+PVC 的大小、StorageClass 和 accessModes 来自 spec.storage，未设置 storageClassName 时使用集群默认的 StorageClass；
+数据源（种子，见 seed.py）与命名空间有关，在 render_pvc 时填入。
+"""
+
+import collections
+import os
+
+from typing import Any, Dict, Hashable, Mapping, Optional, Tuple
+
+import jinja2
+import yaml
+from jinja2.sandbox import SandboxedEnvironment
+
+from update_plan import listen_port
+from workspace_config import FrozenDict, freeze
+
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# 主容器的名称，原地调整资源时按名称定位容器
+WORKSPACE_CONTAINER = "vscode-server"
+# 工作空间 PVC 对应的卷名称和挂载路径
+STORAGE_VOLUME = "workspace-storage"
+STORAGE_MOUNT_PATH = "/workspace"
+
+# 模板没有指定 command 时主容器运行 code-server
+DEFAULT_COMMAND = ("code-server", "--bind-addr", "0.0.0.0:{{ port }}", "--auth", "none", STORAGE_MOUNT_PATH)
+
+# 没有配置 storage.accessModes 时 PVC 的访问模式
+DEFAULT_ACCESS_MODES = ("ReadWriteOnce",)
+
+# 没有配置端口时 Service 暴露的端口
+DEFAULT_SERVICE_PORT = {"name": "http", "containerPort": 8080, "protocol": "TCP"}
+
+# 优先使用 libyaml 的 C 实现解析渲染结果
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class CompiledWorkspace:
+    """
+    一个（模板，有效配置）编译后的 Pod / Service / PVC 骨架
+
+    骨架是冻结的，可以被任意多个工作空间共享；render_* 方法只复制需要填入实例字段的那几层。
+    """
+
+    __slots__ = ("pod", "service", "pvc")
+
+    def __init__(self, pod: FrozenDict, service: FrozenDict, pvc: FrozenDict):
+        self.pod = pod
+        self.service = service
+        self.pvc = pvc
+
+    def render_pod(self, name: str, namespace: str, pvc_name: str, labels: Dict[str, str]) -> Dict[str, Any]:
+        """生成工作空间 Pod 的清单"""
+        spec = dict(self.pod["spec"])
+        storage = {"name": STORAGE_VOLUME, "persistentVolumeClaim": {"claimName": pvc_name}}
+        spec["volumes"] = [storage, *spec.get("volumes", ())]
+        return {
+            "apiVersion": "v1",
+            "kind": "Pod",
+            "metadata": {"name": name, "namespace": namespace, "labels": labels},
+            "spec": spec,
+        }
+
+    def render_service(self, name: str, namespace: str, labels: Dict[str, str], selector: Dict[str, str]) -> Dict[str, Any]:
+        """生成工作空间 Service 的清单"""
+        return {
+            "apiVersion": "v1",
+            "kind": "Service",
+            "metadata": {"name": name, "namespace": namespace, "labels": labels},
+            "spec": {**self.service["spec"], "selector": selector},
+        }
+
+    def render_pvc(
+        self,
+        name: str,
+        namespace: str,
+        labels: Dict[str, str],
+        data_source: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """生成工作空间 PVC 的清单，data_source 为种子时 PVC 以 CSI 克隆的方式创建"""
+        spec = self.pvc["spec"]
+        if data_source:
+            spec = {**spec, "dataSource": data_source}
+        return {
+            "apiVersion": "v1",
+            "kind": "PersistentVolumeClaim",
+            "metadata": {"name": name, "namespace": namespace, "labels": labels},
+            "spec": spec,
+        }
+
+
+class ManifestRenderer:
+    """
+    编译并缓存 CompiledWorkspace
+
+    缓存以（模板名称，有效配置）为键，按最近使用淘汰；模板变化时调用 invalidate 丢弃它的所有条目。
+
+    Args:
+        max_entries: 最多缓存的编译结果数量
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self._max_entries = max(1, max_entries)
+        env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+            undefined=jinja2.StrictUndefined,
+            autoescape=False,
+        )
+        self._templates = {kind: env.get_template(f"{kind}.yaml.j2") for kind in ("pod", "service", "pvc")}
+        # 模板作者提供的 command / args 在沙箱中展开
+        self._sandbox = SandboxedEnvironment(undefined=jinja2.StrictUndefined)
+        self._snippets: Dict[str, jinja2.Template] = {}
+        self._compiled: "collections.OrderedDict[Tuple[Optional[str], Hashable], CompiledWorkspace]" = collections.OrderedDict()
+        self.hits = 0
+        self.compiles = 0
+
+    def compile(self, template_name: Optional[str], config: Mapping[str, Any]) -> CompiledWorkspace:
+        """
+        返回有效配置编译后的骨架，缓存未命中时编译一次
+
+        Args:
+            template_name: 模板名称，用于失效
+            config: 合并后的有效配置（workspace_config.merge_configs 的结果）
+
+        Returns:
+            CompiledWorkspace
+
+        Raises:
+            ValueError: 模板中的 podTemplate 无法渲染（例如 command 中引用了未知的变量）
+        """
+        config = freeze(config)
+        key = (template_name, config)
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            self._compiled.move_to_end(key)
+            self.hits += 1
+            return compiled
+
+        try:
+            compiled = self._compile(config)
+        except (jinja2.TemplateError, yaml.YAMLError) as e:
+            raise ValueError(f"Failed to render manifests for template {template_name}: {e}") from e
+        self.compiles += 1
+        self._compiled[key] = compiled
+        if len(self._compiled) > self._max_entries:
+            self._compiled.popitem(last=False)
+        return compiled
+
+    def invalidate(self, template_name: str):
+        """丢弃模板的所有编译结果"""
+        for key in [key for key in self._compiled if key[0] == template_name]:
+            del self._compiled[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存的条目数、命中次数和编译次数"""
+        return {"size": len(self._compiled), "hits": self.hits, "compiles": self.compiles}
+
+    def _compile(self, config: FrozenDict) -> CompiledWorkspace:
+        pod_template = config.get("podTemplate") or {}
+        ports = [
+            {
+                "name": port.get("name", f"port-{port['containerPort']}"),
+                "containerPort": port["containerPort"],
+                "protocol": port.get("protocol", "TCP"),
+            }
+            for port in config.get("ports") or ()
+        ]
+        image = config.get("environment", {}).get("image")
+        variables = {"port": listen_port(ports), "image": image}
+
+        pod = self._templates["pod"].render(
+            container_name=WORKSPACE_CONTAINER,
+            image=image,
+            ports=ports,
+            resources=config.get("resources") or {},
+            volume_mounts=[{"name": STORAGE_VOLUME, "mountPath": STORAGE_MOUNT_PATH}, *pod_template.get("volumeMounts", ())],
+            command=self._expand(pod_template.get("command") or DEFAULT_COMMAND, variables),
+            args=self._expand(pod_template.get("args") or (), variables),
+            env=pod_template.get("env") or (),
+            init_containers=pod_template.get("initContainers") or (),
+            sidecars=pod_template.get("sidecars") or (),
+            volumes=pod_template.get("volumes") or (),
+        )
+        service = self._templates["service"].render(ports=ports or [DEFAULT_SERVICE_PORT])
+        storage = config.get("storage") or {}
+        pvc = self._templates["pvc"].render(
+            storage_size=storage.get("size", "10Gi"),
+            storage_class=storage.get("storageClassName"),
+            access_modes=list(storage.get("accessModes") or DEFAULT_ACCESS_MODES),
+        )
+        return CompiledWorkspace(
+            freeze(yaml.load(pod, Loader=_YAML_LOADER)),
+            freeze(yaml.load(service, Loader=_YAML_LOADER)),
+            freeze(yaml.load(pvc, Loader=_YAML_LOADER)),
+        )
+
+    def _expand(self, values, variables: Dict[str, Any]) -> list:
+        """展开字符串列表中的 {{ port }} / {{ image }}"""
+        return [
+            self._snippet(value).render(variables) if isinstance(value, str) and "{" in value else value
+            for value in values
+        ]
+
+    def _snippet(self, source: str) -> jinja2.Template:
+        """编译（并缓存）一段 command / args 字符串"""
+        template = self._snippets.get(source)
+        if template is None:
+            if len(self._snippets) >= self._max_entries:
+                self._snippets.clear()
+            template = self._snippets[source] = self._sandbox.from_string(source)
+        return template
@@ -0,0 +1,177 @@
+"""
+Prometheus 指标与可选的 OpenTelemetry 链路追踪
+
+- devworkspace_phase_duration_seconds{phase}：工作空间生命周期中各阶段的耗时，
+  phase 取值见 PHASES
+- devworkspace_api_call_duration_seconds{operation}：每一次 Kubernetes API 调用的耗时
+- devworkspace_api_call_errors_total{operation, code}：Kubernetes API 调用失败的次数，
+  code 为 HTTP 状态码，连接错误等没有状态码的失败记为 "error"
+- devworkspace_api_retries_total{operation, code}：因 429、5xx 或连接错误而重试的 API 调用次数
+- devworkspace_api_rate_limit_wait_seconds：API 调用在客户端令牌桶（包括 429 之后的暂停）中等待的时间
+- devworkspace_cache_entries{cache}：各内存缓存的条目数（pods、services、workspaceIndex 等，见 main.cache_sizes）
+- devworkspace_drift_repairs_total{drift}：漂移检测修复的工作空间数量，drift 取值见 drift.DRIFT_KINDS
+- devworkspace_scheduler_queue_depth{namespace}：每个命名空间等待执行名额的请求数
+- devworkspace_scheduler_wait_seconds{namespace, priority}：请求等待执行名额的时间
+- devworkspace_startup_seconds{stage}：启动各阶段完成时距进程开始导入 main.py 的秒数
+  （import、context、sharding、caches、ready）
+- devworkspace_status_writes_total{result}：status 写入的结果，
+  written / failed 为实际发出的写入，skipped / coalesced 为被省掉的写入
+
+安装了 opentelemetry-api 时，每个阶段同时生成一个以 devworkspace.<phase> 命名的 span，
+并带上 devworkspace.name / devworkspace.namespace 属性；是否导出由 OpenTelemetry SDK 的配置决定
+（例如通过 opentelemetry-instrument 启动）。未安装时追踪是空操作。
+"""
+
+import contextlib
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from typing import Iterator, Optional
+
+try:
+    from opentelemetry import trace
+except ImportError:  # opentelemetry 是可选依赖
+    trace = None
+
+
+# 阶段名称
+PHASES = (
+    "template_fetch",   # 读取 DevWorkspaceTemplate（缓存命中时接近 0）
+    "merge",            # 合并模板与覆盖配置
+    "pvc_create",       # 创建 PVC
+    "pod_create",       # 创建 Pod
+    "service_create",   # 创建 Service
+    "time_to_running",  # 进入 Starting 后等待 Pod Running
+    "time_to_url",      # 等待 Service 分配 ClusterIP
+    "delete_wait",      # 重建时等待旧 Pod 被删除
+    "pod_resize",       # 原地调整 Pod 的资源
+    "drift_resync",     # 一个漂移检测周期中 LIST Pod / Service / PVC 并与 DevWorkspace 比较
+)
+
+# 覆盖从几毫秒（缓存命中）到几分钟（镜像拉取）的范围
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+PHASE_DURATION = Histogram(
+    "devworkspace_phase_duration_seconds",
+    "Duration of each DevWorkspace reconcile phase",
+    ["phase"],
+    buckets=_BUCKETS
+)
+API_CALL_DURATION = Histogram(
+    "devworkspace_api_call_duration_seconds",
+    "Latency of Kubernetes API calls made by the operator",
+    ["operation"],
+    buckets=_BUCKETS
+)
+API_CALL_ERRORS = Counter(
+    "devworkspace_api_call_errors_total",
+    "Failed Kubernetes API calls made by the operator",
+    ["operation", "code"]
+)
+API_RETRIES = Counter(
+    "devworkspace_api_retries_total",
+    "Kubernetes API calls retried after 429, 5xx or connection errors",
+    ["operation", "code"]
+)
+API_RATE_LIMIT_WAIT = Histogram(
+    "devworkspace_api_rate_limit_wait_seconds",
+    "Time API calls spent waiting for the client-side rate limiter",
+    buckets=_BUCKETS
+)
+STATUS_WRITES = Counter(
+    "devworkspace_status_writes_total",
+    "DevWorkspace status writes by result (written, failed, skipped, coalesced)",
+    ["result"]
+)
+DRIFT_REPAIRS = Counter(
+    "devworkspace_drift_repairs_total",
+    "Workspaces repaired by the periodic drift resync, by kind of drift",
+    ["drift"]
+)
+SCHEDULER_QUEUE_DEPTH = Gauge(
+    "devworkspace_scheduler_queue_depth",
+    "Reconcile requests waiting for an execution slot, per namespace",
+    ["namespace"]
+)
+SCHEDULER_WAIT = Histogram(
+    "devworkspace_scheduler_wait_seconds",
+    "Time reconcile requests waited for an execution slot",
+    ["namespace", "priority"],
+    buckets=_BUCKETS
+)
+CACHE_ENTRIES = Gauge(
+    "devworkspace_cache_entries",
+    "Entries held in each in-memory cache of the operator",
+    ["cache"]
+)
+STARTUP_DURATION = Gauge(
+    "devworkspace_startup_seconds",
+    "Seconds from the start of the operator import until each startup stage completed",
+    ["stage"]
+)
+
+_tracer = trace.get_tracer("devworkspace-operator") if trace is not None else None
+
+
+def start_metrics_server(port: int):
+    """
+    在后台线程中启动 /metrics HTTP 端点
+
+    Args:
+        port: 监听端口
+    """
+    start_http_server(port)
+
+
+@contextlib.contextmanager
+def span(name: str, workspace: Optional[str] = None, namespace: Optional[str] = None) -> Iterator[None]:
+    """
+    生成一个 OpenTelemetry span（未安装 opentelemetry 时什么都不做）
+
+    在 asyncio 中嵌套使用时，子 span 通过 contextvars 自动关联到父 span。
+    """
+    if _tracer is None:
+        yield
+        return
+    attributes = {}
+    if workspace:
+        attributes["devworkspace.name"] = workspace
+    if namespace:
+        attributes["devworkspace.namespace"] = namespace
+    with _tracer.start_as_current_span(name, attributes=attributes):
+        yield
+
+
+@contextlib.contextmanager
+def phase(name: str, workspace: Optional[str] = None, namespace: Optional[str] = None) -> Iterator[None]:
+    """
+    统计一个阶段的耗时，并为其生成 span
+
+    阶段失败（抛出异常）时同样记录耗时。
+
+    Args:
+        name: 阶段名称，取值见 PHASES
+        workspace: 工作空间名称
+        namespace: 命名空间
+    """
+    started = time.perf_counter()
+    try:
+        with span(f"devworkspace.{name}", workspace, namespace):
+            yield
+    finally:
+        PHASE_DURATION.labels(phase=name).observe(time.perf_counter() - started)
+
+
+def observe_api_call(operation: str, seconds: float, error_code: Optional[str] = None):
+    """
+    记录一次 Kubernetes API 调用
+
+    Args:
+        operation: 操作名称，例如 read_namespaced_pod、patch_pods
+        seconds: 耗时
+        error_code: 失败时的 HTTP 状态码（或 "error"），成功时为 None
+    """
+    API_CALL_DURATION.labels(operation=operation).observe(seconds)
+    if error_code is not None:
+        API_CALL_ERRORS.labels(operation=operation, code=error_code).inc()
@@ -0,0 +1,86 @@
+"""
+Kubernetes API 请求的限速与重试工具
+
+- TokenBucket：异步令牌桶，call_api 用它限制整个 Operator（以及单个 DevWorkspaceSet 批次）的请求速率；
+  收到 429 时可以暂停整个桶，让所有调用方一起退让，而不是各自立即重试
+- backoff_delay：指数退避加随机抖动，避免 API Server 故障恢复后大量请求在同一时刻重试
+- retry_after：读取 429 / 503 响应中的 Retry-After
+"""
+
+import asyncio
+import random
+import time
+
+from typing import Optional
+
+from kubernetes.client.rest import ApiException
+
+
+class TokenBucket:
+    """
+    异步令牌桶：平均每秒 rate 个请求，最多突发 burst 个
+
+    令牌不足时调用方预支令牌并等待到令牌补足的时刻，等待者按到达顺序依次放行，
+    不会出现大量协程同时醒来争抢令牌的情况。
+
+    Args:
+        rate: 每秒补充的令牌数，<= 0 表示不限速
+        burst: 令牌桶容量
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        # pause 之后在该时刻之前不放行任何请求
+        self._resume_at = 0.0
+
+    def pause(self, seconds: float):
+        """在接下来的 seconds 秒内不放行任何请求（例如 API Server 返回了 429）"""
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def acquire(self) -> float:
+        """
+        取一个令牌，必要时等待
+
+        Returns:
+            等待的时间（秒）
+        """
+        waited = 0.0
+        paused = self._resume_at - time.monotonic()
+        if paused > 0:
+            await asyncio.sleep(paused)
+            waited += paused
+        if self.rate <= 0:
+            return waited
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens < 0:
+            delay = -self._tokens / self.rate
+            await asyncio.sleep(delay)
+            waited += delay
+        return waited
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    第 attempt 次重试（从 0 开始）前的等待时间
+
+    上限为 min(cap, base * 2^attempt)，实际取值在上限的一半到上限之间随机分布（equal jitter），
+    既保证退避随次数增长，又把同时失败的请求在时间上打散。
+    """
+    ceiling = min(cap, base * (2 ** min(attempt, 32)))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def retry_after(error: ApiException) -> Optional[float]:
+    """返回响应中 Retry-After 头指定的秒数，没有或无法解析时返回 None"""
+    headers = error.headers or {}
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None  # HTTP 日期格式的 Retry-After，API Server 不会返回
@@ -0,0 +1,119 @@
+"""
+内存缓存中的精简记录
+
+Operator 为每个工作空间常驻保存的内容（共享 Pod / Service 缓存中的快照、workspaces_by_template 索引中的条目）
+随工作空间数量线性增长。这些记录只保留 handler 实际读取的字段，并使用 __slots__，
+每条记录没有实例 __dict__；命名空间、模板名称、阶段等大量重复的字符串通过 sys.intern 共享同一个对象。
+
+记录由 watch 事件（JSON 解码后的 dict）或 kopf 传给索引函数的对象构造，本身不可变：
+对象变化时整条替换，读取方不需要复制。
+"""
+
+import sys
+
+from typing import Any, Dict, Mapping, Optional
+
+from workspace_config import FrozenDict, freeze
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+class PodRecord:
+    """共享 Pod 缓存中的一个 Pod：只保留等待逻辑需要的阶段"""
+
+    __slots__ = ("phase",)
+
+    def __init__(self, phase: Optional[str]):
+        self.phase = phase
+
+    @classmethod
+    def from_object(cls, pod: Mapping[str, Any]) -> "PodRecord":
+        """由 watch / LIST 得到的 Pod（JSON 解码后的 dict）构造记录"""
+        return cls(_intern((pod.get("status") or {}).get("phase")))
+
+
+class ServiceRecord:
+    """共享 Service 缓存中的一个 Service：只保留生成访问 URL 需要的 ClusterIP 和第一个端口"""
+
+    __slots__ = ("cluster_ip", "port")
+
+    def __init__(self, cluster_ip: Optional[str], port: Optional[int]):
+        self.cluster_ip = cluster_ip
+        self.port = port
+
+    @classmethod
+    def from_object(cls, service: Mapping[str, Any]) -> "ServiceRecord":
+        """由 watch / LIST 得到的 Service（JSON 解码后的 dict）构造记录"""
+        spec = service.get("spec") or {}
+        ports = spec.get("ports") or ()
+        return cls(spec.get("clusterIP"), ports[0].get("port") if ports else None)
+
+
+class WorkspaceRecord:
+    """
+    workspaces_by_template 索引中的一个 DevWorkspace
+
+    只保留模板滚动更新和漂移检测读取的字段：spec 中的 templateRef、overrides，
+    status 中的阶段、Pod / Service / PVC 名称、url、templateGeneration 和 configHash。
+    labels 只保留分片需要的标签（见 SHARD_KEY_LABEL），未开启按标签分片时为 None。
+    """
+
+    __slots__ = (
+        "name", "namespace", "uid", "labels", "deleting", "template_ref", "overrides",
+        "phase", "pod_name", "service_name", "pvc_name", "url", "template_generation", "config_hash",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        namespace: str,
+        uid: Optional[str],
+        labels: Optional[Dict[str, str]],
+        deleting: bool,
+        spec: Mapping[str, Any],
+        status: Mapping[str, Any]
+    ):
+        self.name = name
+        self.namespace = _intern(namespace)
+        self.uid = uid
+        self.labels = labels
+        self.deleting = deleting
+        self.template_ref = _intern(spec.get("templateRef"))
+        overrides = spec.get("overrides")
+        self.overrides: Optional[FrozenDict] = freeze(overrides) if overrides else None
+        self.phase = _intern(status.get("phase"))
+        self.pod_name = status.get("podName")
+        self.service_name = status.get("serviceName")
+        self.pvc_name = status.get("pvcName")
+        self.url = status.get("url")
+        self.template_generation = status.get("templateGeneration")
+        self.config_hash = status.get("configHash")
+
+    def owner(self, api_version: str, kind: str) -> Dict[str, Any]:
+        """作为 ownerReference 来源的 DevWorkspace（apiVersion、kind、metadata.name 和 metadata.uid）"""
+        return {"apiVersion": api_version, "kind": kind, "metadata": {"name": self.name, "uid": self.uid}}
+
+    def spec(self) -> Dict[str, Any]:
+        """记录中保留的 spec 字段，形式与 DevWorkspace 的 spec 相同"""
+        spec: Dict[str, Any] = {"templateRef": self.template_ref}
+        if self.overrides is not None:
+            spec["overrides"] = self.overrides
+        return spec
+
+    def status(self) -> Dict[str, Any]:
+        """记录中保留的 status 字段，形式与 DevWorkspace 的 status 相同（只包含有值的字段）"""
+        fields = {
+            "phase": self.phase,
+            "podName": self.pod_name,
+            "serviceName": self.service_name,
+            "pvcName": self.pvc_name,
+            "url": self.url,
+            "templateGeneration": self.template_generation,
+            "configHash": self.config_hash,
+        }
+        return {key: value for key, value in fields.items() if value is not None}
+
+    def __repr__(self) -> str:
+        return f"WorkspaceRecord({self.namespace}/{self.name}, template={self.template_ref}, phase={self.phase})"
@@ -0,0 +1,248 @@
+"""
+跨命名空间的公平调度
+
+Operator 以 clusterwide 模式运行时，所有命名空间的事件争用同一批 API 请求并发：
+一个团队一次创建 200 个工作空间，就可能让另一个命名空间里打开单个工作空间的开发者排在队尾。
+ReconcileScheduler 在 handler 真正访问 API Server 的部分之前发放执行名额（slot）：
+
+- 全局并发上限 max_concurrency，以及每个命名空间的并发上限 namespace_concurrency，
+  单个命名空间的批量操作最多占用 namespace_concurrency 个名额；
+- 优先级：INTERACTIVE（创建单个工作空间、恢复）> NORMAL（配置更新）> BULK（DevWorkspaceSet 批量创建）
+  > BACKGROUND（删除、空闲暂停、模板滚动更新、漂移修复、预热池维护）。名额空出时先发给最高优先级的等待者；
+- 同一优先级内每个命名空间有自己的 FIFO 队列，命名空间之间轮转（round robin）：
+  一个命名空间排了 200 个请求，也只是多一个参与轮转的队列，其他命名空间的请求最多等待一轮；
+- 等待超过 promote_after 秒的请求不再受优先级限制，按等待时间先后发放，低优先级的工作不会被饿死。
+
+等待名额的只是协程，不占用线程；名额只覆盖 API 调用的部分，等待 Pod 就绪等长时间的等待不占用名额。
+持有名额的代码中间需要长时间等待时（例如重建 Pod 时等待旧 Pod 被删除），用 suspended() 暂时归还名额。
+"""
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import time
+
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import metrics
+
+
+# 优先级，数值越小越优先
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+BACKGROUND = 3
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BULK: "bulk", BACKGROUND: "background"}
+
+
+class _Holding:
+    """当前任务持有的名额（suspended() 期间 held 为 False）"""
+
+    __slots__ = ("scheduler", "namespace", "priority", "held")
+
+    def __init__(self, scheduler: "ReconcileScheduler", namespace: str, priority: int):
+        self.scheduler = scheduler
+        self.namespace = namespace
+        self.priority = priority
+        self.held = True
+
+
+# 当前任务持有的名额；asyncio.gather 创建的子任务共享同一个对象，因此名额不会被重复归还
+_holding: "contextvars.ContextVar[Optional[_Holding]]" = contextvars.ContextVar("scheduler_holding", default=None)
+
+
+class _Waiter:
+    __slots__ = ("namespace", "priority", "enqueued", "future")
+
+    def __init__(self, namespace: str, priority: int, future: asyncio.Future):
+        self.namespace = namespace
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.future = future
+
+
+class ReconcileScheduler:
+    """
+    按命名空间公平、按优先级发放执行名额
+
+    Args:
+        max_concurrency: 全局同时持有名额的数量上限，<= 0 表示不限制（直接放行，不排队）
+        namespace_concurrency: 每个命名空间同时持有名额的数量上限
+        promote_after: 等待超过该秒数的请求按等待时间先后发放，<= 0 表示不提升
+    """
+
+    def __init__(self, max_concurrency: int, namespace_concurrency: int, promote_after: float = 30.0):
+        self.max_concurrency = max_concurrency
+        self.namespace_concurrency = max(1, namespace_concurrency)
+        self.promote_after = promote_after
+        # 每个优先级：命名空间 -> 等待队列，字典的顺序就是轮转顺序
+        self._queues: Dict[int, "collections.OrderedDict[str, Deque[_Waiter]]"] = {
+            priority: collections.OrderedDict() for priority in PRIORITY_NAMES
+        }
+        self._running: Dict[str, int] = collections.defaultdict(int)
+        self._queued: Dict[str, int] = collections.defaultdict(int)
+        self._last_wait: Dict[str, float] = {}
+        self._active = 0
+
+    @contextlib.asynccontextmanager
+    async def slot(self, namespace: Optional[str], priority: int = NORMAL) -> AsyncIterator[None]:
+        """
+        等待并占用一个执行名额，退出时归还
+
+        Args:
+            namespace: 工作所属的命名空间，集群级别的对象为 None
+            priority: 优先级（INTERACTIVE / NORMAL / BULK / BACKGROUND）
+        """
+        if self.max_concurrency <= 0:
+            yield
+            return
+        namespace = namespace or ""
+        await self._acquire(namespace, priority)
+        holding = _Holding(self, namespace, priority)
+        token = _holding.set(holding)
+        try:
+            yield
+        finally:
+            _holding.reset(token)
+            if holding.held:
+                self._release(namespace)
+
+    @contextlib.asynccontextmanager
+    async def suspended(self) -> AsyncIterator[None]:
+        """
+        暂时归还当前任务持有的名额，退出时按原来的命名空间和优先级重新排队等待
+
+        用于持有名额的代码中间的长时间等待（例如等待 Pod 被删除），等待期间其他工作可以使用这个名额。
+        当前任务没有持有名额时（或名额已经被归还）不做任何事。被取消时不再重新等待名额。
+        """
+        holding = _holding.get()
+        if holding is None or holding.scheduler is not self or not holding.held:
+            yield
+            return
+        holding.held = False
+        self._release(holding.namespace)
+        try:
+            yield
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            await self._reacquire(holding)
+            raise
+        await self._reacquire(holding)
+
+    async def _reacquire(self, holding: _Holding):
+        await self._acquire(holding.namespace, holding.priority)
+        holding.held = True
+
+    async def _acquire(self, namespace: str, priority: int):
+        waiter = _Waiter(namespace, priority, asyncio.get_running_loop().create_future())
+        self._queues[priority].setdefault(namespace, collections.deque()).append(waiter)
+        self._queued[namespace] += 1
+        metrics.SCHEDULER_QUEUE_DEPTH.labels(namespace=namespace).set(self._queued[namespace])
+        # 有空闲名额时立即发放（不一定发给自己：更高优先级或轮转在前的等待者先得到名额）
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 名额已经发出，但等待者在拿到之前被取消
+                self._release(namespace)
+            else:
+                self._remove(waiter)
+            raise
+
+    def _release(self, namespace: str):
+        self._active -= 1
+        self._running[namespace] -= 1
+        if self._running[namespace] <= 0:
+            del self._running[namespace]
+        self._dispatch()
+
+    def _grant(self, namespace: str, priority: int, waited: float):
+        self._active += 1
+        self._running[namespace] += 1
+        self._last_wait[namespace] = waited
+        metrics.SCHEDULER_WAIT.labels(namespace=namespace, priority=PRIORITY_NAMES[priority]).observe(waited)
+
+    def _dequeue(self, priority: int, namespace: str) -> _Waiter:
+        queues = self._queues[priority]
+        queue = queues[namespace]
+        waiter = queue.popleft()
+        if queue:
+            # 这个命名空间排到本优先级轮转顺序的最后
+            queues.move_to_end(namespace)
+        else:
+            del queues[namespace]
+        self._queued[namespace] -= 1
+        metrics.SCHEDULER_QUEUE_DEPTH.labels(namespace=namespace).set(self._queued[namespace])
+        if self._queued[namespace] <= 0:
+            del self._queued[namespace]
+        return waiter
+
+    def _remove(self, waiter: _Waiter):
+        queues = self._queues[waiter.priority]
+        queue = queues.get(waiter.namespace)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        if not queue:
+            del queues[waiter.namespace]
+        self._queued[waiter.namespace] -= 1
+        metrics.SCHEDULER_QUEUE_DEPTH.labels(namespace=waiter.namespace).set(self._queued[waiter.namespace])
+        if self._queued[waiter.namespace] <= 0:
+            del self._queued[waiter.namespace]
+
+    def _next(self) -> Optional[Tuple[int, str]]:
+        """选出下一个可以发放名额的 (优先级, 命名空间)"""
+        now = time.monotonic()
+        if self.promote_after > 0:
+            # 等待太久的请求不论优先级，按等待时间先后发放
+            oldest: Optional[_Waiter] = None
+            for queues in self._queues.values():
+                for namespace, queue in queues.items():
+                    head = queue[0]
+                    if now - head.enqueued >= self.promote_after and self._running.get(namespace, 0) < self.namespace_concurrency \
+                            and (oldest is None or head.enqueued < oldest.enqueued):
+                        oldest = head
+            if oldest is not None:
+                return oldest.priority, oldest.namespace
+
+        for priority in sorted(self._queues):
+            for namespace in self._queues[priority]:
+                if self._running.get(namespace, 0) < self.namespace_concurrency:
+                    return priority, namespace
+        return None
+
+    def _dispatch(self):
+        while self._active < self.max_concurrency:
+            selected = self._next()
+            if selected is None:
+                return
+            waiter = self._dequeue(*selected)
+            if waiter.future.done():
+                continue
+            self._grant(waiter.namespace, waiter.priority, time.monotonic() - waiter.enqueued)
+            waiter.future.set_result(None)
+
+    def stats(self) -> Dict[str, object]:
+        """返回全局和每个命名空间的排队数、占用名额数和最近一次的等待时间"""
+        namespaces: Dict[str, Dict[str, object]] = {}
+        for namespace in set(self._queued) | set(self._running):
+            namespaces[namespace or "<cluster>"] = {
+                "queued": self._queued.get(namespace, 0),
+                "running": self._running.get(namespace, 0),
+                "lastWaitSeconds": round(self._last_wait.get(namespace, 0.0), 3),
+            }
+        queued_by_priority: List[Tuple[str, int]] = [
+            (PRIORITY_NAMES[priority], sum(len(queue) for queue in queues.values()))
+            for priority, queues in sorted(self._queues.items())
+        ]
+        return {
+            "active": self._active,
+            "maxConcurrency": self.max_concurrency,
+            "namespaceConcurrency": self.namespace_concurrency,
+            "queued": dict(queued_by_priority),
+            "namespaces": namespaces,
+        }
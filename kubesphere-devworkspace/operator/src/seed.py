@@ -0,0 +1,210 @@
+"""
+工作空间 PVC 的种子卷
+
+新建的工作空间 PVC 默认是空的，用户要在 Pod 里重新克隆代码仓库、安装依赖。
+模板可以通过 spec.storage.seed 指定一个种子，新的 PVC 以 CSI 克隆的方式（spec.dataSource）从种子创建：
+
+- volumeSnapshot：工作空间所在命名空间中已有的 VolumeSnapshot；
+- pvc：工作空间所在命名空间中的“黄金”PVC，直接作为克隆源（CSI volume cloning）。
+  同时设置 refreshInterval 时，Operator 每隔 refreshInterval 为黄金 PVC 创建一个新的 VolumeSnapshot，
+  新的工作空间从最近一个就绪的快照克隆，只保留最近 SNAPSHOT_KEEP 个就绪快照。
+
+CSI 的数据源不能跨命名空间，种子只用于 seed.namespaces 中的命名空间（未设置时为所有命名空间，
+此时要求每个命名空间中都有同名的种子）；其他命名空间中的工作空间仍然创建空的 PVC。
+
+本模块只负责选择数据源、构造快照清单和决定快照的创建与清理，对 API 的调用由 main.py 完成。
+"""
+
+import datetime
+import sys
+
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from informer import Key, ResourceCache
+
+
+SNAPSHOT_GROUP = "snapshot.storage.k8s.io"
+SNAPSHOT_VERSION = "v1"
+SNAPSHOT_PLURAL = "volumesnapshots"
+
+# Operator 创建的种子快照上标记所属模板的标签
+SEED_TEMPLATE_LABEL = "devworkspace.kubesphere.io/seed-template"
+
+# 每个命名空间保留的就绪快照数量：最新的一个供新的工作空间克隆，上一个留给仍在从它克隆的 PVC
+SNAPSHOT_KEEP = 2
+
+
+def seeds_namespace(seed: Mapping[str, Any], namespace: str) -> bool:
+    """种子是否用于该命名空间"""
+    namespaces = seed.get("namespaces")
+    return not namespaces or namespace in namespaces
+
+
+def _created(snapshot: Mapping[str, Any]) -> str:
+    # RFC 3339 的 UTC 时间戳按字符串比较即按时间先后
+    return (snapshot.get("metadata") or {}).get("creationTimestamp") or ""
+
+
+def _ready(snapshot: Mapping[str, Any]) -> bool:
+    return bool((snapshot.get("status") or {}).get("readyToUse"))
+
+
+def _failed(snapshot: Mapping[str, Any]) -> bool:
+    return bool((snapshot.get("status") or {}).get("error")) and not _ready(snapshot)
+
+
+def _age(snapshot: Mapping[str, Any], now: datetime.datetime) -> float:
+    created = _created(snapshot)
+    if not created:
+        return 0.0
+    created_at = datetime.datetime.fromisoformat(created.replace("Z", "+00:00"))
+    return (now - created_at).total_seconds()
+
+
+def _snapshot_record(snapshot: Mapping[str, Any]) -> Tuple[Optional[str], str, bool]:
+    """缓存中保存的种子快照：(所属模板, 创建时间, 是否就绪)"""
+    template = ((snapshot.get("metadata") or {}).get("labels") or {}).get(SEED_TEMPLATE_LABEL)
+    return (sys.intern(template) if template else None), _created(snapshot), _ready(snapshot)
+
+
+class SeedSnapshots:
+    """
+    每个（模板，命名空间）最近一个就绪的种子快照
+
+    cache 由关注带有 SEED_TEMPLATE_LABEL 的 VolumeSnapshot 的 informer 维护，每个副本都运行它：
+    开启分片时只有负责模板的副本执行 refresh_seed_snapshots，其他副本同样从 watch 得知最新的快照。
+    快照变化时重新计算对应（模板，命名空间）的记录，创建 PVC 时只做一次字典查询。
+    refresh_seed_snapshots 也会用 LIST 的结果更新记录，informer 没有启用时负责模板的副本仍然可以使用快照。
+    """
+
+    def __init__(self):
+        self.cache = ResourceCache("seed snapshot", _snapshot_record)
+        self.cache.add_listener(self._on_event)
+        self._latest: Dict[Tuple[str, str], str] = {}
+        self.refreshes = 0
+
+    def latest(self, template: str, namespace: str) -> Optional[str]:
+        """最近一个就绪的快照名称，没有时为 None"""
+        return self._latest.get((template, namespace))
+
+    def update(self, template: str, namespace: str, snapshot_name: Optional[str]):
+        """记录最近一个就绪的快照，为 None 时清除"""
+        if snapshot_name:
+            self._latest[(template, namespace)] = snapshot_name
+        else:
+            self._latest.pop((template, namespace), None)
+
+    def forget(self, template: str):
+        """模板不再使用快照种子时清除它的所有记录"""
+        for key in [key for key in self._latest if key[0] == template]:
+            del self._latest[key]
+
+    def _on_event(self, event_type: str, key: Key, snap: Any):
+        namespace, _ = key
+        if snap is not None:
+            template = snap[0]
+        else:
+            # 快照已删除：它可能是某个模板记录的最近快照
+            template = next((t for (t, ns), name in self._latest.items() if ns == namespace and name == key[1]), None)
+        if not template:
+            return
+        ready = [
+            (created, name) for (ns, name), (t, created, is_ready) in self.cache.items()
+            if ns == namespace and t == template and is_ready
+        ]
+        self.update(template, namespace, max(ready)[1] if ready else None)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回记录的快照数、watch 到的快照数和刷新次数"""
+        return {"snapshots": len(self._latest), "watched": len(self.cache), "refreshes": self.refreshes}
+
+
+def data_source(
+    template: Optional[str],
+    storage: Mapping[str, Any],
+    namespace: str,
+    snapshots: SeedSnapshots
+) -> Optional[Dict[str, str]]:
+    """
+    选择新 PVC 的数据源
+
+    优先级：seed.volumeSnapshot > Operator 维护的最近一个就绪快照 > seed.pvc（直接克隆）。
+
+    Args:
+        template: 模板名称
+        storage: 有效配置中的 storage
+        namespace: 工作空间所在的命名空间
+        snapshots: SeedSnapshots
+
+    Returns:
+        PVC 的 spec.dataSource，不使用种子时为 None
+    """
+    seed = storage.get("seed")
+    if not seed or not seeds_namespace(seed, namespace):
+        return None
+    if seed.get("volumeSnapshot"):
+        return {"apiGroup": SNAPSHOT_GROUP, "kind": "VolumeSnapshot", "name": seed["volumeSnapshot"]}
+    if not seed.get("pvc"):
+        return None
+    snapshot_name = snapshots.latest(template, namespace) if template and seed.get("refreshInterval") else None
+    if snapshot_name:
+        return {"apiGroup": SNAPSHOT_GROUP, "kind": "VolumeSnapshot", "name": snapshot_name}
+    return {"kind": "PersistentVolumeClaim", "name": seed["pvc"]}
+
+
+def snapshot_manifest(template: str, namespace: str, seed: Mapping[str, Any], suffix: str) -> Dict[str, Any]:
+    """
+    为黄金 PVC 创建快照的清单
+
+    Args:
+        template: 模板名称
+        namespace: 黄金 PVC 所在的命名空间
+        seed: 模板的 spec.storage.seed
+        suffix: 快照名称的后缀，保证每次创建的名称不同
+
+    Returns:
+        VolumeSnapshot 清单
+    """
+    spec: Dict[str, Any] = {"source": {"persistentVolumeClaimName": seed["pvc"]}}
+    if seed.get("volumeSnapshotClassName"):
+        spec["volumeSnapshotClassName"] = seed["volumeSnapshotClassName"]
+    return {
+        "apiVersion": f"{SNAPSHOT_GROUP}/{SNAPSHOT_VERSION}",
+        "kind": "VolumeSnapshot",
+        "metadata": {
+            "name": f"{template}-seed-{suffix}",
+            "namespace": namespace,
+            "labels": {"app": "devworkspace", SEED_TEMPLATE_LABEL: template},
+        },
+        "spec": spec,
+    }
+
+
+def plan_refresh(
+    snapshots: List[Mapping[str, Any]],
+    interval: float,
+    now: datetime.datetime
+) -> Tuple[Optional[str], bool, List[str]]:
+    """
+    决定一个命名空间中的种子快照如何刷新
+
+    - 最近一个快照（不论是否就绪）的年龄超过 interval、且没有正在创建的快照时创建新的快照；
+      失败的快照也计入，因此快照失败时最多每个 interval 重试一次；
+    - 只保留最近 SNAPSHOT_KEEP 个就绪快照，更早的就绪快照和不是最近一个的失败快照被删除。
+
+    Args:
+        snapshots: 该命名空间中属于模板的 VolumeSnapshot（JSON 解码后的 dict）
+        interval: seed.refreshInterval（秒）
+        now: 当前时间（带时区）
+
+    Returns:
+        (最近一个就绪的快照名称, 是否创建新的快照, 需要删除的快照名称)
+    """
+    ordered = sorted(snapshots, key=_created, reverse=True)
+    ready = [snapshot for snapshot in ordered if _ready(snapshot)]
+    latest_ready = ready[0]["metadata"]["name"] if ready else None
+    pending = any(not _ready(snapshot) and not _failed(snapshot) for snapshot in ordered)
+    create = not pending and (not ordered or _age(ordered[0], now) >= interval)
+    stale = [snapshot["metadata"]["name"] for snapshot in ready[SNAPSHOT_KEEP:]]
+    stale.extend(snapshot["metadata"]["name"] for snapshot in ordered[1:] if _failed(snapshot))
+    return latest_ready, create, stale
@@ -0,0 +1,282 @@
+"""
+多副本分片
+
+开启分片后，每个 Operator 副本在 SHARD_LEASE_NAMESPACE 中维护一个 Lease（coordination.k8s.io/v1）
+作为自己的存活声明，并定期列出所有副本的 Lease。未过期的 Lease 构成成员列表，
+各副本据此构建同样的一致性哈希环，按 namespace/name 决定每个对象由哪个副本处理；
+配置了 key_label 时，带有该标签的对象按标签值分片（例如按租户标签把同一租户的工作空间交给同一个副本）。
+所有针对 DevWorkspace / DevWorkspaceTemplate 的 kopf handler 都带有 owns() 过滤条件，
+kopf 对不属于本副本的对象完全"视而不见"（不执行 handler，也不写入任何状态）。
+
+副本之间的交接（handoff）：
+- 副本加入或退出（Lease 被删除或过期）时，哈希环发生变化。新接手对象的副本在对象上写入
+  SHARD_ANNOTATION，这次写入产生的 watch 事件让 kopf 在新副本上继续处理该对象
+  （kopf 的处理进度保存在对象的注解中，因此新副本会从中断处继续）。
+- 每个副本使用自己的 finalizer（FINALIZER_PREFIX + 副本标识的哈希）。对象移交给仍然存活的副本后，
+  原副本不再匹配任何 handler，kopf 会自动移除它自己的 finalizer；
+  原副本已经退出时，由接手的副本移除它遗留的 finalizer，避免对象无法删除。
+"""
+
+import asyncio
+import bisect
+import datetime
+import hashlib
+import logging
+
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+
+SHARD_LABEL = "app=devworkspace-operator-shard"
+SHARD_ANNOTATION = "devworkspace.kubesphere.io/shard"
+FINALIZER_PREFIX = "devworkspace.kubesphere.io/shard-"
+
+
+def _hash(value: str) -> int:
+    return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+def peer_token(identity: str) -> str:
+    """副本标识的短哈希，用于 Lease 名称和 finalizer 名称"""
+    return hashlib.sha1(identity.encode()).hexdigest()[:10]
+
+
+def finalizer_for(identity: str) -> str:
+    """返回某个副本使用的 finalizer 名称"""
+    return FINALIZER_PREFIX + peer_token(identity)
+
+
+class HashRing:
+    """
+    一致性哈希环：副本增减时只有约 1/N 的对象需要换副本处理
+
+    Args:
+        peers: 副本标识
+        vnodes: 每个副本在环上的虚拟节点数，越多分布越均匀
+    """
+
+    def __init__(self, peers: Iterable[str], vnodes: int = 160):
+        self.peers = frozenset(peers)
+        points = sorted((_hash(f"{peer}#{i}"), peer) for peer in self.peers for i in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._owners = [peer for _, peer in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """返回负责 key 的副本，环为空时返回 None"""
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[index]
+
+
+def object_key(namespace: Optional[str], name: str, labels: Optional[Dict[str, str]] = None, key_label: Optional[str] = None) -> str:
+    """
+    对象在哈希环上的键
+
+    对象带有 key_label 标签时使用标签值，否则使用 namespace/name（集群级别对象的 namespace 为空）。
+    """
+    if key_label and labels and labels.get(key_label):
+        return f"label:{labels[key_label]}"
+    return f"{namespace or ''}/{name}"
+
+
+class ShardCoordinator:
+    """
+    通过 Lease 维护副本成员列表，并回答"某个对象是否由本副本处理"
+
+    Args:
+        identity: 本副本的标识（通常是 Pod 名称）
+        namespace: 存放 Lease 的命名空间
+        coordination_api: CoordinationV1Api
+        call_api: 在线程池中执行同步 API 调用的协程函数
+        lease_duration: Lease 的有效期（秒），副本超过该时间未续约即视为退出
+        renew_interval: 续约并刷新成员列表的间隔（秒）
+        logger: 日志对象
+        key_label: 按该标签的值（而不是 namespace/name）分片，为空时不使用
+    """
+
+    def __init__(
+        self,
+        identity: str,
+        namespace: str,
+        coordination_api: client.CoordinationV1Api,
+        call_api: Callable[..., Awaitable[Any]],
+        lease_duration: int,
+        renew_interval: float,
+        logger: logging.Logger,
+        key_label: Optional[str] = None
+    ):
+        self.identity = identity
+        self.key_label = key_label
+        self.namespace = namespace
+        self.lease_name = f"devworkspace-operator-shard-{peer_token(identity)}"
+        self._api = coordination_api
+        self._call_api = call_api
+        self._lease_duration = lease_duration
+        self._renew_interval = renew_interval
+        self._logger = logger
+        self.ring: Optional[HashRing] = None
+        self._listeners: List[Callable[[Optional[HashRing], HashRing], Awaitable[None]]] = []
+        self._ready: Optional[asyncio.Event] = None
+        # 尚未完成的交接及其起点（变化前的哈希环）
+        self._handoff_pending = False
+        self._handoff_base: Optional[HashRing] = None
+
+    def owns(self, namespace: Optional[str], name: str, labels: Optional[Dict[str, str]] = None) -> bool:
+        """本副本是否负责该对象；成员列表尚未建立时不负责任何对象"""
+        return self.ring is not None and self._owner(self.ring, namespace, name, labels) == self.identity
+
+    def _owner(self, ring: HashRing, namespace: Optional[str], name: str, labels: Optional[Dict[str, str]]) -> Optional[str]:
+        return ring.owner(object_key(namespace, name, labels, self.key_label))
+
+    def handoff_candidates(self, old: Optional[HashRing], objects: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        返回成员变化后需要由本副本写入交接注解的对象
+
+        包括由其他副本移交过来的对象，以及带有已退出副本 finalizer 的本副本对象。
+        old 为 None（本副本刚启动）时，kopf 启动后的初始 LIST 会处理所有属于本副本的对象，
+        因此只处理带有遗留 finalizer 的对象。
+        """
+        if self.ring is None:
+            return []
+        tokens = self.live_tokens()
+        result = []
+        for obj in objects:
+            metadata = obj.get('metadata', {})
+            namespace, name, labels = metadata.get('namespace'), metadata.get('name'), metadata.get('labels')
+            if self._owner(self.ring, namespace, name, labels) != self.identity:
+                continue
+            moved = old is not None and self._owner(old, namespace, name, labels) != self.identity
+            if moved or _stale_finalizers(metadata.get('finalizers') or [], tokens):
+                result.append(obj)
+        return result
+
+    def live_tokens(self) -> Set[str]:
+        """当前存活副本的 token（用于识别遗留的 finalizer）"""
+        return {peer_token(peer) for peer in (self.ring.peers if self.ring else ())}
+
+    def add_listener(self, listener: Callable[[Optional[HashRing], HashRing], Awaitable[None]]):
+        """注册成员列表变化的回调，参数为 (旧的哈希环, 新的哈希环)"""
+        self._listeners.append(listener)
+
+    async def wait_ready(self):
+        """等待第一次成员列表建立"""
+        if self._ready is None:
+            self._ready = asyncio.Event()
+        await self._ready.wait()
+
+    async def run(self):
+        """续约本副本的 Lease 并刷新成员列表，直到任务被取消"""
+        if self._ready is None:
+            self._ready = asyncio.Event()
+        while True:
+            try:
+                await self._renew()
+                peers = await self._list_peers()
+                if self.ring is None or peers != self.ring.peers:
+                    if not self._handoff_pending:
+                        self._handoff_base = self.ring
+                    self.ring = HashRing(peers)
+                    self._handoff_pending = True
+                    self._logger.info(f"Shard membership changed: {sorted(peers)}")
+                self._ready.set()
+                if self._handoff_pending:
+                    # 交接失败时保留变化前的哈希环，下一轮重试
+                    self._handoff_pending = not await self._notify(self._handoff_base, self.ring)
+            except ApiException as e:
+                self._logger.error(f"Failed to refresh shard membership: {e}")
+            await asyncio.sleep(self._renew_interval)
+
+    async def leave(self):
+        """删除本副本的 Lease，让其他副本立即接手"""
+        try:
+            await self._call_api(self._api.delete_namespaced_lease, name=self.lease_name, namespace=self.namespace)
+        except ApiException as e:
+            if e.status != 404:
+                self._logger.error(f"Failed to delete shard lease {self.lease_name}: {e}")
+
+    async def _notify(self, old: Optional[HashRing], ring: HashRing) -> bool:
+        ok = True
+        for listener in self._listeners:
+            try:
+                await listener(old, ring)
+            except Exception as e:
+                self._logger.error(f"Shard handoff failed: {e}")
+                ok = False
+        return ok
+
+    async def _renew(self):
+        now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        body = {
+            "apiVersion": "coordination.k8s.io/v1",
+            "kind": "Lease",
+            "metadata": {
+                "name": self.lease_name,
+                "labels": dict([SHARD_LABEL.split("=", 1)])
+            },
+            "spec": {
+                "holderIdentity": self.identity,
+                "leaseDurationSeconds": self._lease_duration,
+                "renewTime": now
+            }
+        }
+        try:
+            await self._call_api(self._api.patch_namespaced_lease, name=self.lease_name, namespace=self.namespace, body=body)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            await self._call_api(self._api.create_namespaced_lease, namespace=self.namespace, body=body)
+
+    async def _list_peers(self) -> frozenset:
+        leases = await self._call_api(self._api.list_namespaced_lease, namespace=self.namespace, label_selector=SHARD_LABEL)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        peers = {self.identity}
+        for lease in leases.items:
+            spec = lease.spec
+            if not spec or not spec.holder_identity or not spec.renew_time:
+                continue
+            renewed = spec.renew_time
+            if renewed.tzinfo is None:
+                renewed = renewed.replace(tzinfo=datetime.timezone.utc)
+            if (now - renewed).total_seconds() <= (spec.lease_duration_seconds or self._lease_duration):
+                peers.add(spec.holder_identity)
+        return frozenset(peers)
+
+
+def handoff_patch(obj: Dict[str, Any], identity: str, epoch: str, live_tokens: Set[str]) -> Dict[str, Any]:
+    """
+    生成接手一个对象时的 merge patch
+
+    写入带有时间戳的 SHARD_ANNOTATION（保证每次交接都会产生 watch 事件），
+    并移除已经退出的副本遗留的 finalizer。带上 resourceVersion，避免覆盖并发修改的 finalizer 列表。
+
+    Args:
+        obj: 对象（dict 形式）
+        identity: 本副本标识
+        epoch: 本次成员变化的时间戳
+        live_tokens: 存活副本的 token
+
+    Returns:
+        merge patch
+    """
+    metadata = obj.get('metadata', {})
+    patch: Dict[str, Any] = {"metadata": {
+        "resourceVersion": metadata.get('resourceVersion'),
+        "annotations": {SHARD_ANNOTATION: f"{identity}@{epoch}"}
+    }}
+    finalizers = metadata.get('finalizers') or []
+    stale = _stale_finalizers(finalizers, live_tokens)
+    if stale:
+        patch["metadata"]["finalizers"] = [finalizer for finalizer in finalizers if finalizer not in stale]
+    return patch
+
+
+def _stale_finalizers(finalizers: List[str], live_tokens: Set[str]) -> List[str]:
+    """返回已经退出的副本留下的 finalizer"""
+    return [
+        finalizer for finalizer in finalizers
+        if finalizer.startswith(FINALIZER_PREFIX) and finalizer[len(FINALIZER_PREFIX):] not in live_tokens
+    ]
+
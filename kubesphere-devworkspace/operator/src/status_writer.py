@@ -0,0 +1,249 @@
+"""
+合并写入 DevWorkspace 的 status
+
+每次 status 写入都是一次 API 往返，并且会触发所有 watch 该对象的消费者（包括 kopf 自己）。
+StatusWriter 在真正发出 patch 之前：
+
+- 跳过不会改变 status 的写入：与最近一次观察到（watch 事件）或写入的 status 相比，
+  patch 中的每个字段都已经是目标值（例如 kopf 重试时再次写入同样的阶段）；
+- 按对象合并连续的写入：同一对象尚未发出的 patch 会合并为一个 merge patch，
+  不等待结果的中间状态（例如 Provisioning）会延迟 delay 秒，
+  如果这期间又有新的写入（例如 Starting），两者只产生一次 API 调用；
+  同一对象的 patch 在前一个完成之前不会并发发出，保证先后顺序。
+
+watch 事件可能晚于本进程的写入到达（例如写入前发生的变化在写入完成后才被投递），
+因此记录的 status 带有对应的 metadata.resourceVersion：比它更旧的事件被忽略；
+本进程还有尚未发出或尚未完成的写入时，事件也被忽略，写入完成后以 API 返回的对象为准。
+
+节省的写入次数记录在 skipped / coalesced 中，并作为 Prometheus 指标导出。
+"""
+
+import asyncio
+import copy
+import logging
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+
+Key = Tuple[str, str]  # (namespace, name)
+
+
+def _changes(current: Dict[str, Any], patch: Dict[str, Any]) -> bool:
+    """按 merge patch 的语义判断 patch 应用到 current 上是否会产生变化"""
+    for key, value in patch.items():
+        if value is None:
+            if key in current:
+                return True
+        elif isinstance(value, dict) and isinstance(current.get(key), dict):
+            if _changes(current[key], value):
+                return True
+        elif current.get(key) != value:
+            return True
+    return False
+
+
+def _older(resource_version: Optional[str], known_version: Optional[str]) -> bool:
+    """
+    判断 resource_version 是否比 known_version 更旧
+
+    resourceVersion 按约定是不透明的字符串；只有两者都是整数（etcd 的修订号）时才比较大小，
+    无法比较时视为不更旧。
+    """
+    if not resource_version or not known_version:
+        return False
+    if not (resource_version.isdigit() and known_version.isdigit()):
+        return False
+    return int(resource_version) < int(known_version)
+
+
+def _merge(target: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把 patch 合并进 target（原地修改并返回 target）
+
+    用于合并两个待发送的 merge patch，因此值为 None 的字段保留为 None（表示删除）。
+    """
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+def _apply(current: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """返回把 merge patch 应用到 current 后的新字典（值为 None 的字段被删除）"""
+    result = copy.deepcopy(current)
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        elif isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = _apply(result[key], value)
+        else:
+            result[key] = copy.deepcopy(value)
+    return result
+
+
+class _Batch:
+    """一个对象上尚未发出的合并后的 patch"""
+
+    __slots__ = ("patch", "futures", "timer")
+
+    def __init__(self):
+        self.patch: Dict[str, Any] = {}
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class StatusWriter:
+    """
+    合并、去重 status 写入
+
+    Args:
+        patch: 真正执行写入的协程函数，参数为 (namespace, name, status)，失败时抛出异常；
+               返回写入后的对象时，用其中的 status 和 metadata.resourceVersion 更新本地记录
+        delay: 不等待结果的写入最多延迟多久（秒）以便与后续写入合并
+        logger: 日志对象
+    """
+
+    def __init__(self, patch: Callable[[str, str, Dict[str, Any]], Awaitable[Any]], delay: float, logger: logging.Logger):
+        self._patch = patch
+        self._delay = delay
+        self._logger = logger
+        # 对象当前的 status（watch 观察到的，加上本进程已经提交的 patch）
+        self._known: Dict[Key, Dict[str, Any]] = {}
+        # _known 中已被 API Server 确认的部分对应的 metadata.resourceVersion
+        self._versions: Dict[Key, str] = {}
+        self._pending: Dict[Key, _Batch] = {}
+        self._flushing: Dict[Key, asyncio.Task] = {}
+        self.written = 0
+        self.skipped = 0
+        self.coalesced = 0
+
+    def observe(self, namespace: str, name: str, status: Optional[Dict[str, Any]], resource_version: Optional[str] = None):
+        """
+        记录 watch 观察到的对象 status（status 为 None 表示对象已删除）
+
+        以下事件不会覆盖本地记录，否则之后一次真正需要的写入可能被误判为没有变化而跳过：
+
+        - 本进程对该对象还有尚未发出或尚未完成的写入（写入完成后以 API 返回的对象为准）；
+        - resource_version 比本地记录对应的版本更旧（例如在本进程写入之前产生、之后才投递的事件）。
+
+        Args:
+            namespace: 命名空间
+            name: 对象名称
+            status: 事件中的 status，对象已删除时为 None
+            resource_version: 事件中对象的 metadata.resourceVersion
+        """
+        key = (namespace, name)
+        if status is None:
+            self._known.pop(key, None)
+            self._versions.pop(key, None)
+            return
+        if key in self._pending or key in self._flushing:
+            return
+        if _older(resource_version, self._versions.get(key)):
+            return
+        self._known[key] = copy.deepcopy(dict(status))
+        if resource_version:
+            self._versions[key] = resource_version
+        else:
+            self._versions.pop(key, None)
+
+    def write(self, namespace: str, name: str, status: Dict[str, Any], wait: bool = True) -> "asyncio.Future":
+        """
+        提交一次 status 写入
+
+        Args:
+            namespace: 命名空间
+            name: 对象名称
+            status: merge patch 形式的 status（值为 None 的字段会被删除）
+            wait: 为 True 时立即发出（连同之前尚未发出的 patch 一起）；
+                  为 False 时最多延迟 delay 秒，以便与后续写入合并
+
+        Returns:
+            写入完成（或被跳过）时完成的 Future
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (namespace, name)
+
+        known = self._known.get(key)
+        if known is not None and not _changes(known, status):
+            self.skipped += 1
+            metrics.STATUS_WRITES.labels(result="skipped").inc()
+            future.set_result(None)
+            return future
+        self._known[key] = _apply(known or {}, status)
+
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch()
+        else:
+            self.coalesced += 1
+            metrics.STATUS_WRITES.labels(result="coalesced").inc()
+        _merge(batch.patch, status)
+        batch.futures.append(future)
+
+        if key in self._flushing:
+            return future  # 正在进行的写入完成后会接着发出这个批次
+        if wait:
+            if batch.timer is not None:
+                batch.timer.cancel()
+                batch.timer = None
+            self._start_flush(key)
+        elif batch.timer is None:
+            batch.timer = loop.call_later(self._delay, self._start_flush, key)
+        return future
+
+    def _start_flush(self, key: Key):
+        if key not in self._flushing:
+            self._flushing[key] = asyncio.get_running_loop().create_task(self._flush(key))
+
+    async def _flush(self, key: Key):
+        namespace, name = key
+        try:
+            while True:
+                batch = self._pending.pop(key, None)
+                if batch is None:
+                    break
+                if batch.timer is not None:
+                    batch.timer.cancel()
+                try:
+                    result = await self._patch(namespace, name, batch.patch)
+                    self.written += 1
+                    metrics.STATUS_WRITES.labels(result="written").inc()
+                    self._confirm(key, result)
+                except Exception as e:
+                    # 写入失败后不再信任本地记录的 status，下一次写入不会被跳过
+                    self._known.pop(key, None)
+                    self._versions.pop(key, None)
+                    metrics.STATUS_WRITES.labels(result="failed").inc()
+                    self._logger.error(f"Failed to patch status for {name}: {e}")
+                for future in batch.futures:
+                    if not future.done():
+                        future.set_result(None)
+        finally:
+            self._flushing.pop(key, None)
+
+    def _confirm(self, key: Key, result: Any):
+        """用写入后 API 返回的对象更新本地记录；期间提交的、尚未发出的 patch 重新应用在其上"""
+        if not isinstance(result, dict):
+            return
+        resource_version = (result.get("metadata") or {}).get("resourceVersion")
+        if not resource_version:
+            return
+        known = copy.deepcopy(result.get("status") or {})
+        batch = self._pending.get(key)
+        if batch is not None:
+            known = _apply(known, batch.patch)
+        self._known[key] = known
+        self._versions[key] = resource_version
+
+    def stats(self) -> Dict[str, int]:
+        """返回写入、跳过和合并的次数"""
+        return {"written": self.written, "skipped": self.skipped, "coalesced": self.coalesced}
+
+    def __len__(self) -> int:
+        return len(self._known)
@@ -0,0 +1,79 @@
+"""
+DevWorkspaceTemplate 内存缓存
+
+模板是集群级别的资源，数量很少（例如 python-3.9、nodejs-16），
+但每次创建 / 更新工作空间都需要读取。缓存由 devworkspacetemplates 的 watch 事件持续更新，
+热路径上的模板查找只是一次字典查询；只有缓存未命中时才回退为一次 API 读取。
+模板在写入缓存时冻结（workspace_config.freeze），读取方拿到的是不可变对象，可以直接共享。
+"""
+
+import time
+
+from typing import Any, Dict, Optional
+
+from workspace_config import freeze
+
+
+class TemplateCache:
+    """
+    以模板名称为键缓存 DevWorkspaceTemplate，并统计命中 / 未命中次数
+    """
+
+    def __init__(self):
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._updated_at: Dict[str, float] = {}
+        self._last_event_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        查找模板，返回 None 表示缓存中不存在（调用方应回退为 API 读取）
+
+        返回的对象是不可变的（FrozenDict），在协程和线程之间共享是安全的。
+        """
+        template = self._items.get(name)
+        if template is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return template
+
+    def peek(self, name: str) -> Optional[Dict[str, Any]]:
+        """查找模板但不计入命中 / 未命中统计"""
+        return self._items.get(name)
+
+    def put(self, name: str, template: Dict[str, Any]):
+        """保存（或替换）一个模板，保存的是冻结后的副本"""
+        now = time.monotonic()
+        self._items[name] = freeze(template)
+        self._updated_at[name] = now
+        self._last_event_at = now
+
+    def delete(self, name: str):
+        """模板被删除时从缓存中移除"""
+        self._items.pop(name, None)
+        self._updated_at.pop(name, None)
+        self._last_event_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回缓存的统计信息
+
+        Returns:
+            包含条目数、命中 / 未命中次数、命中率以及陈旧程度（秒）的字典
+        """
+        now = time.monotonic()
+        lookups = self.hits + self.misses
+        oldest = min(self._updated_at.values()) if self._updated_at else None
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": round(self.hits / lookups, 4) if lookups else None,
+            "secondsSinceLastEvent": round(now - self._last_event_at, 3) if self._last_event_at is not None else None,
+            "oldestEntryAgeSeconds": round(now - oldest, 3) if oldest is not None else None,
+        }
+
+    def __len__(self) -> int:
+        return len(self._items)
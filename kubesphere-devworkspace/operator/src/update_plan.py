@@ -0,0 +1,115 @@
+"""
+工作空间配置变更的分类
+
+比较变更前后合并好的配置（模板 + 覆盖配置），决定用代价最小的方式让运行中的工作空间生效：
+- 运行环境（镜像）、模板定制的容器（podTemplate）变化，或 code-server 监听的端口（第一个端口）变化：只能重建 Pod；
+- 其他端口变化（增删端口、改名、协议）：只更新 Service，Pod 的 containerPort 只是声明，不影响转发；
+- 资源变化：优先原地调整（in-place pod resize），集群不支持时退回重建 Pod。
+无论哪种方式，Service 都会保留，ClusterIP 和访问 URL 不变。
+"""
+
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_LISTEN_PORT = 8080
+
+
+def listen_port(ports: Optional[List[Dict[str, Any]]]) -> int:
+    """code-server 监听的端口：第一个端口的 containerPort，未配置时为 8080"""
+    if ports and ports[0].get('containerPort'):
+        return ports[0]['containerPort']
+    return DEFAULT_LISTEN_PORT
+
+
+class UpdatePlan:
+    """
+    一次配置变更需要执行的操作
+
+    Attributes:
+        recreate_pod: 需要删除并重建 Pod
+        resize: 需要调整 Pod 的资源（可以原地调整）
+        update_service: 需要更新 Service 的端口
+        reasons: 变化的字段，用于日志
+    """
+
+    __slots__ = ("recreate_pod", "resize", "update_service", "reasons")
+
+    def __init__(self):
+        self.recreate_pod = False
+        self.resize = False
+        self.update_service = False
+        self.reasons: List[str] = []
+
+    def __bool__(self) -> bool:
+        return self.recreate_pod or self.resize or self.update_service
+
+    def describe(self) -> str:
+        actions = [
+            action for action, needed in (
+                ("recreate pod", self.recreate_pod),
+                ("resize pod", self.resize and not self.recreate_pod),
+                ("update service", self.update_service),
+            ) if needed
+        ]
+        return f"{', '.join(actions)} (changed: {', '.join(self.reasons)})"
+
+
+def plan_update(old_config: Optional[Dict[str, Any]], new_config: Dict[str, Any]) -> UpdatePlan:
+    """
+    根据变更前后的配置生成更新计划
+
+    Args:
+        old_config: 变更前的配置，未知时（例如旧模板已被删除）为 None，此时按需要重建 Pod 处理
+        new_config: 变更后的配置
+
+    Returns:
+        UpdatePlan
+    """
+    plan = UpdatePlan()
+    if old_config is None:
+        plan.recreate_pod = plan.update_service = True
+        plan.reasons.append("unknown previous config")
+        return plan
+
+    for field in ('environment', 'podTemplate'):
+        if (old_config.get(field) or {}) != (new_config.get(field) or {}):
+            plan.recreate_pod = True
+            plan.reasons.append(field)
+
+    old_ports, new_ports = tuple(old_config.get('ports') or ()), tuple(new_config.get('ports') or ())
+    if old_ports != new_ports:
+        plan.update_service = True
+        plan.reasons.append("ports")
+        if listen_port(old_ports) != listen_port(new_ports):
+            plan.recreate_pod = True
+            plan.reasons.append("listen port")
+
+    if (old_config.get('resources') or {}) != (new_config.get('resources') or {}):
+        plan.resize = True
+        plan.reasons.append("resources")
+    return plan
+
+
+def resize_patch(container: str, old_resources: Dict[str, Any], new_resources: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    生成原地调整容器资源的 strategic merge patch
+
+    新配置中删掉的 requests / limits 项显式置为 None，否则 strategic merge 会保留旧值。
+
+    Args:
+        container: 容器名称
+        old_resources: 变更前的 resources
+        new_resources: 变更后的 resources
+
+    Returns:
+        作用于 Pod（或其 resize 子资源）的 patch
+    """
+    resources: Dict[str, Any] = {}
+    for section in ('requests', 'limits'):
+        old_values = dict(old_resources.get(section) or {})
+        new_values = dict(new_resources.get(section) or {})
+        values: Dict[str, Any] = {key: None for key in old_values if key not in new_values}
+        values.update(new_values)
+        if values:
+            resources[section] = values
+    return {"spec": {"containers": [{"name": container, "resources": resources}]}}
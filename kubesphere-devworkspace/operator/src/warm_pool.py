@@ -0,0 +1,135 @@
+"""
+按 DevWorkspaceTemplate 预热的 Pod 池
+
+冷启动需要拉取镜像、调度并启动 code-server，可能长达数分钟。
+模板设置 spec.warmPool 后，Operator 会在指定的命名空间中预先按模板创建若干个 Pod（以及各自的 PVC），
+创建工作空间时直接认领（claim）一个已就绪的 Pod：
+把 Pod 和 PVC 的池标签换成 instance=<工作空间名称>，并把 ownerReference 改为该工作空间，
+工作空间的 Service 通过标签选择器立即指向这个 Pod。
+
+Pod 的 volumes 创建后不可修改，而 Pod 也不能跨命名空间移动，
+因此池中的每个成员都自带一个 PVC，认领时一起转交给工作空间。
+
+本模块只负责池的状态（由池成员的 watch 维护）和认领时的选择，对 API 的调用由 main.py 完成。
+"""
+
+from typing import Any, Dict, List, Optional, Set
+
+from informer import Key, ResourceCache
+
+
+# 池成员 Pod / PVC 上标记所属模板的标签，认领后被移除
+POOL_LABEL = "devworkspace.kubesphere.io/pool"
+# 池成员基于的模板版本（模板的 metadata.generation），模板变更后旧版本的成员会被替换
+GENERATION_LABEL = "devworkspace.kubesphere.io/template-generation"
+
+
+def _pod_snapshot(pod: Dict[str, Any]) -> Dict[str, Any]:
+    """只保留挑选池成员需要的 Pod 字段（pod 为 JSON 解码后的 dict）"""
+    metadata = pod.get("metadata") or {}
+    labels = metadata.get("labels") or {}
+    claim_name = None
+    for volume in (pod.get("spec") or {}).get("volumes") or []:
+        if volume.get("persistentVolumeClaim"):
+            claim_name = volume["persistentVolumeClaim"].get("claimName")
+            break
+    return {
+        "template": labels.get(POOL_LABEL),
+        "generation": labels.get(GENERATION_LABEL),
+        "phase": (pod.get("status") or {}).get("phase"),
+        "deleting": metadata.get("deletionTimestamp") is not None,
+        "resourceVersion": metadata.get("resourceVersion"),
+        "pvcName": claim_name,
+    }
+
+
+class WarmPool:
+    """
+    预热 Pod 池的内存状态
+
+    cache 由只关注带有 POOL_LABEL 的 Pod 的 informer 维护；
+    Pod 被认领（移除池标签）后，watch 会把它作为 DELETED 事件从缓存中移除。
+    """
+
+    def __init__(self):
+        self.cache = ResourceCache("warm pod", _pod_snapshot)
+        # 已被本进程选中、认领请求尚未完成的池成员，避免并发的创建请求选中同一个 Pod
+        self._reserved: Set[Key] = set()
+        self.claims = 0
+        self.misses = 0
+
+    def members(self, template: str, namespace: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        返回某个模板的池成员（不包括正在删除和已被预留的 Pod）
+
+        Args:
+            template: 模板名称
+            namespace: 只返回该命名空间中的成员，为 None 时返回所有命名空间
+
+        Returns:
+            成员列表，每个元素包含 namespace、name 和快照中的字段
+        """
+        result = []
+        for (ns, name), snap in self.cache.items():
+            if snap['template'] != template or snap['deleting'] or (ns, name) in self._reserved:
+                continue
+            if namespace is not None and ns != namespace:
+                continue
+            result.append(dict(snap, namespace=ns, name=name))
+        return result
+
+    def reserve(self, template: str, namespace: str, generation: Optional[int]) -> Optional[Dict[str, Any]]:
+        """
+        为一个新工作空间挑选并预留一个池成员
+
+        优先选择已经 Running 的 Pod，其次是仍在启动中的 Pod（至少省去了调度和镜像拉取的一部分时间）。
+        只会选择与当前模板版本一致的成员。调用方完成认领后必须调用 release。
+
+        Args:
+            template: 模板名称
+            namespace: 工作空间所在的命名空间
+            generation: 当前模板的 metadata.generation
+
+        Returns:
+            选中的成员，没有可用成员时返回 None
+        """
+        candidates = [
+            member for member in self.members(template, namespace)
+            if member['phase'] in ("Running", "Pending") and member['generation'] == str(generation)
+        ]
+        if not candidates:
+            self.misses += 1
+            return None
+        candidates.sort(key=lambda member: member['phase'] != "Running")
+        chosen = candidates[0]
+        self._reserved.add((chosen['namespace'], chosen['name']))
+        return chosen
+
+    def release(self, member: Dict[str, Any], claimed: bool):
+        """
+        结束对一个池成员的预留
+
+        Args:
+            member: reserve 返回的成员
+            claimed: 是否认领成功
+        """
+        self._reserved.discard((member['namespace'], member['name']))
+        if claimed:
+            self.claims += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回各模板、各命名空间中池成员的数量
+
+        Returns:
+            包含认领 / 未命中次数以及 {模板: {命名空间: {ready, total}}} 的字典
+        """
+        pools: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for (ns, name), snap in self.cache.items():
+            if snap['deleting']:
+                continue
+            counts = pools.setdefault(snap['template'], {}).setdefault(ns, {"ready": 0, "total": 0})
+            counts["total"] += 1
+            if snap['phase'] == "Running":
+                counts["ready"] += 1
+        return {"claims": self.claims, "misses": self.misses, "pools": pools}
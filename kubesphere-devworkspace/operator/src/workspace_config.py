@@ -0,0 +1,126 @@
+"""
+工作空间的有效配置：DevWorkspaceTemplate 的 spec 与 DevWorkspace 的 overrides 合并后的结果
+
+- freeze：把嵌套的 dict / list 转换为不可变的 FrozenDict / tuple。模板进入缓存时冻结一次，
+  之后在协程和线程之间共享都不需要复制；
+- merge_configs：纯函数，不修改任何输入。没有覆盖配置时直接返回模板层本身，
+  有覆盖配置时只重建被覆盖的分支，其余子树与模板共享；相同的 (模板, 覆盖配置) 只合并一次；
+- config_hash：有效配置的内容哈希，与进程、字典顺序无关，写入 status.configHash，
+  用于在有效配置没有变化时跳过更新。
+
+FrozenDict 是 dict 的子类，可以直接放进清单交给 kubernetes 客户端序列化（tuple 会被序列化为数组）。
+"""
+
+import functools
+import hashlib
+import json
+
+from typing import Any, Dict, Mapping, Optional
+
+
+# 缓存的合并结果数量（键为冻结后的模板 spec 和覆盖配置）
+MERGE_CACHE_SIZE = 1024
+
+
+class FrozenDict(dict):
+    """
+    不可变、可哈希的 dict
+
+    所有修改操作都会抛出 TypeError；哈希值在第一次使用时计算并缓存，要求所有值同样可哈希（见 freeze）。
+    """
+
+    __slots__ = ("_hash",)
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__} is immutable")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = _immutable
+
+    def __hash__(self) -> int:
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(frozenset(self.items()))
+            return self._hash
+
+    def __copy__(self) -> "FrozenDict":
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "FrozenDict":
+        return self
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+    def __repr__(self) -> str:
+        return f"FrozenDict({dict.__repr__(self)})"
+
+
+def freeze(value: Any) -> Any:
+    """
+    递归地把 Mapping 转换为 FrozenDict、把 list / tuple 转换为 tuple，其余值原样返回
+
+    已经冻结的 FrozenDict 直接返回，不会重复转换。
+    """
+    # 先按具体类型判断，Mapping 的 ABC 检查相对较慢，只用于 kopf 的 Body / Spec 等视图对象
+    kind = type(value)
+    if kind is FrozenDict or kind is str or kind is int or kind is float or kind is bool or value is None:
+        return value
+    if kind is dict or isinstance(value, Mapping):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if kind is list or kind is tuple:
+        return tuple([freeze(item) for item in value])
+    return value
+
+
+def merge_configs(template_spec: Mapping[str, Any], overrides: Optional[Mapping[str, Any]]) -> FrozenDict:
+    """
+    合并模板配置和实例中的覆盖配置，不修改任何输入
+
+    - resources：requests / limits 按键合并；
+    - storage、environment：按键合并；
+    - ports：整体替换。
+
+    Args:
+        template_spec: 模板的 spec 部分（最好是缓存中已经冻结的对象，可以避免重复冻结）
+        overrides: 实例中的覆盖配置
+
+    Returns:
+        合并后的不可变配置
+    """
+    frozen_template = freeze(template_spec)
+    if not overrides:
+        return frozen_template
+    return _merge(frozen_template, freeze(overrides))
+
+
+@functools.lru_cache(maxsize=MERGE_CACHE_SIZE)
+def _merge(template_spec: FrozenDict, overrides: FrozenDict) -> FrozenDict:
+    result = dict(template_spec)
+
+    if overrides.get('resources'):
+        resources = dict(result.get('resources') or {})
+        for section in ('requests', 'limits'):
+            if overrides['resources'].get(section):
+                resources[section] = FrozenDict({**(resources.get(section) or {}), **overrides['resources'][section]})
+        result['resources'] = FrozenDict(resources)
+
+    for field in ('storage', 'environment'):
+        if overrides.get(field):
+            result[field] = FrozenDict({**(result.get(field) or {}), **overrides[field]})
+
+    if 'ports' in overrides:
+        result['ports'] = overrides['ports']
+
+    return FrozenDict(result)
+
+
+@functools.lru_cache(maxsize=MERGE_CACHE_SIZE)
+def config_hash(config: FrozenDict) -> str:
+    """
+    有效配置的内容哈希（sha256 的前 16 个十六进制字符）
+
+    基于按键排序的 JSON 计算，与 Python 的哈希随机化无关，可以在副本之间、重启前后比较。
+    """
+    payload = json.dumps(config, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
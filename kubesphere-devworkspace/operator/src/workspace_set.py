@@ -0,0 +1,175 @@
+"""
+DevWorkspaceSet：从一个模板批量创建工作空间
+
+集合的 handler 只解析一次模板，然后创建 spec.replicas 个子 DevWorkspace（名称为 <namePrefix>-<序号>，
+ownerReference 指向集合，带有 SET_LABEL 标签）。子工作空间仍由普通的 DevWorkspace handler 创建资源，
+但整个批次共享集合的预算（SetBudget）：
+- 并发：同一时刻最多 maxConcurrency 个子工作空间处于创建中（创建子对象或创建其 Pod / PVC / Service）；
+- QPS：批次中所有 API 请求（经由 call_api）共享一个令牌桶，平均不超过 qps 个/秒。
+
+预算通过 contextvar 传递给 call_api，子工作空间的 handler 不需要感知自己属于哪个集合。
+预算保存在每个副本的内存中，开启分片时每个副本分别执行同样的预算。
+"""
+
+import asyncio
+import contextlib
+import contextvars
+
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from ratelimit import TokenBucket
+
+
+SET_LABEL = "devworkspace.kubesphere.io/set"
+
+# 当前协程所属批次的预算，由 SetBudget.limit 设置，call_api 据此限速
+active_budget: contextvars.ContextVar[Optional["SetBudget"]] = contextvars.ContextVar("active_budget", default=None)
+
+
+class SetBudget:
+    """
+    一个 DevWorkspaceSet 的并发和 QPS 预算
+
+    Args:
+        max_concurrency: 同时处于创建中的子工作空间数量上限
+        qps: 批次中 API 请求的平均速率上限（个/秒），<= 0 表示不限速
+    """
+
+    __slots__ = ("max_concurrency", "qps", "bucket", "_semaphore")
+
+    def __init__(self, max_concurrency: int, qps: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.qps = qps
+        self.bucket = TokenBucket(qps, max(1, int(qps)))
+        # asyncio.Semaphore 在 Python 3.9 中会绑定创建时的事件循环，因此在第一次使用时才创建
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @contextlib.asynccontextmanager
+    async def limit(self) -> AsyncIterator[None]:
+        """占用一个并发名额，并让其中的 API 请求计入本批次的 QPS 预算"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            token = active_budget.set(self)
+            try:
+                yield
+            finally:
+                active_budget.reset(token)
+
+
+class WorkspaceSetRegistry:
+    """
+    记录每个 DevWorkspaceSet 的预算，由集合的 watch 事件维护
+
+    Args:
+        default_concurrency: spec.maxConcurrency 未设置时的并发上限
+        default_qps: spec.qps 未设置时的 QPS 上限
+    """
+
+    def __init__(self, default_concurrency: int, default_qps: float):
+        self._default_concurrency = default_concurrency
+        self._default_qps = default_qps
+        self._budgets: Dict[Tuple[str, str], SetBudget] = {}
+
+    def update(self, namespace: str, name: str, spec: Optional[Dict[str, Any]]):
+        """
+        记录（spec 为 None 时移除）集合的预算
+
+        并发或 QPS 变化时换成新的预算对象，正在进行中的创建继续使用旧的预算。
+        """
+        key = (namespace, name)
+        if spec is None:
+            self._budgets.pop(key, None)
+            return
+        concurrency = int(spec.get('maxConcurrency') or self._default_concurrency)
+        qps = float(spec.get('qps') if spec.get('qps') is not None else self._default_qps)
+        current = self._budgets.get(key)
+        if current is None or current.max_concurrency != max(1, concurrency) or current.qps != qps:
+            self._budgets[key] = SetBudget(concurrency, qps)
+
+    def budget_for(self, namespace: str, name: Optional[str]) -> Optional[SetBudget]:
+        """返回集合的预算；工作空间不属于任何集合（name 为空）或集合未知时返回 None"""
+        if not name:
+            return None
+        return self._budgets.get((namespace, name))
+
+
+def member_names(name: str, spec: Dict[str, Any]) -> List[str]:
+    """返回集合应当包含的子工作空间名称（按序号排列）"""
+    prefix = spec.get('namePrefix') or name
+    return [f"{prefix}-{index}" for index in range(max(0, int(spec.get('replicas') or 0)))]
+
+
+def member_manifest(workspace_set: Dict[str, Any], member_name: str, api_version: str) -> Dict[str, Any]:
+    """
+    生成子 DevWorkspace 的清单
+
+    Args:
+        workspace_set: DevWorkspaceSet 对象
+        member_name: 子工作空间名称
+        api_version: DevWorkspace 的 apiVersion
+
+    Returns:
+        DevWorkspace 清单
+    """
+    metadata = workspace_set['metadata']
+    spec = workspace_set.get('spec', {})
+    member_spec: Dict[str, Any] = {"templateRef": spec['templateRef']}
+    for field in ('overrides', 'idleTimeout'):
+        if spec.get(field):
+            member_spec[field] = spec[field]
+    return {
+        "apiVersion": api_version,
+        "kind": "DevWorkspace",
+        "metadata": {
+            "name": member_name,
+            "namespace": metadata['namespace'],
+            "labels": {SET_LABEL: metadata['name']},
+            "ownerReferences": [{
+                "apiVersion": workspace_set['apiVersion'],
+                "kind": workspace_set['kind'],
+                "name": metadata['name'],
+                "uid": metadata['uid'],
+                "controller": True,
+                "blockOwnerDeletion": True
+            }]
+        },
+        "spec": member_spec
+    }
+
+
+def aggregate(members: Iterable[Dict[str, Any]], desired: int) -> Dict[str, Any]:
+    """
+    汇总子工作空间的阶段
+
+    Args:
+        members: 子工作空间（包含 phase 字段）
+        desired: spec.replicas
+
+    Returns:
+        集合的 status（不含 templateGeneration 等由 handler 写入的字段）
+    """
+    counts = {"Running": 0, "Failed": 0, "Stopped": 0}
+    created = 0
+    for member in members:
+        created += 1
+        phase = member.get('phase')
+        if phase in counts:
+            counts[phase] += 1
+    starting = created - sum(counts.values())
+    if counts["Failed"]:
+        phase = "Degraded"
+    elif counts["Running"] + counts["Stopped"] >= desired and created == desired:
+        phase = "Ready"
+    else:
+        phase = "Provisioning"
+    return {
+        "phase": phase,
+        "desired": desired,
+        "created": created,
+        "starting": starting,
+        "running": counts["Running"],
+        "stopped": counts["Stopped"],
+        "failed": counts["Failed"],
+        "message": f"{counts['Running']}/{desired} workspace(s) running"
+    }
@@ -0,0 +1,11 @@
+"""
+单元测试的公共配置：让测试可以直接导入 src 中的模块（与 Operator 运行时相同，不作为包导入）
+"""
+
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
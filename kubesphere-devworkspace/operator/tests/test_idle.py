@@ -0,0 +1,95 @@
+"""
+idle 的单元测试：活跃度探测区分"没有活动"和"无法判断"，无法判断时空闲 timer 不暂停工作空间
+"""
+
+import asyncio
+import datetime
+import logging
+import types
+
+import pytest
+
+from kubernetes.client.rest import ApiException
+
+import main
+from idle import ActivityUnknown, AnnotationActivityProbe, MetricsActivityProbe
+
+
+def metrics_probe(result=None, error=None):
+    async def fetch(namespace, pod_name):
+        if error is not None:
+            raise error
+        return result
+    return MetricsActivityProbe(fetch, 0.1)
+
+
+def pod_metrics(*cpu):
+    return {"containers": [{"name": f"c{i}", "usage": {"cpu": value}} for i, value in enumerate(cpu)]}
+
+
+WORKSPACE = {"metadata": {"name": "ws"}, "status": {"podName": "ws"}}
+
+
+def test_metrics_probe_reports_activity_above_threshold():
+    observed = asyncio.run(metrics_probe(pod_metrics("150m")).last_activity("ws", "default", WORKSPACE))
+    assert observed is not None
+
+
+def test_metrics_probe_reports_no_activity_below_threshold():
+    assert asyncio.run(metrics_probe(pod_metrics("20m", "30000000n")).last_activity("ws", "default", WORKSPACE)) is None
+
+
+@pytest.mark.parametrize("status", [404, 503])
+def test_metrics_probe_api_errors_are_unknown(status):
+    probe = metrics_probe(error=ApiException(status=status))
+    with pytest.raises(ActivityUnknown):
+        asyncio.run(probe.last_activity("ws", "default", WORKSPACE))
+
+
+def test_metrics_probe_without_containers_is_unknown():
+    with pytest.raises(ActivityUnknown):
+        asyncio.run(metrics_probe({"containers": []}).last_activity("ws", "default", WORKSPACE))
+
+
+def test_annotation_probe():
+    probe = AnnotationActivityProbe()
+    assert asyncio.run(probe.last_activity("ws", "default", {"metadata": {}})) is None
+    body = {"metadata": {"annotations": {"devworkspace.kubesphere.io/last-activity": "2024-01-01T00:00:00Z"}}}
+    observed = asyncio.run(probe.last_activity("ws", "default", body))
+    assert observed == datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    body["metadata"]["annotations"]["devworkspace.kubesphere.io/last-activity"] = "yesterday"
+    with pytest.raises(ActivityUnknown):
+        asyncio.run(probe.last_activity("ws", "default", body))
+
+
+def run_idle_check(monkeypatch, probe, last_active):
+    """用给定的探测调用一次 stop_idle_workspace，返回发出的 patch 和之后的 memo"""
+    patches = []
+
+    async def call_api(fn, *args, **kwargs):
+        patches.append(kwargs.get("body"))
+
+    monkeypatch.setattr(main, "activity_probe", probe)
+    monkeypatch.setattr(main, "call_api", call_api)
+    monkeypatch.setattr(main, "operator_context", lambda: types.SimpleNamespace(custom_api=types.SimpleNamespace(patch_namespaced_custom_object=None)))
+    memo = {"lastActive": last_active}
+    asyncio.run(main.stop_idle_workspace(
+        name="ws", namespace="default", body=WORKSPACE, spec={"idleTimeout": "30m"},
+        memo=memo, logger=logging.getLogger("test"),
+    ))
+    return patches, memo
+
+
+@pytest.mark.parametrize("status", [404, 503])
+def test_idle_timer_does_not_pause_when_activity_is_unknown(monkeypatch, status):
+    hours_ago = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=2)
+    patches, memo = run_idle_check(monkeypatch, metrics_probe(error=ApiException(status=status)), hours_ago)
+    assert patches == []
+    assert memo["lastActive"] > hours_ago
+
+
+def test_idle_timer_pauses_when_no_activity(monkeypatch):
+    hours_ago = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=2)
+    patches, memo = run_idle_check(monkeypatch, metrics_probe(pod_metrics("10m")), hours_ago)
+    assert patches == [{"spec": {"paused": True}}]
+    assert "lastActive" not in memo
@@ -0,0 +1,84 @@
+"""
+ratelimit 的单元测试：令牌桶、指数退避和 Retry-After
+"""
+
+import asyncio
+import time
+
+from kubernetes.client.rest import ApiException
+
+from ratelimit import TokenBucket, backoff_delay, retry_after
+
+
+def test_token_bucket_allows_burst_then_paces():
+    async def scenario():
+        bucket = TokenBucket(rate=50, burst=3)
+        return [await bucket.acquire() for _ in range(5)]
+
+    waits = asyncio.run(scenario())
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    # 之后每个请求大约等待 1 / rate 秒
+    assert all(0.01 < wait <= 0.03 for wait in waits[3:])
+
+
+def test_token_bucket_serves_concurrent_waiters_in_order():
+    async def scenario():
+        bucket = TokenBucket(rate=100, burst=1)
+        started = time.monotonic()
+        done = []
+
+        async def request(i):
+            await bucket.acquire()
+            done.append((i, time.monotonic() - started))
+
+        await asyncio.gather(*(request(i) for i in range(5)))
+        return done
+
+    done = asyncio.run(scenario())
+    assert [i for i, _ in done] == list(range(5))
+    # 5 个请求、突发 1 个：最后一个在约 40ms 后放行
+    assert 0.03 <= done[-1][1] < 0.2
+
+
+def test_unlimited_bucket_never_waits():
+    async def scenario():
+        bucket = TokenBucket(rate=0, burst=1)
+        return [await bucket.acquire() for _ in range(100)]
+
+    assert set(asyncio.run(scenario())) == {0.0}
+
+
+def test_pause_delays_all_callers():
+    async def scenario():
+        bucket = TokenBucket(rate=0, burst=1)
+        bucket.pause(0.05)
+        bucket.pause(0.01)  # 更短的暂停不会提前恢复
+        started = time.monotonic()
+        await asyncio.gather(bucket.acquire(), bucket.acquire())
+        return time.monotonic() - started
+
+    assert 0.04 <= asyncio.run(scenario()) < 0.2
+
+
+def test_backoff_delay_grows_with_jitter_and_cap():
+    for attempt in range(6):
+        ceiling = min(10.0, 0.5 * 2 ** attempt)
+        for _ in range(50):
+            delay = backoff_delay(attempt, 0.5, 10.0)
+            assert ceiling / 2 <= delay <= ceiling
+    # 次数很大时不会溢出，仍然受 cap 限制
+    assert 30.0 <= backoff_delay(1000, 1.0, 60.0) <= 60.0
+
+
+def make_error(headers):
+    error = ApiException(status=429, reason="Too Many Requests")
+    error.headers = headers
+    return error
+
+
+def test_retry_after():
+    assert retry_after(make_error({"Retry-After": "3"})) == 3.0
+    assert retry_after(make_error({"retry-after": "1.5"})) == 1.5
+    assert retry_after(make_error({"Retry-After": "-1"})) == 0.0
+    assert retry_after(make_error({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) is None
+    assert retry_after(make_error(None)) is None
@@ -0,0 +1,185 @@
+"""
+scheduler.ReconcileScheduler 的单元测试：优先级、命名空间轮转、等待提升，以及长时间等待期间归还名额
+"""
+
+import asyncio
+
+from scheduler import BACKGROUND, BULK, INTERACTIVE, NORMAL, ReconcileScheduler
+
+
+async def hold(scheduler: ReconcileScheduler, namespace: str, priority: int, order: list, label: str, release: asyncio.Event):
+    async with scheduler.slot(namespace, priority):
+        order.append(label)
+        await release.wait()
+
+
+async def run_queued(scheduler: ReconcileScheduler, waiters, blocker_namespace: str = "blocker"):
+    """先占满名额，再让 waiters 依次排队，之后逐个放行并返回得到名额的顺序"""
+    order: list = []
+    release = asyncio.Event()
+    blocker = asyncio.ensure_future(hold(scheduler, blocker_namespace, BACKGROUND, [], "blocker", release))
+    await asyncio.sleep(0)
+    tasks = []
+    for namespace, priority, label in waiters:
+        tasks.append(asyncio.ensure_future(hold(scheduler, namespace, priority, order, label, release)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(blocker, *tasks)
+    return order
+
+
+def test_higher_priority_is_granted_first():
+    scheduler = ReconcileScheduler(max_concurrency=1, namespace_concurrency=1, promote_after=0)
+    order = asyncio.run(run_queued(scheduler, [
+        ("a", BACKGROUND, "background"),
+        ("b", BULK, "bulk"),
+        ("c", NORMAL, "normal"),
+        ("d", INTERACTIVE, "interactive"),
+    ]))
+    assert order == ["interactive", "normal", "bulk", "background"]
+
+
+def test_namespaces_are_served_round_robin():
+    scheduler = ReconcileScheduler(max_concurrency=1, namespace_concurrency=1, promote_after=0)
+    order = asyncio.run(run_queued(scheduler, [
+        ("team-a", BULK, "a1"),
+        ("team-a", BULK, "a2"),
+        ("team-a", BULK, "a3"),
+        ("team-b", BULK, "b1"),
+        ("team-b", BULK, "b2"),
+    ]))
+    assert order == ["a1", "b1", "a2", "b2", "a3"]
+
+
+def test_namespace_concurrency_limit():
+    async def scenario():
+        scheduler = ReconcileScheduler(max_concurrency=10, namespace_concurrency=2, promote_after=0)
+        release = asyncio.Event()
+        order: list = []
+        tasks = [asyncio.ensure_future(hold(scheduler, "team-a", BULK, order, f"a{i}", release)) for i in range(4)]
+        tasks.append(asyncio.ensure_future(hold(scheduler, "team-b", BULK, order, "b0", release)))
+        await asyncio.sleep(0.01)
+        running = scheduler.stats()["namespaces"]
+        release.set()
+        await asyncio.gather(*tasks)
+        return running
+
+    running = asyncio.run(scenario())
+    assert running["team-a"]["running"] == 2
+    assert running["team-a"]["queued"] == 2
+    assert running["team-b"]["running"] == 1
+
+
+def test_long_waiting_request_is_promoted():
+    async def scenario():
+        scheduler = ReconcileScheduler(max_concurrency=1, namespace_concurrency=1, promote_after=0.05)
+        order: list = []
+        release = asyncio.Event()
+        blocker = asyncio.ensure_future(hold(scheduler, "blocker", BACKGROUND, [], "blocker", release))
+        await asyncio.sleep(0)
+        background = asyncio.ensure_future(hold(scheduler, "a", BACKGROUND, order, "background", release))
+        await asyncio.sleep(0.06)
+        interactive = asyncio.ensure_future(hold(scheduler, "b", INTERACTIVE, order, "interactive", release))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(blocker, background, interactive)
+        return order
+
+    assert asyncio.run(scenario()) == ["background", "interactive"]
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        scheduler = ReconcileScheduler(max_concurrency=1, namespace_concurrency=1, promote_after=0)
+        release = asyncio.Event()
+        blocker = asyncio.ensure_future(hold(scheduler, "a", NORMAL, [], "blocker", release))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(hold(scheduler, "b", NORMAL, [], "waiter", release))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        queued = scheduler.stats()["queued"]["normal"]
+        release.set()
+        await blocker
+        return queued, scheduler.stats()["active"]
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_suspended_releases_slot_during_long_wait():
+    async def scenario():
+        scheduler = ReconcileScheduler(max_concurrency=1, namespace_concurrency=1, promote_after=0)
+        deleted = asyncio.Event()
+        events: list = []
+
+        async def recreate():
+            async with scheduler.slot("a", BACKGROUND):
+                events.append("delete")
+                async with scheduler.suspended():
+                    # 等待旧 Pod 被删除期间不占用名额
+                    await deleted.wait()
+                events.append("create")
+
+        async def interactive():
+            async with scheduler.slot("b", INTERACTIVE):
+                events.append("interactive")
+                assert scheduler.stats()["active"] == 1
+            deleted.set()
+
+        first = asyncio.ensure_future(recreate())
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(interactive())
+        await asyncio.wait_for(asyncio.gather(first, second), timeout=1)
+        return events, scheduler.stats()["active"]
+
+    events, active = asyncio.run(scenario())
+    assert events == ["delete", "interactive", "create"]
+    assert active == 0
+
+
+def test_suspended_reacquires_before_continuing():
+    async def scenario():
+        scheduler = ReconcileScheduler(max_concurrency=1, namespace_concurrency=1, promote_after=0)
+        release = asyncio.Event()
+        events: list = []
+
+        async def recreate():
+            async with scheduler.slot("a", BACKGROUND):
+                async with scheduler.suspended():
+                    other = asyncio.ensure_future(hold(scheduler, "b", NORMAL, events, "other", release))
+                    await asyncio.sleep(0.01)
+                events.append("create")
+            await other
+
+        task = asyncio.ensure_future(recreate())
+        await asyncio.sleep(0.02)
+        # 名额被其他工作占用时，重建需要重新排队等待
+        assert events == ["other"]
+        release.set()
+        await asyncio.wait_for(task, timeout=1)
+        return events, scheduler.stats()["active"]
+
+    events, active = asyncio.run(scenario())
+    assert events == ["other", "create"]
+    assert active == 0
+
+
+def test_suspended_without_slot_is_noop():
+    async def scenario():
+        scheduler = ReconcileScheduler(max_concurrency=1, namespace_concurrency=1, promote_after=0)
+        async with scheduler.suspended():
+            pass
+        return scheduler.stats()["active"]
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_unlimited_scheduler_does_not_queue():
+    async def scenario():
+        scheduler = ReconcileScheduler(max_concurrency=0, namespace_concurrency=1)
+        async with scheduler.slot("a", BULK), scheduler.slot("a", BULK):
+            async with scheduler.suspended():
+                pass
+            return scheduler.stats()["active"]
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,108 @@
+"""
+seed 模块的单元测试：种子快照的刷新计划、数据源选择，以及由 watch 维护的最近快照
+"""
+
+import datetime
+
+from seed import SEED_TEMPLATE_LABEL, SNAPSHOT_KEEP, SeedSnapshots, data_source, plan_refresh
+
+
+NOW = datetime.datetime(2026, 1, 10, tzinfo=datetime.timezone.utc)
+HOUR = 3600
+
+
+def snapshot(name, created, ready=True, error=False, template="python"):
+    status = {"readyToUse": ready}
+    if error:
+        status["error"] = {"message": "snapshot failed"}
+    return {
+        "metadata": {"name": name, "namespace": "team", "creationTimestamp": created, "labels": {SEED_TEMPLATE_LABEL: template}},
+        "status": status,
+    }
+
+
+def test_plan_refresh_without_snapshots_creates_one():
+    assert plan_refresh([], HOUR, NOW) == (None, True, [])
+
+
+def test_plan_refresh_keeps_recent_snapshot():
+    latest, create, stale = plan_refresh([snapshot("s1", "2026-01-09T23:30:00Z")], HOUR, NOW)
+    assert (latest, create, stale) == ("s1", False, [])
+
+
+def test_plan_refresh_creates_when_latest_is_old():
+    latest, create, stale = plan_refresh([snapshot("s1", "2026-01-09T22:00:00Z")], HOUR, NOW)
+    assert (latest, create, stale) == ("s1", True, [])
+
+
+def test_plan_refresh_waits_for_pending_snapshot():
+    snapshots = [snapshot("s1", "2026-01-09T20:00:00Z"), snapshot("s2", "2026-01-09T21:00:00Z", ready=False)]
+    latest, create, stale = plan_refresh(snapshots, HOUR, NOW)
+    # 正在创建的快照还没有就绪，新的工作空间仍从 s1 克隆，也不再创建第三个
+    assert (latest, create, stale) == ("s1", False, [])
+
+
+def test_plan_refresh_deletes_old_ready_snapshots():
+    snapshots = [snapshot(f"s{day}", f"2026-01-0{day}T00:00:00Z") for day in range(1, 5)]
+    latest, create, stale = plan_refresh(snapshots, HOUR, NOW)
+    assert latest == "s4"
+    assert create
+    assert sorted(stale) == ["s1", "s2"]
+    assert len(snapshots) - len(stale) == SNAPSHOT_KEEP
+
+
+def test_plan_refresh_retries_failed_snapshot_once_per_interval():
+    recent_failure = [snapshot("s1", "2026-01-08T00:00:00Z"), snapshot("s2", "2026-01-09T23:30:00Z", ready=False, error=True)]
+    assert plan_refresh(recent_failure, HOUR, NOW) == ("s1", False, [])
+
+    old_failures = [
+        snapshot("s1", "2026-01-08T00:00:00Z"),
+        snapshot("s2", "2026-01-09T00:00:00Z", ready=False, error=True),
+        snapshot("s3", "2026-01-09T20:00:00Z", ready=False, error=True),
+    ]
+    # 最近一个失败的快照保留（计入刷新间隔），更早的失败快照被删除
+    assert plan_refresh(old_failures, HOUR, NOW) == ("s1", True, ["s2"])
+
+
+def test_data_source_prefers_latest_snapshot():
+    snapshots = SeedSnapshots()
+    storage = {"seed": {"pvc": "golden", "refreshInterval": "1h", "namespaces": ["team"]}}
+    assert data_source("python", storage, "team", snapshots) == {"kind": "PersistentVolumeClaim", "name": "golden"}
+
+    snapshots.update("python", "team", "python-seed-1")
+    assert data_source("python", storage, "team", snapshots)["name"] == "python-seed-1"
+    assert data_source("python", storage, "other", snapshots) is None
+
+
+def test_data_source_explicit_snapshot():
+    storage = {"seed": {"volumeSnapshot": "base", "pvc": "golden"}}
+    assert data_source("python", storage, "team", SeedSnapshots()) == {
+        "apiGroup": "snapshot.storage.k8s.io", "kind": "VolumeSnapshot", "name": "base"
+    }
+
+
+def watch_event(snapshots: SeedSnapshots, event_type: str, obj):
+    key = (obj["metadata"]["namespace"], obj["metadata"]["name"])
+    snapshots.cache.apply(event_type, key, None if event_type == "DELETED" else snapshots.cache.snapshot(obj))
+
+
+def test_watched_snapshots_track_latest_ready():
+    snapshots = SeedSnapshots()
+    snapshots.cache.replace({
+        ("team", "s1"): snapshots.cache.snapshot(snapshot("s1", "2026-01-01T00:00:00Z")),
+        ("team", "o1"): snapshots.cache.snapshot(snapshot("o1", "2026-01-05T00:00:00Z", template="node")),
+    })
+    assert snapshots.latest("python", "team") == "s1"
+    assert snapshots.latest("node", "team") == "o1"
+
+    # 其他副本创建的新快照在就绪之后才被使用
+    watch_event(snapshots, "ADDED", snapshot("s2", "2026-01-02T00:00:00Z", ready=False))
+    assert snapshots.latest("python", "team") == "s1"
+    watch_event(snapshots, "MODIFIED", snapshot("s2", "2026-01-02T00:00:00Z"))
+    assert snapshots.latest("python", "team") == "s2"
+
+    watch_event(snapshots, "DELETED", snapshot("s2", "2026-01-02T00:00:00Z"))
+    assert snapshots.latest("python", "team") == "s1"
+    watch_event(snapshots, "DELETED", snapshot("s1", "2026-01-01T00:00:00Z"))
+    assert snapshots.latest("python", "team") is None
+    assert snapshots.latest("node", "team") == "o1"
@@ -0,0 +1,148 @@
+"""
+status_writer.StatusWriter 的单元测试：跳过、合并，以及过期的 watch 事件
+"""
+
+import asyncio
+import logging
+
+from status_writer import StatusWriter
+
+
+class FakeStatusApi:
+    """记录收到的 patch，并像 API Server 一样返回带有 resourceVersion 的对象"""
+
+    def __init__(self, resource_version: int = 100):
+        self.patches = []
+        self.status = {}
+        self.resource_version = resource_version
+
+    async def patch(self, namespace, name, status):
+        self.patches.append(status)
+        for key, value in status.items():
+            if value is None:
+                self.status.pop(key, None)
+            else:
+                self.status[key] = value
+        self.resource_version += 1
+        return {"metadata": {"resourceVersion": str(self.resource_version)}, "status": dict(self.status)}
+
+
+def make_writer(api: FakeStatusApi, delay: float = 0.05) -> StatusWriter:
+    return StatusWriter(api.patch, delay, logging.getLogger("test"))
+
+
+def test_skips_write_without_changes():
+    async def scenario():
+        api = FakeStatusApi()
+        writer = make_writer(api)
+        writer.observe("ns", "ws", {"phase": "Running", "url": "http://a"}, "10")
+        await writer.write("ns", "ws", {"phase": "Running"})
+        await writer.write("ns", "ws", {"message": None})
+        return api, writer
+
+    api, writer = asyncio.run(scenario())
+    assert api.patches == []
+    assert writer.stats() == {"written": 0, "skipped": 2, "coalesced": 0}
+
+
+def test_coalesces_deferred_writes():
+    async def scenario():
+        api = FakeStatusApi()
+        writer = make_writer(api)
+        writer.write("ns", "ws", {"phase": "Provisioning"}, wait=False)
+        await writer.write("ns", "ws", {"phase": "Starting", "podName": "ws-pod"})
+        return api, writer
+
+    api, writer = asyncio.run(scenario())
+    assert api.patches == [{"phase": "Starting", "podName": "ws-pod"}]
+    assert writer.stats() == {"written": 1, "skipped": 0, "coalesced": 1}
+
+
+def test_deferred_write_is_flushed_after_delay():
+    async def scenario():
+        api = FakeStatusApi()
+        writer = make_writer(api, delay=0.01)
+        done = writer.write("ns", "ws", {"phase": "Provisioning"}, wait=False)
+        assert api.patches == []
+        await done
+        return api
+
+    api = asyncio.run(scenario())
+    assert api.patches == [{"phase": "Provisioning"}]
+
+
+def test_stale_event_does_not_hide_later_write():
+    async def scenario():
+        api = FakeStatusApi(resource_version=10)
+        writer = make_writer(api)
+        writer.observe("ns", "ws", {"phase": "Starting"}, "10")
+        await writer.write("ns", "ws", {"phase": "Running"})
+        # 写入之前产生的事件在写入完成后才到达
+        writer.observe("ns", "ws", {"phase": "Starting"}, "10")
+        # 对象确实处于 Running，因此再次写入 Running 可以跳过
+        await writer.write("ns", "ws", {"phase": "Running"})
+        # 之后真正需要的写入不能因为过期的 Starting 被跳过
+        writer.observe("ns", "ws", {"phase": "Starting"}, "9")
+        await writer.write("ns", "ws", {"phase": "Starting"})
+        return api, writer
+
+    api, writer = asyncio.run(scenario())
+    assert api.patches == [{"phase": "Running"}, {"phase": "Starting"}]
+    assert writer.skipped == 1
+
+
+def test_event_during_pending_write_is_ignored():
+    async def scenario():
+        api = FakeStatusApi(resource_version=10)
+        writer = make_writer(api)
+        writer.observe("ns", "ws", {"phase": "Starting"}, "10")
+        done = writer.write("ns", "ws", {"phase": "Running"}, wait=False)
+        # 尚未发出的写入不能被同时到达的事件覆盖
+        writer.observe("ns", "ws", {"phase": "Starting"}, "10")
+        await done
+        await writer.write("ns", "ws", {"phase": "Running"})
+        return api, writer
+
+    api, writer = asyncio.run(scenario())
+    assert api.patches == [{"phase": "Running"}]
+    assert writer.skipped == 1
+
+
+def test_newer_event_replaces_known_status():
+    async def scenario():
+        api = FakeStatusApi(resource_version=10)
+        writer = make_writer(api)
+        await writer.write("ns", "ws", {"phase": "Running"})
+        # 其他写入者在本进程之后修改了对象
+        writer.observe("ns", "ws", {"phase": "Failed"}, "12")
+        await writer.write("ns", "ws", {"phase": "Running"})
+        return api
+
+    api = asyncio.run(scenario())
+    assert api.patches == [{"phase": "Running"}, {"phase": "Running"}]
+
+
+def test_failed_write_forgets_known_status():
+    calls = []
+
+    async def failing_patch(namespace, name, status):
+        calls.append(status)
+        if len(calls) == 1:
+            raise RuntimeError("conflict")
+
+    async def scenario():
+        writer = StatusWriter(failing_patch, 0.05, logging.getLogger("test"))
+        await writer.write("ns", "ws", {"phase": "Running"})
+        await writer.write("ns", "ws", {"phase": "Running"})
+
+    asyncio.run(scenario())
+    assert calls == [{"phase": "Running"}, {"phase": "Running"}]
+
+
+def test_deleted_object_is_forgotten():
+    api = FakeStatusApi()
+    writer = make_writer(api)
+    writer.observe("ns", "ws", {"phase": "Running"}, "10")
+    assert len(writer) == 1
+    writer.observe("ns", "ws", None)
+    assert len(writer) == 0
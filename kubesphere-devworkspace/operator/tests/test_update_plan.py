@@ -0,0 +1,85 @@
+"""
+update_plan 的单元测试：按变化的字段选择更新方式，以及原地调整资源的 patch
+"""
+
+from update_plan import DEFAULT_LISTEN_PORT, listen_port, plan_update, resize_patch
+from workspace_config import merge_configs
+
+
+TEMPLATE = {
+    "environment": {"image": "codercom/code-server:4.9.1"},
+    "resources": {"requests": {"cpu": "500m"}, "limits": {"cpu": "1", "memory": "2Gi"}},
+    "ports": [{"name": "http", "containerPort": 8080}],
+}
+CONFIG = merge_configs(TEMPLATE, None)
+
+
+def test_listen_port():
+    assert listen_port(None) == DEFAULT_LISTEN_PORT
+    assert listen_port([{"containerPort": 3000}, {"containerPort": 9000}]) == 3000
+
+
+def test_no_changes():
+    plan = plan_update(CONFIG, merge_configs(TEMPLATE, {"storage": {"size": "10Gi"}}))
+    assert not plan
+
+
+def test_unknown_previous_config_recreates():
+    plan = plan_update(None, CONFIG)
+    assert plan.recreate_pod and plan.update_service
+
+
+def test_image_change_recreates_pod_only():
+    plan = plan_update(CONFIG, merge_configs(TEMPLATE, {"environment": {"image": "custom:2"}}))
+    assert plan.recreate_pod
+    assert not plan.update_service and not plan.resize
+    assert plan.reasons == ["environment"]
+
+
+def test_pod_template_change_recreates_pod():
+    plan = plan_update(CONFIG, merge_configs(dict(TEMPLATE, podTemplate={"env": [{"name": "A", "value": "1"}]}), None))
+    assert plan.recreate_pod
+    assert plan.reasons == ["podTemplate"]
+
+
+def test_extra_port_updates_service_only():
+    ports = [{"name": "http", "containerPort": 8080}, {"name": "debug", "containerPort": 9229}]
+    plan = plan_update(CONFIG, merge_configs(TEMPLATE, {"ports": ports}))
+    assert plan.update_service
+    assert not plan.recreate_pod
+    assert "update service" in plan.describe()
+
+
+def test_listen_port_change_recreates_pod():
+    plan = plan_update(CONFIG, merge_configs(TEMPLATE, {"ports": [{"name": "http", "containerPort": 3000}]}))
+    assert plan.update_service and plan.recreate_pod
+    assert plan.reasons == ["ports", "listen port"]
+
+
+def test_resource_change_resizes():
+    plan = plan_update(CONFIG, merge_configs(TEMPLATE, {"resources": {"limits": {"memory": "4Gi"}}}))
+    assert plan.resize
+    assert not plan.recreate_pod and not plan.update_service
+    assert plan.describe() == "resize pod (changed: resources)"
+
+
+def test_resize_with_recreate_describes_recreate_only():
+    plan = plan_update(CONFIG, merge_configs(TEMPLATE, {"resources": {"limits": {"cpu": "2"}}, "environment": {"image": "custom:2"}}))
+    assert plan.describe() == "recreate pod (changed: environment, resources)"
+
+
+def test_resize_patch_clears_removed_values():
+    patch = resize_patch(
+        "workspace",
+        {"requests": {"cpu": "500m"}, "limits": {"cpu": "1", "memory": "2Gi"}},
+        {"limits": {"cpu": "2"}},
+    )
+    assert patch == {"spec": {"containers": [{"name": "workspace", "resources": {
+        "requests": {"cpu": None},
+        "limits": {"memory": None, "cpu": "2"},
+    }}]}}
+
+
+def test_resize_patch_without_changes_is_empty():
+    patch = resize_patch("workspace", {}, {})
+    assert patch == {"spec": {"containers": [{"name": "workspace", "resources": {}}]}}
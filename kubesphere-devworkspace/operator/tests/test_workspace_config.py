@@ -0,0 +1,91 @@
+"""
+workspace_config 的单元测试：冻结、配置合并和配置哈希
+"""
+
+import copy
+
+import pytest
+
+from workspace_config import FrozenDict, config_hash, freeze, merge_configs
+
+
+TEMPLATE = {
+    "environment": {"image": "codercom/code-server:4.9.1"},
+    "resources": {
+        "requests": {"cpu": "500m", "memory": "1Gi"},
+        "limits": {"cpu": "1", "memory": "2Gi"},
+    },
+    "storage": {"size": "5Gi"},
+    "ports": [{"name": "http", "containerPort": 8080, "protocol": "TCP"}],
+}
+
+
+def test_freeze_is_immutable_and_hashable():
+    frozen = freeze(TEMPLATE)
+    assert isinstance(frozen, FrozenDict)
+    assert isinstance(frozen["ports"], tuple)
+    assert frozen["resources"] == TEMPLATE["resources"]
+    assert list(frozen["ports"]) == TEMPLATE["ports"]
+    assert hash(frozen) == hash(freeze(copy.deepcopy(TEMPLATE)))
+    assert freeze(frozen) is frozen
+    with pytest.raises(TypeError):
+        frozen["storage"] = {}
+    with pytest.raises(TypeError):
+        frozen["environment"].update(image="other")
+
+
+def test_merge_without_overrides_returns_template():
+    frozen = freeze(TEMPLATE)
+    assert merge_configs(frozen, None) is frozen
+    assert merge_configs(frozen, {}) is frozen
+
+
+def test_merge_resources_by_key():
+    merged = merge_configs(TEMPLATE, {"resources": {"limits": {"memory": "4Gi"}}})
+    assert merged["resources"]["limits"] == {"cpu": "1", "memory": "4Gi"}
+    assert merged["resources"]["requests"] == TEMPLATE["resources"]["requests"]
+
+
+def test_merge_storage_and_environment_by_key():
+    merged = merge_configs(TEMPLATE, {"storage": {"storageClassName": "fast"}, "environment": {"image": "custom:1"}})
+    assert merged["storage"] == {"size": "5Gi", "storageClassName": "fast"}
+    assert merged["environment"] == {"image": "custom:1"}
+
+
+def test_merge_replaces_ports():
+    merged = merge_configs(TEMPLATE, {"ports": [{"name": "web", "containerPort": 3000}]})
+    assert merged["ports"] == ({"name": "web", "containerPort": 3000},)
+    assert merge_configs(TEMPLATE, {"ports": []})["ports"] == ()
+
+
+def test_merge_does_not_modify_inputs():
+    template = copy.deepcopy(TEMPLATE)
+    overrides = {"resources": {"requests": {"cpu": "2"}}, "storage": {"size": "10Gi"}}
+    original_overrides = copy.deepcopy(overrides)
+    merged = merge_configs(template, overrides)
+    assert template == TEMPLATE
+    assert overrides == original_overrides
+    assert merged["resources"]["requests"]["cpu"] == "2"
+    assert merged["storage"]["size"] == "10Gi"
+
+
+def test_merge_shares_untouched_subtrees():
+    frozen = freeze(TEMPLATE)
+    merged = merge_configs(frozen, {"storage": {"size": "10Gi"}})
+    assert merged["environment"] is frozen["environment"]
+    assert merged["ports"] is frozen["ports"]
+
+
+def test_config_hash_is_stable_and_order_independent():
+    reordered = freeze({key: TEMPLATE[key] for key in reversed(list(TEMPLATE))})
+    assert config_hash(freeze(TEMPLATE)) == config_hash(reordered)
+    assert len(config_hash(freeze(TEMPLATE))) == 16
+
+
+def test_config_hash_changes_with_effective_config():
+    base = merge_configs(TEMPLATE, None)
+    changed = merge_configs(TEMPLATE, {"resources": {"limits": {"cpu": "2"}}})
+    same = merge_configs(TEMPLATE, {"resources": {"limits": {"cpu": "1"}}})
+    assert config_hash(base) != config_hash(changed)
+    # 覆盖为与模板相同的值，有效配置不变
+    assert config_hash(base) == config_hash(same)